@@ -0,0 +1,165 @@
+import math
+import os
+from collections import OrderedDict
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from Metrics import Metrics
+
+# folder of the recipe images and the image used when a recipe has none
+IMAGE_DIR = "statics/images/"
+DEFAULT_IMAGE = "default"
+
+
+class ImageLoadTask(QRunnable):
+    """
+    Class that decodes one image at its display size on a pool thread.
+    """
+
+    def __init__(self, service: "ImageService", key: tuple, path: str):
+        """
+        Initializes the task.
+        :param service: the ImageService to report the decoded image to
+        :param key: (image name, width, height) of the request
+        :param path: path to the image file
+        """
+        super().__init__()
+        self.service = service
+        self.key = key
+        self.path = path
+
+    def run(self):
+        """
+        Decodes the image directly at the size that covers the target area (like Qt.KeepAspectRatioByExpanding),
+        so the full-resolution picture is never held in memory.
+        :return: None
+        """
+        _, width, height = self.key
+        with Metrics.get().span("image.decode", width=width, height=height):
+            reader = QImageReader(self.path)
+            original = reader.size()
+            if original.isValid() and original.width() and original.height():
+                factor = max(width / original.width(), height / original.height())
+                reader.setScaledSize(QSize(math.ceil(original.width() * factor),
+                                           math.ceil(original.height() * factor)))
+            image = reader.read()
+        try:
+            self.service.imageLoaded.emit(self.key, image)
+        except RuntimeError:
+            # the service was deleted while the image was decoded (the application is closing)
+            pass
+
+
+class ImageService(QObject):
+    """
+    Class that loads the recipe images off the GUI thread and keeps the scaled pixmaps of recently shown
+    images in an LRU cache bounded by their size in bytes.
+    The list of files in the images folder is read once, so opening a recipe does not touch the filesystem.
+    """
+
+    # emitted on the GUI thread's event loop when a pool thread finished decoding an image
+    imageLoaded = pyqtSignal(object, QImage)
+
+    # the process-wide service
+    _service = None
+
+    # maximum total size of the cached pixmaps
+    CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, image_dir: str = IMAGE_DIR, cache_bytes: int = CACHE_BYTES):
+        """
+        Initializes the service and indexes the files of the images folder.
+        :param image_dir: folder of the recipe images
+        :param cache_bytes: maximum total size of the cached pixmaps
+        """
+        super().__init__()
+        self.image_dir = image_dir
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+        self.cache = OrderedDict()  # (image name, width, height) -> QPixmap, least recently used first
+        self.pending = {}  # (image name, width, height) -> callbacks waiting for the image
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.imageLoaded.connect(self.handle_loaded)
+
+        # names (without .jpg) of the available images
+        with os.scandir(image_dir) as entries:
+            self.image_names = {entry.name[:-4] for entry in entries if entry.name.endswith(".jpg")}
+
+    @classmethod
+    def get(cls) -> "ImageService":
+        """
+        Returns the process-wide image service, creating it on first use (after the QApplication exists).
+        :return: the shared ImageService
+        """
+        if cls._service is None:
+            cls._service = cls()
+        return cls._service
+
+    def get_image_path(self, image: str) -> str:
+        """
+        Returns the path to the image if it exits, otherwise the path to the default image.
+        :param image: image name without extension
+        :return: path to either the desired image or the default image
+        """
+        name = image if image in self.image_names else DEFAULT_IMAGE
+        return self.image_dir + name + ".jpg"
+
+    def request(self, image: str, size: QSize, callback):
+        """
+        Calls callback with the pixmap of the image scaled to cover the given size.
+        A cached pixmap is passed immediately, otherwise the image is decoded on a pool thread
+        and callback is called from the GUI thread once it is ready.
+        :param image: image name without extension
+        :param size: size of the area the image is shown in
+        :param callback: function that takes the QPixmap
+        :return: None
+        """
+        key = (image if image in self.image_names else DEFAULT_IMAGE, size.width(), size.height())
+
+        # the same image at the same size was shown recently
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            Metrics.get().count("image_cache_hits")
+            callback(self.cache[key])
+            return
+
+        # only one decode per image and size, later requests wait for the same result
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+        self.pending[key] = [callback]
+        Metrics.get().count("image_cache_misses")
+        self.pool.start(ImageLoadTask(self, key, self.get_image_path(key[0])))
+
+    def handle_loaded(self, key: tuple, image: QImage):
+        """
+        Converts a decoded image to a pixmap on the GUI thread, caches it and calls the waiting callbacks.
+        :param key: (image name, width, height) of the request
+        :param image: the decoded image
+        :return: None
+        """
+        pixmap = QPixmap.fromImage(image)
+        self.add_to_cache(key, pixmap)
+
+        for callback in self.pending.pop(key, []):
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # the widget that requested the image was closed in the meantime
+                pass
+
+    def add_to_cache(self, key: tuple, pixmap: QPixmap):
+        """
+        Adds a pixmap to the cache, evicting the least recently used pixmaps above the byte budget.
+        :param key: (image name, width, height) of the pixmap
+        :param pixmap: the scaled pixmap
+        :return: None
+        """
+        size = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        if size > self.cache_bytes:
+            return
+        self.cache[key] = pixmap
+        self.cached_bytes += size
+        while self.cached_bytes > self.cache_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.width() * evicted.height() * max(evicted.depth(), 8) // 8
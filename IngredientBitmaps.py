@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class IngredientBitmaps:
+    """
+    Class that applies the required and excluded ingredients of a query with recipe bitsets.
+    A bitmap holds one bit per recipe, packed eight to a byte (numpy packbits order). Phrases found in more
+    than one recipe in DENSE_RATIO get a precomputed bitmap, which is smaller than their posting list; rarer
+    phrases keep only their posting list and are turned into bits when a query uses them, like the bitmap and
+    array containers of roaring bitmaps. The constraints of a query combine into one bitmap of allowed recipes
+    with byte-wide AND / AND NOT, and the candidates are tested against it in one vectorized lookup, so an
+    exclusion that hits thousands of recipes costs the same as one that hits a few.
+    """
+
+    # a phrase gets a precomputed bitmap when it is in more than one recipe in DENSE_RATIO
+    # (its posting list of 32-bit ids is then larger than the bitmap)
+    DENSE_RATIO = 32
+
+    def __init__(self, index, bitmaps: dict):
+        """
+        Initializes the bitmaps.
+        :param index: IngredientIndex of the dataset, the posting lists of the other phrases are read from it
+        :param bitmaps: dict from phrase to its precomputed packed bitmap
+        """
+        self.index = index
+        self.bitmaps = bitmaps
+        self.n_recipes = index.n_recipes
+
+    @classmethod
+    def from_index(cls, index) -> "IngredientBitmaps":
+        """
+        Precomputes the bitmaps of the common phrases of an IngredientIndex.
+        :param index: IngredientIndex of the dataset
+        :return: the built IngredientBitmaps
+        """
+        return cls(index, {phrase: cls.pack(posting, index.n_recipes) for phrase, posting in index.postings.items()
+                           if len(posting) * cls.DENSE_RATIO > index.n_recipes})
+
+    @staticmethod
+    def pack(ids, n_recipes: int):
+        """
+        Builds the bitmap of a set of recipes.
+        :param ids: recipe ids
+        :param n_recipes: number of recipes in the dataset
+        :return: numpy uint8 array of (n_recipes + 7) // 8 bytes
+        """
+        bits = np.zeros(n_recipes, dtype=bool)
+        bits[ids] = True
+        return np.packbits(bits)
+
+    def get(self, phrase: str):
+        """
+        Returns the bitmap of the recipes containing a phrase.
+        :param phrase: normalized phrase
+        :return: the precomputed bitmap, a bitmap built from the posting list, or an empty bitmap
+        """
+        bitmap = self.bitmaps.get(phrase)
+        if bitmap is None:
+            bitmap = self.pack(self.index.postings.get(phrase, []), self.n_recipes)
+        return bitmap
+
+    def get_allowed(self, required, excluded):
+        """
+        Combines the constraints of a query into the bitmap of the recipes that satisfy all of them.
+        :param required: normalized phrases every result must contain
+        :param excluded: normalized phrases no result may contain
+        :return: packed bitmap of the allowed recipes, or None if the query has no constraints
+        """
+        if not required and not excluded:
+            return None
+        allowed = np.full((self.n_recipes + 7) // 8, 0xFF, dtype=np.uint8)
+        for phrase in required:
+            allowed &= self.get(phrase)
+        for phrase in excluded:
+            allowed &= ~self.get(phrase)
+        return allowed
+
+    @staticmethod
+    def test(bitmap, ids):
+        """
+        Looks up the bits of some recipes.
+        :param bitmap: packed bitmap
+        :param ids: recipe ids
+        :return: boolean numpy array, True for the recipes whose bit is set
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        return ((bitmap[ids >> 3] >> (7 - (ids & 7))) & 1).astype(bool)
@@ -0,0 +1,219 @@
+import itertools
+import numpy as np
+from IngredientBitmaps import IngredientBitmaps
+from IngredientPhrases import IngredientPhrases
+from IngredientTable import IngredientTable
+
+# orders of the results: most matched ingredients, largest share of the recipe covered, fewest missing ingredients
+RANK_MODES = ("matches", "coverage", "missing")
+
+
+class IngredientIndex:
+    """
+    Class that maps each ingredient phrase to the ids (row positions) of the recipes that contain it,
+    so a query only touches the recipes that match instead of scanning the whole dataset.
+    Phrases are normalized words and multi-word ingredient names (see IngredientPhrases), so a query is
+    one dictionary lookup per user ingredient. Each phrase also lists the distinct ingredient lines
+    (see IngredientTable) it appears in, which tells how much of a recipe the user's ingredients cover.
+    """
+
+    # number of recipes whose postings are grouped at a time while the index is built
+    CHUNK_SIZE = 50000
+
+    def __init__(self, postings: dict, sizes, line_postings: dict = None):
+        """
+        Initializes the index from prebuilt posting lists.
+        :param postings: dict from phrase to a sorted numpy array of recipe ids
+        :param sizes: number of ingredient lines of every recipe
+        :param line_postings: dict from phrase to a sorted numpy array of the line ids it appears in
+        """
+        self.postings = postings
+        self.sizes = sizes
+        self.line_postings = line_postings or {}
+        self.n_recipes = len(sizes)
+
+    @classmethod
+    def from_ingredients(cls, ingredients) -> "IngredientIndex":
+        """
+        Builds the index from the Cleaned_Ingredients column of the dataset.
+        :param ingredients: ingredients strings, one per recipe in row order
+        :return: the built IngredientIndex
+        """
+        return cls.from_table(IngredientTable.from_ingredients(ingredients))
+
+    @classmethod
+    def from_table(cls, table, chunk_size: int = CHUNK_SIZE, allocate=None) -> "IngredientIndex":
+        """
+        Builds the index from the parsed ingredient lines of the dataset.
+        The phrase vocabulary is collected first, then every distinct line is matched against it once
+        and each recipe gets the phrases of its lines. The recipes are read twice, a chunk at a time: the first
+        pass counts the recipes of every phrase, the second copies the recipe ids of each chunk into their place
+        in the posting lists, so only one chunk of postings is in memory at a time.
+        :param table: IngredientTable of the dataset
+        :param chunk_size: number of recipes grouped, or distinct lines matched, at a time
+        :param allocate: function (name, shape, dtype) returning the arrays the posting lists are stored in
+                         ("postings" and "line_postings"), in memory if None
+        :return: the built IngredientIndex
+        """
+        allocate = allocate or (lambda name, shape, dtype: np.empty(shape, dtype=dtype))
+        phrases = IngredientPhrases.from_table(table)
+
+        # the phrases of every distinct line, numbered in order of first appearance; the lines are matched a chunk
+        # at a time and only their phrase ids are kept
+        ids = {}
+        phrase_counts, phrase_ids = [], []
+        for lines in table.iter_lines(chunk_size):
+            line_phrases = [[ids.setdefault(phrase, len(ids))
+                             for phrase in phrases.match(IngredientPhrases.normalize(line))] for line in lines]
+            phrase_counts.append(np.fromiter(map(len, line_phrases), dtype=np.int64, count=len(line_phrases)))
+            phrase_ids.append(np.fromiter(itertools.chain.from_iterable(line_phrases), dtype=np.int32))
+        phrase_counts = np.concatenate(phrase_counts) if phrase_counts else np.empty(0, dtype=np.int64)
+        phrase_ids = np.concatenate(phrase_ids) if phrase_ids else np.empty(0, dtype=np.int32)
+        phrase_offsets = np.concatenate(([0], np.cumsum(phrase_counts))).astype(np.int64)
+
+        # the lines of every phrase, in line order
+        line_postings = allocate("line_postings", (len(phrase_ids),), np.int32)
+        line_postings[:] = np.repeat(np.arange(len(phrase_counts), dtype=np.int32), phrase_counts)[
+            np.argsort(phrase_ids, kind="stable")]
+        line_offsets = np.concatenate(([0], np.cumsum(np.bincount(phrase_ids, minlength=len(ids))))).astype(np.int64)
+
+        # the recipes of every phrase: counted, then copied chunk after chunk so every posting list is sorted
+        counts = np.zeros(len(ids), dtype=np.int64)
+        for posting_phrases, _ in table.iter_postings(phrase_ids, phrase_offsets, chunk_size):
+            counts += np.bincount(posting_phrases, minlength=len(ids))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        postings = allocate("postings", (offsets[-1],), np.int32)
+        cursors = offsets[:-1].copy()
+        for posting_phrases, recipes in table.iter_postings(phrase_ids, phrase_offsets, chunk_size):
+            chunk_counts = np.bincount(posting_phrases, minlength=len(ids))
+            chunk_starts = np.cumsum(chunk_counts) - chunk_counts
+            postings[np.arange(len(recipes)) + np.repeat(cursors - chunk_starts, chunk_counts)] = recipes
+            cursors += chunk_counts
+
+        return cls({phrase: postings[offsets[i]:offsets[i + 1]] for i, phrase in enumerate(ids)}, table.sizes,
+                   {phrase: line_postings[line_offsets[i]:line_offsets[i + 1]] for i, phrase in enumerate(ids)})
+
+    def search(self, user_ingredients) -> tuple:
+        """
+        Finds every recipe that contains at least one of the user ingredients.
+        :param user_ingredients: list of ingredients input by the user
+        :return: (recipe ids in ascending order, number of matched ingredients per recipe,
+                  list of matched ingredients per recipe)
+        """
+        # only look at distinct phrases that appear in the dataset, keeping the user's order and spelling
+        hits = [(ing, self.postings[phrase]) for phrase, ing in IngredientPhrases.resolve(user_ingredients)
+                if phrase in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), []
+
+        # merge the posting lists: every occurrence of a recipe id is one matched ingredient
+        ids, scores = np.unique(np.concatenate([posting for _, posting in hits]), return_counts=True)
+
+        # record which ingredients matched each recipe
+        matched = [[] for _ in range(len(ids))]
+        for ing, posting in hits:
+            for pos in np.searchsorted(ids, posting):
+                matched[pos].append(ing)
+
+        return ids, scores, matched
+
+    def count(self, phrases, allowed=None) -> tuple:
+        """
+        Counts the matched phrases of every recipe containing at least one of them, without listing them.
+        :param phrases: distinct normalized phrases (see IngredientPhrases.resolve)
+        :param allowed: packed bitmap of the recipes that can match (see IngredientBitmaps.get_allowed),
+                        or None to count every recipe
+        :return: (recipe ids in ascending order, number of matched phrases per recipe)
+        """
+        return self.extend(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), phrases, allowed)
+
+    def extend(self, ids, scores, phrases, allowed=None) -> tuple:
+        """
+        Adds more phrases to the counts of an earlier query, so a query that contains an earlier one
+        only merges the posting lists of its new phrases.
+        :param ids: recipe ids of the earlier query in ascending order
+        :param scores: number of matched phrases per recipe of the earlier query
+        :param phrases: distinct normalized phrases that were not part of the earlier query
+        :param allowed: packed bitmap of the recipes that can match, or None to count every recipe
+        :return: (recipe ids in ascending order, number of matched phrases per recipe)
+        """
+        postings = [self.postings[phrase] for phrase in phrases if phrase in self.postings]
+        if allowed is not None:
+            # the other recipes are dropped from each posting list before the lists are merged
+            postings = [posting[IngredientBitmaps.test(allowed, posting)] for posting in postings]
+        if not postings:
+            return ids, scores
+        # every occurrence of a recipe id is one matched phrase, the earlier ids count with their scores
+        merged, inverse = np.unique(np.concatenate([ids] + postings), return_inverse=True)
+        weights = np.concatenate([scores, np.ones(sum(len(posting) for posting in postings), dtype=np.int64)])
+        return merged.astype(np.int32), np.bincount(inverse, weights=weights).astype(np.int64)
+
+    def get_matched(self, ids, phrases) -> list:
+        """
+        Lists which of the phrases each of a few recipes contains (used for the ranked results only).
+        :param ids: recipe ids
+        :param phrases: phrases in the order they should be listed
+        :return: list of matched phrases per recipe
+        """
+        matched = [[] for _ in range(len(ids))]
+        for phrase in phrases:
+            posting = self.postings.get(phrase)
+            if posting is None or not len(ids):
+                continue
+            # binary search of every recipe in the sorted posting list
+            positions = np.minimum(np.searchsorted(posting, ids), len(posting) - 1)
+            for pos in np.flatnonzero(posting[positions] == ids):
+                matched[pos].append(phrase)
+        return matched
+
+    def get_lines(self, phrases):
+        """
+        Lists the ingredient lines that contain at least one of the phrases.
+        :param phrases: distinct normalized phrases
+        :return: numpy array of line ids, a line can be listed more than once
+        """
+        lines = [self.line_postings[phrase] for phrase in phrases if phrase in self.line_postings]
+        return np.concatenate(lines) if lines else np.empty(0, dtype=np.int32)
+
+    def rank(self, ids, scores, title_rank, top_k=None, covered=None, mode: str = "matches"):
+        """
+        Orders matched recipes by one of the RANK_MODES, then title:
+        "matches" by score (descending), then fewest missing ingredients;
+        "coverage" by the share of the recipe's ingredients the user has (descending), then score;
+        "missing" by fewest missing ingredients, then score.
+        With top_k, only the best top_k recipes are selected (partial selection) and sorted.
+        :param ids: ids of the matched recipes
+        :param scores: number of matched ingredients per recipe
+        :param title_rank: alphabetical rank of every recipe title (see RecipeStore.title_rank)
+        :param top_k: maximum number of recipes to return, or None to order all of them
+        :param covered: number of ingredient lines of each recipe the user has (see IngredientTable.count_lines),
+                        or None to count every matched ingredient as one line
+        :param mode: one of RANK_MODES
+        :return: positions into ids/scores of the selected recipes, best first
+        """
+        if mode not in RANK_MODES:
+            raise ValueError(f"unknown rank mode {mode!r}, expected one of {RANK_MODES}")
+        sizes = self.sizes[ids].astype(np.int64)
+        if covered is None:
+            covered = np.minimum(scores, sizes)
+        missing = np.clip(sizes - covered, 0, (1 << 16) - 1)
+        # rank of the score in 16 bits, highest score first
+        score_rank = (1 << 16) - 1 - np.minimum(scores, (1 << 16) - 1).astype(np.int64)
+
+        # pack the sort keys into one integer so a single partial selection can be used
+        # (the two keys of the mode in the high bits, then the title rank, which is unique per recipe)
+        if mode == "coverage":
+            # the uncovered share of the recipe in 16 bits, recipes without ingredient lines last
+            uncovered = np.where(sizes > 0, (missing * ((1 << 16) - 1)) // np.maximum(sizes, 1), (1 << 16) - 1)
+            first, second = uncovered, score_rank
+        elif mode == "missing":
+            first, second = missing, score_rank
+        else:
+            first, second = score_rank, missing
+        keys = (first << 47) | (second << 31) | title_rank[ids].astype(np.int64)
+
+        # select the top_k smallest keys without sorting the rest, then sort only those
+        if top_k is not None and len(keys) > top_k:
+            selected = np.argpartition(keys, top_k - 1)[:top_k] if top_k > 0 else np.empty(0, dtype=np.int64)
+            return selected[np.argsort(keys[selected])]
+        return np.argsort(keys)
@@ -0,0 +1,115 @@
+import numpy as np
+from IngredientBitmaps import IngredientBitmaps
+
+
+class IngredientMatrix:
+    """
+    Class that encodes the recipe-by-ingredient relationship as a sparse 0/1 matrix in CSR form,
+    so the score of every recipe is a single matrix-vector product with the user's ingredient vector,
+    and the scores of many users' pantries are one product with the matrix of their vectors (see count_batch).
+    The matrix is kept as plain numpy arrays (indptr/indices).
+    """
+
+    # number of pantries scored together by count_batch, one bit of a 64-bit mask each
+    BATCH_SIZE = 64
+
+    def __init__(self, vocabulary: list, indptr, indices):
+        """
+        Initializes the matrix from its CSR arrays.
+        :param vocabulary: ingredient phrase of every column
+        :param indptr: CSR row pointers, recipe r owns indices[indptr[r]:indptr[r + 1]]
+        :param indices: CSR column (ingredient) ids
+        """
+        self.vocabulary = vocabulary
+        self.columns = {token: col for col, token in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.indices = indices
+        self.n_recipes = len(indptr) - 1
+        # row id of every stored entry, used to sum the entries of each row in one pass
+        self.row_ids = np.repeat(np.arange(self.n_recipes, dtype=np.int32), np.diff(indptr))
+
+    @classmethod
+    def from_index(cls, index) -> "IngredientMatrix":
+        """
+        Builds the matrix from the posting lists of an IngredientIndex.
+        :param index: IngredientIndex of the dataset
+        :return: the built IngredientMatrix
+        """
+        vocabulary = list(index.postings)
+        postings = [index.postings[token] for token in vocabulary]
+
+        # the posting lists are the columns of the matrix
+        lengths = np.array([len(posting) for posting in postings], dtype=np.int64)
+        col_rows = np.concatenate(postings) if postings else np.empty(0, dtype=np.int32)
+
+        # reorder the entries by recipe to get the rows (CSR)
+        entry_cols = np.repeat(np.arange(len(vocabulary), dtype=np.int32), lengths)
+        order = np.argsort(col_rows, kind='stable')
+        indices = entry_cols[order]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(col_rows, minlength=index.n_recipes))))
+
+        return cls(vocabulary, indptr, indices)
+
+    def count(self, phrases, allowed=None) -> tuple:
+        """
+        Counts the matched phrases of every recipe containing at least one of them, like IngredientIndex.count.
+        :param phrases: distinct normalized phrases (see IngredientPhrases.resolve)
+        :param allowed: packed bitmap of the recipes that can match (see IngredientBitmaps.get_allowed),
+                        or None to count every recipe
+        :return: (recipe ids in ascending order, number of matched phrases per recipe)
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        vector[[self.columns[phrase] for phrase in phrases if phrase in self.columns]] = 1
+        scores = np.bincount(self.row_ids, weights=vector[self.indices], minlength=self.n_recipes).astype(np.int64)
+        if allowed is not None:
+            # the product covers every row, the rows of the other recipes are cleared before they are listed
+            scores *= np.unpackbits(allowed, count=self.n_recipes)
+        ids = np.flatnonzero(scores).astype(np.int32)
+        return ids, scores[ids]
+
+    def extend(self, ids, scores, phrases, allowed=None) -> tuple:
+        """
+        Adds more phrases to the counts of an earlier query, like IngredientIndex.extend.
+        :param ids: recipe ids of the earlier query in ascending order
+        :param scores: number of matched phrases per recipe of the earlier query
+        :param phrases: distinct normalized phrases that were not part of the earlier query
+        :param allowed: packed bitmap of the recipes that can match, or None to count every recipe
+        :return: (recipe ids in ascending order, number of matched phrases per recipe)
+        """
+        added_ids, added_scores = self.count(phrases, allowed)
+        totals = np.zeros(self.n_recipes, dtype=np.int64)
+        totals[ids] = scores
+        totals[added_ids] += added_scores
+        ids = np.flatnonzero(totals).astype(np.int32)
+        return ids, totals[ids]
+
+    def count_batch(self, pantries, allowed=None) -> list:
+        """
+        Counts the matched phrases of many pantries at once, like count for each of them.
+        The pantries are scored BATCH_SIZE at a time with one pass over the stored entries: every column gets
+        a bit mask of the pantries that contain its phrase, so the product of the matrix with the whole block
+        of pantry vectors is read from the entries whose mask is not empty.
+        :param pantries: list of pantries, each a list of distinct normalized phrases
+        :param allowed: packed bitmap of the recipes that can match each pantry (None for a pantry without
+                        constraints), or None to count every recipe of every pantry
+        :return: list of (recipe ids in ascending order, number of matched phrases per recipe), one per pantry
+        """
+        results = []
+        for start in range(0, len(pantries), self.BATCH_SIZE):
+            block = pantries[start:start + self.BATCH_SIZE]
+            masks = np.zeros(len(self.vocabulary), dtype=np.uint64)
+            for bit, phrases in enumerate(block):
+                masks[[self.columns[phrase] for phrase in phrases if phrase in self.columns]] |= np.uint64(1 << bit)
+
+            # the stored entries of any phrase of the block, in recipe order, and the pantries they count for
+            entry_masks = masks[self.indices]
+            entries = np.flatnonzero(entry_masks)
+            entry_masks, rows = entry_masks[entries], self.row_ids[entries]
+            for bit in range(len(block)):
+                ids, scores = np.unique(rows[(entry_masks >> np.uint64(bit)) & np.uint64(1) != 0], return_counts=True)
+                bitmap = allowed[start + bit] if allowed is not None else None
+                if bitmap is not None:
+                    kept = IngredientBitmaps.test(bitmap, ids)
+                    ids, scores = ids[kept], scores[kept]
+                results.append((ids.astype(np.int32), scores.astype(np.int64)))
+        return results
@@ -0,0 +1,280 @@
+import itertools
+import re
+from functools import lru_cache
+import numpy as np
+
+# words of an ingredient line, split on spaces, hyphens and punctuation
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# apostrophes inside words, removed before splitting ("baker's" -> "bakers")
+APOSTROPHE_PATTERN = re.compile(r"['\u2019]")
+
+# words of an ingredient line as they are written, apostrophes included ("baker's")
+DISPLAY_WORD_PATTERN = re.compile(r"[^\W_]+(?:['\u2019][^\W_]+)*")
+
+# punctuation and spaces after the last word of a text
+TRAILING_PATTERN = re.compile(r"[\W_]+$")
+
+# quoted strings of a Cleaned_Ingredients list literal
+ITEM_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+
+# longest multi-word ingredient phrase that is recognized
+MAX_PHRASE_WORDS = 4
+
+# minimum number of recipes a multi-word phrase must appear in to become part of the vocabulary
+MIN_PHRASE_RECIPES = 2
+
+# measures and sizes that come before the ingredient name in a line (after normalization)
+MEASURE_WORDS = frozenset((
+    "cup", "tablespoon", "tbsp", "teaspoon", "tsp", "pound", "lb", "ounce", "oz", "pint", "quart", "gallon",
+    "liter", "ml", "gram", "g", "kg", "pinch", "dash", "can", "jar", "package", "stick", "bunch", "head",
+    "large", "medium", "small", "whole", "about", "plus", "more", "few", "of",
+))
+
+# plurals that the suffix rules do not fold
+IRREGULAR_PLURALS = {"leaves": "leaf", "halves": "half", "loaves": "loaf", "knives": "knife", "geese": "goose"}
+
+# prefixes of a query ingredient that every result must contain ("+chicken") or must not contain ("-peanut")
+REQUIRED_PREFIX = "+"
+EXCLUDED_PREFIX = "-"
+
+# words that never start or end a multi-word phrase ("salt and", "of olive")
+STOP_WORDS = frozenset(("and", "or", "of", "for", "with", "plus", "a", "an", "the", "to", "into", "in", "on",
+                        "at", "such", "as", "about", "more", "optional"))
+
+# words that are not an ingredient on their own, so they are never a single-word phrase ("cup", "can", "of")
+UNINDEXED_WORDS = MEASURE_WORDS | STOP_WORDS
+
+
+class IngredientPhrases:
+    """
+    Class that normalizes ingredient text and recognizes known ingredient phrases in it.
+    Words are case folded, stripped of punctuation and folded to their singular form, so "Olive Oil," and
+    "olive oils" both become "olive oil". Multi-word phrases ("olive oil", "soy sauce") are found with an
+    Aho-Corasick automaton over words, built once per dataset; every single word is a phrase as well,
+    except measures and stop words (UNINDEXED_WORDS), which would match most of the dataset.
+    """
+
+    def __init__(self, phrases):
+        """
+        Builds the automaton over the multi-word phrases.
+        :param phrases: iterable of normalized phrases of two or more words
+        """
+        # trie over words: the transitions, the failure link and the phrases that end at each node
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for phrase in phrases:
+            node = 0
+            for word in phrase.split(" "):
+                if word not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][word] = len(self.goto) - 1
+                node = self.goto[node][word]
+            self.output[node].append(phrase)
+        self.n_phrases = sum(len(phrases) for phrases in self.output)
+
+        # failure links in breadth-first order: the longest proper suffix that is also in the trie
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                # a node also ends every phrase its failure node ends ("extra virgin olive oil" ends "olive oil")
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    @classmethod
+    def from_table(cls, table) -> "IngredientPhrases":
+        """
+        Collects the multi-word ingredient names of the dataset and builds the automaton over them.
+        A name is what is left of an ingredient line without its quantity, measure and preparation notes
+        ("2 cups extra-virgin olive oil, divided" -> "extra virgin olive oil"); every run of words in a name that
+        appears in at least MIN_PHRASE_RECIPES recipes becomes a phrase ("virgin olive oil", "olive oil").
+        :param table: IngredientTable of the dataset, each distinct line is only parsed once
+        :return: the built IngredientPhrases
+        """
+        # the runs of words of every distinct line, numbered; the lines are parsed a chunk at a time
+        # and only the ids of their runs are kept
+        ids = {}
+        run_counts, run_ids = [], []
+        for lines in table.iter_lines():
+            line_runs = [{ids.setdefault(run, len(ids)) for run in cls.get_runs(cls.get_name(line))} for line in lines]
+            run_counts.append(np.fromiter(map(len, line_runs), dtype=np.int64, count=len(line_runs)))
+            run_ids.append(np.fromiter(itertools.chain.from_iterable(line_runs), dtype=np.int32))
+        run_counts = np.concatenate(run_counts) if run_counts else np.empty(0, dtype=np.int64)
+        run_ids = np.concatenate(run_ids) if run_ids else np.empty(0, dtype=np.int32)
+        run_offsets = np.concatenate(([0], np.cumsum(run_counts))).astype(np.int64)
+
+        # count every run once per recipe
+        counts = np.zeros(len(ids), dtype=np.int64)
+        for posting_runs, _ in table.iter_postings(run_ids, run_offsets):
+            counts += np.bincount(posting_runs, minlength=len(ids))
+        return cls(run for run, run_id in ids.items() if counts[run_id] >= MIN_PHRASE_RECIPES)
+
+    @staticmethod
+    def get_runs(words: list) -> list:
+        """
+        Lists the runs of two to MAX_PHRASE_WORDS words of a name that neither start nor end with a stop word.
+        :param words: normalized words of an ingredient name
+        :return: list of runs, each as its words joined by spaces
+        """
+        return [" ".join(words[start:start + length])
+                for length in range(2, min(MAX_PHRASE_WORDS, len(words)) + 1)
+                for start in range(len(words) - length + 1)
+                if words[start] not in STOP_WORDS and words[start + length - 1] not in STOP_WORDS]
+
+    @staticmethod
+    def split_items(text) -> list:
+        """
+        Splits a Cleaned_Ingredients string (a Python list literal) into its ingredient lines.
+        :param text: ingredients string of a recipe
+        :return: list of ingredient lines
+        """
+        # recipes without ingredients (missing or empty text) have no lines
+        if not isinstance(text, str) or not text:
+            return []
+        # a text that is not a list literal is a single line
+        if not text.startswith("["):
+            return [text]
+        # the quoted strings of the list, much faster than evaluating the literal
+        return [(single or double).replace("\\'", "'").replace('\\"', '"')
+                for single, double in ITEM_PATTERN.findall(text)]
+
+    @classmethod
+    def get_name(cls, item: str) -> list:
+        """
+        Returns the ingredient name of an ingredient line: its words without the leading quantity and measure
+        and without the preparation notes after a comma or in parentheses.
+        :param item: ingredient line
+        :return: list of normalized words
+        """
+        item = re.sub(r"\([^)]*\)", " ", item).split(",", 1)[0]
+        words = cls.normalize(item)
+        start = 0
+        while start < len(words) and words[start] in MEASURE_WORDS:
+            start += 1
+        return words[start:]
+
+    @classmethod
+    def get_display_name(cls, item: str) -> str:
+        """
+        Returns the ingredient name of an ingredient line as it is written, in lower case (see get_name).
+        :param item: ingredient line
+        :return: the name ("4 oz. Baker's chocolate, chopped" -> "baker's chocolate"), or "" if it has none
+        """
+        if "(" in item:
+            item = re.sub(r"\([^)]*\)", " ", item)
+        item = item.split(",", 1)[0].lower()
+        # the name runs from its first word that is not a quantity or measure to its last word
+        for word in DISPLAY_WORD_PATTERN.finditer(item):
+            normalized = normalize_word(APOSTROPHE_PATTERN.sub("", word.group()))
+            if normalized and normalized not in MEASURE_WORDS:
+                return " ".join(TRAILING_PATTERN.sub("", item[word.start():]).split())
+        return ""
+
+    @staticmethod
+    def normalize(text: str) -> list:
+        """
+        Splits text into normalized words: lower case, no punctuation, no numbers, singular.
+        :param text: any ingredient text
+        :return: list of normalized words
+        """
+        words = [normalize_word(word) for word in WORD_PATTERN.findall(APOSTROPHE_PATTERN.sub("", text.lower()))]
+        return [word for word in words if word]
+
+    @classmethod
+    def normalize_phrase(cls, text: str) -> str:
+        """
+        Normalizes an ingredient typed by the user to the phrase it is indexed under.
+        :param text: ingredient input by the user
+        :return: normalized phrase ("Green Onions" -> "green onion")
+        """
+        return " ".join(cls.normalize(text))
+
+    @staticmethod
+    def split_operator(ingredient: str) -> tuple:
+        """
+        Splits the required or excluded prefix off an ingredient typed by the user.
+        :param ingredient: ingredient input by the user ("+chicken", "-peanut" or "garlic")
+        :return: (REQUIRED_PREFIX, EXCLUDED_PREFIX or "", the ingredient without its prefix)
+        """
+        ingredient = ingredient.strip()
+        if ingredient[:1] in (REQUIRED_PREFIX, EXCLUDED_PREFIX):
+            return ingredient[0], ingredient[1:].strip()
+        return "", ingredient
+
+    @classmethod
+    def split_query(cls, user_ingredients) -> tuple:
+        """
+        Sorts the ingredients of a query by their prefix.
+        :param user_ingredients: list of ingredients input by the user, possibly prefixed
+        :return: (ingredients that count as matches, the required ones among them, excluded ingredients),
+                 each without prefixes and in the user's order
+        """
+        ingredients, required, excluded = [], [], []
+        for ingredient in user_ingredients:
+            operator, name = cls.split_operator(ingredient)
+            if operator == EXCLUDED_PREFIX:
+                excluded.append(name)
+                continue
+            ingredients.append(name)
+            if operator == REQUIRED_PREFIX:
+                required.append(name)
+        return ingredients, required, excluded
+
+    @classmethod
+    def resolve(cls, user_ingredients) -> list:
+        """
+        Normalizes the user ingredients, keeping one entry per phrase in the user's order.
+        :param user_ingredients: list of ingredients input by the user
+        :return: list of (phrase, ingredient as the user typed it first)
+        """
+        phrases = {}
+        for ingredient in user_ingredients:
+            phrases.setdefault(cls.normalize_phrase(ingredient), ingredient)
+        phrases.pop("", None)
+        return list(phrases.items())
+
+    def match(self, words: list) -> set:
+        """
+        Finds every phrase in a list of normalized words: each word that is not a measure or a stop word,
+        and each known multi-word phrase.
+        :param words: normalized words of an ingredient line
+        :return: set of the phrases found
+        """
+        found = {word for word in words if word not in UNINDEXED_WORDS}
+        node = 0
+        for word in words:
+            while node and word not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(word, 0)
+            found.update(self.output[node])
+        return found
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_word(word: str) -> str:
+    """
+    Folds a lower-case word to its singular form ("tomatoes" -> "tomato", "berries" -> "berry").
+    The same rules are applied to the dataset and to user input, so irregular results still match.
+    :param word: lower-case word
+    :return: the singular form, or an empty string for quantities ("2", "1½")
+    """
+    if any(char.isnumeric() for char in word):
+        return ""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or not word.endswith("s"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if word.endswith(("ss", "us", "is")):
+        return word
+    return word[:-1]
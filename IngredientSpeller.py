@@ -0,0 +1,165 @@
+import numpy as np
+from IngredientPhrases import IngredientPhrases, UNINDEXED_WORDS
+
+
+class IngredientSpeller:
+    """
+    Class that corrects misspelled ingredients ("tomatoe", "parmesean") to words of the dataset.
+    It is a SymSpell-style deletion index: every word of the vocabulary is stored under each string obtained by
+    deleting up to MAX_DISTANCE of its characters, and a typed word is looked up through its own deletions, so a
+    correction costs a few dozen dictionary lookups instead of an edit-distance scan of the whole vocabulary.
+    """
+
+    # largest number of edits corrected
+    MAX_DISTANCE = 2
+
+    # only the first characters of long words are indexed, which keeps the index small
+    PREFIX_LENGTH = 7
+
+    # words shorter than this are never corrected, a single edit already makes another word
+    MIN_WORD_LENGTH = 4
+
+    def __init__(self, words: list, frequencies):
+        """
+        Builds the deletion index.
+        :param words: words of the vocabulary
+        :param frequencies: number of recipes of every word, used to choose between equally close words
+        """
+        self.words = words
+        self.frequencies = frequencies
+        self.word_ids = {word: word_id for word_id, word in enumerate(words)}
+        self.deletes = {}  # deletion of a word prefix -> ids of the words it comes from
+        for word_id, word in enumerate(words):
+            for delete in self.get_deletes(word[:self.PREFIX_LENGTH]):
+                self.deletes.setdefault(delete, []).append(word_id)
+
+    @classmethod
+    def from_index(cls, index) -> "IngredientSpeller":
+        """
+        Builds the speller from the single-word phrases of an IngredientIndex.
+        :param index: IngredientIndex of the dataset
+        :return: the built IngredientSpeller
+        """
+        words = [phrase for phrase in index.postings if phrase.isalpha()]
+        return cls(words, np.array([len(index.postings[word]) for word in words], dtype=np.int64))
+
+    @classmethod
+    def get_deletes(cls, word: str) -> set:
+        """
+        Returns every string obtained by deleting up to MAX_DISTANCE characters of a word (the word included).
+        :param word: a word or word prefix
+        :return: set of the deletions
+        """
+        return set().union(*cls.get_delete_levels(word, cls.MAX_DISTANCE))
+
+    @staticmethod
+    def get_delete_levels(word: str, distance: int) -> list:
+        """
+        Returns the deletions of a word grouped by the number of deleted characters.
+        :param word: a word or word prefix
+        :param distance: largest number of deleted characters
+        :return: list of sets, the strings with 0, 1, ..., distance characters deleted
+        """
+        levels = [{word}]
+        for _ in range(distance):
+            levels.append({item[:i] + item[i + 1:] for item in levels[-1] for i in range(len(item))})
+        return levels
+
+    @staticmethod
+    def get_distance(a: str, b: str, limit: int) -> int:
+        """
+        Returns the edit distance between two words, counting an insertion, deletion, substitution
+        or swap of two adjacent characters as one edit (optimal string alignment).
+        :param a: first word
+        :param b: second word
+        :param limit: distances above the limit are not needed, limit + 1 is returned for them
+        :return: the edit distance, at most limit + 1
+        """
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+        # the common prefix and suffix take no edits
+        start = 0
+        while start < len(a) and start < len(b) and a[start] == b[start]:
+            start += 1
+        end = 0
+        while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+            end += 1
+        a, b = a[start:len(a) - end], b[start:len(b) - end]
+        if not a or not b:
+            return min(max(len(a), len(b)), limit + 1)
+
+        previous2 = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            row_min = i
+            for j in range(1, len(b) + 1):
+                value = previous[j - 1] + (a[i - 1] != b[j - 1])
+                if previous[j] + 1 < value:
+                    value = previous[j] + 1
+                if current[j - 1] + 1 < value:
+                    value = current[j - 1] + 1
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and previous2[j - 2] + 1 < value:
+                    value = previous2[j - 2] + 1
+                current[j] = value
+                if value < row_min:
+                    row_min = value
+            if row_min > limit:
+                return limit + 1
+            previous2, previous = previous, current
+        return min(previous[-1], limit + 1)
+
+    def lookup(self, word: str):
+        """
+        Finds the closest word of the vocabulary, the most common one among equally close words.
+        :param word: normalized word
+        :return: the word itself if it is in the vocabulary, its correction, or None if nothing is close enough
+        """
+        # measures and stop words are spelled right even though they are not phrases ("large egg")
+        if word in self.word_ids or word in UNINDEXED_WORDS:
+            return word
+        if len(word) < self.MIN_WORD_LENGTH:
+            return None
+        # short words allow a single edit, otherwise most short words would be a correction of another
+        limit = 1 if len(word) <= 5 else self.MAX_DISTANCE
+
+        best, best_key = None, None
+        checked = set()
+        for level, deletes in enumerate(self.get_delete_levels(word[:self.PREFIX_LENGTH], limit)):
+            # a word found by deleting this many characters is at least this many edits away,
+            # so nothing closer than the best word so far can be found from here on
+            if best_key is not None and best_key[0] < level:
+                break
+            for delete in deletes:
+                for word_id in self.deletes.get(delete, ()):
+                    if word_id in checked:
+                        continue
+                    checked.add(word_id)
+                    candidate = self.words[word_id]
+                    distance = self.get_distance(word, candidate, best_key[0] if best_key else limit)
+                    if distance <= limit:
+                        key = (distance, -self.frequencies[word_id], candidate)
+                        if best_key is None or key < best_key:
+                            best, best_key = candidate, key
+        return best
+
+    def correct(self, ingredient: str) -> str:
+        """
+        Corrects the misspelled words of an ingredient typed by the user.
+        :param ingredient: ingredient input by the user, a required or excluded prefix is kept
+        :return: the corrected phrase, or the ingredient unchanged if it is spelled right or has no correction
+        """
+        operator, name = IngredientPhrases.split_operator(ingredient)
+        words = IngredientPhrases.normalize(name)
+        if not words or all(word in self.word_ids or word in UNINDEXED_WORDS for word in words):
+            return ingredient
+        corrected = [self.lookup(word) or word for word in words]
+        return operator + " ".join(corrected) if corrected != words else ingredient
+
+    def correct_all(self, user_ingredients) -> list:
+        """
+        Corrects every ingredient of a query.
+        :param user_ingredients: list of ingredients input by the user
+        :return: list of the corrected ingredients, in the same order
+        """
+        return [self.correct(ingredient) for ingredient in user_ingredients]
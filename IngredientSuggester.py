@@ -0,0 +1,161 @@
+import bisect
+import itertools
+import numpy as np
+from IngredientPhrases import (IngredientPhrases, normalize_word, APOSTROPHE_PATTERN, DISPLAY_WORD_PATTERN,
+                               MAX_PHRASE_WORDS)
+
+
+class IngredientSuggester:
+    """
+    Class that suggests ingredients of the dataset for what the user has typed so far, most common first.
+    The suggestions are the ingredient names of the recipes as they are written ("baker's chocolate"), split into
+    the phrases of the ingredient index they are made of, so every suggestion finds recipes.
+    Every name is stored under each of its word suffixes in one sorted array ("olive oil" under "olive oil"
+    and "oil"), so the names starting with a prefix, or with a word starting with it, form one contiguous
+    range found by binary search; only that range is ranked by the number of recipes of each name.
+    """
+
+    # default number of suggestions
+    LIMIT = 8
+
+    def __init__(self, phrases: list, frequencies, keys: list, key_phrases):
+        """
+        Initializes the suggester from its prebuilt arrays.
+        :param phrases: the suggested phrases
+        :param frequencies: number of recipes of every phrase
+        :param keys: sorted search keys (the phrases and their word suffixes)
+        :param key_phrases: phrase id of every key
+        """
+        self.phrases = phrases
+        self.frequencies = frequencies
+        self.keys = keys
+        self.key_phrases = key_phrases
+        # frequency of the phrase of every key, so a range of keys is ranked without an indirection
+        self.key_frequencies = frequencies[key_phrases]
+        # largest number of keys of one phrase
+        self.max_keys = int(np.bincount(key_phrases).max()) if len(key_phrases) else 1
+
+    @classmethod
+    def from_table(cls, table, postings) -> "IngredientSuggester":
+        """
+        Builds the suggester from the ingredient names of the dataset (see IngredientPhrases.get_name), covered
+        with phrases of the ingredient index (see get_phrases) and ranked by the number of recipes they find.
+        The spellings of one phrase ("baker's chocolate", "bakers chocolate") are one suggestion, shown in its
+        most common spelling and found through the words of every spelling.
+        :param table: IngredientTable of the dataset, each distinct line is only parsed once
+        :param postings: posting lists of the ingredient index (IngredientIndex.postings)
+        :return: the built IngredientSuggester
+        """
+        # the written name of every distinct line, numbered in order of first appearance ("" without a name)
+        written = {}
+        line_written = np.fromiter((written.setdefault(name, len(written))
+                                    for name in map(IngredientPhrases.get_display_name, table.lines)),
+                                   dtype=np.int64, count=len(table.lines))
+        # the phrases of every written name as they are written, numbered in order of first appearance
+        spellings = {}
+        written_spellings = [[spellings.setdefault(phrase, len(spellings))
+                              for phrase in cls.get_phrases(name, postings)] for name in written]
+        written_counts = np.fromiter(map(len, written_spellings), dtype=np.int64, count=len(written_spellings))
+        written_offsets = np.concatenate(([0], np.cumsum(written_counts))).astype(np.int64)
+        written_ids = np.fromiter(itertools.chain.from_iterable(written_spellings), dtype=np.int64)
+        del written_spellings
+        # the spellings of every line, line after line
+        line_counts = written_counts[line_written]
+        line_offsets = np.concatenate(([0], np.cumsum(line_counts))).astype(np.int64)
+        line_spellings = written_ids[np.repeat(written_offsets[line_written] - line_offsets[:-1], line_counts)
+                                     + np.arange(line_offsets[-1])]
+
+        # the spellings of the same phrase
+        names = {}
+        spelling_names = np.array([names.setdefault(IngredientPhrases.normalize_phrase(spelling), len(names))
+                                   for spelling in spellings], dtype=np.int64)
+
+        # the number of recipes of every spelling, a chunk of recipes at a time, and of every phrase in the index
+        spelling_counts = np.zeros(len(spellings), dtype=np.int64)
+        for posting_spellings, _ in table.iter_postings(line_spellings, line_offsets):
+            spelling_counts += np.bincount(posting_spellings, minlength=len(spellings))
+        frequencies = np.array([len(postings[name]) for name in names], dtype=np.int64)
+
+        # the most common spelling of every name is shown
+        phrases = [""] * len(names)
+        shown = np.full(len(names), -1, dtype=np.int64)
+        for spelling_id, spelling in enumerate(spellings):
+            name_id = spelling_names[spelling_id]
+            if shown[name_id] < spelling_counts[spelling_id]:
+                phrases[name_id], shown[name_id] = spelling, spelling_counts[spelling_id]
+
+        # every word suffix of every spelling and of the normalized name, sorted so a prefix maps to one range
+        keys = [set() for _ in range(len(names))]
+        for text, name_id in itertools.chain(zip(spellings, spelling_names.tolist()), names.items()):
+            keys[name_id].update(text[word.start():] for word in DISPLAY_WORD_PATTERN.finditer(text))
+        entries = sorted((key, name_id) for name_id, name_keys in enumerate(keys) for key in name_keys)
+        return cls(phrases, frequencies, [key for key, _ in entries],
+                   np.array([name_id for _, name_id in entries], dtype=np.int32))
+
+    @staticmethod
+    def get_phrases(name: str, postings) -> list:
+        """
+        Covers a written ingredient name with phrases of the index: its longest run of words that is a phrase, then
+        the same for the words before and after that run. Of runs of the same length the last one is taken,
+        the ingredient itself ends an English name.
+        :param name: ingredient name as it is written (see IngredientPhrases.get_display_name)
+        :param postings: posting lists of the ingredient index, keyed by phrase
+        :return: the phrases as they are written, in the order of the name ("boneless skinless chicken breast
+                 halves" -> ["boneless", "skinless chicken breast halves"] when longer runs are not phrases)
+        """
+        # the written words with their normalized form, quantities have none
+        words = [(word.start(), word.end(), normalize_word(APOSTROPHE_PATTERN.sub("", word.group())))
+                 for word in DISPLAY_WORD_PATTERN.finditer(name)]
+        words = [word for word in words if word[2]]
+
+        runs = []
+        pending = [(0, len(words))]  # ranges of words not covered yet
+        while pending:
+            lo, hi = pending.pop()
+            for length in range(min(MAX_PHRASE_WORDS, hi - lo), 0, -1):
+                start = next((start for start in range(hi - length, lo - 1, -1)
+                              if " ".join(word[2] for word in words[start:start + length]) in postings), None)
+                if start is not None:
+                    runs.append((start, start + length))
+                    pending += [(lo, start), (start + length, hi)]
+                    break
+        return [name[words[start][0]:words[end - 1][1]] for start, end in sorted(runs)]
+
+    def suggest(self, text: str, limit: int = LIMIT) -> list:
+        """
+        Returns the most common phrases starting with the text, or with a word starting with it.
+        :param text: what the user has typed so far
+        :param limit: maximum number of suggestions
+        :return: list of phrases, most common first
+        """
+        # only case and spacing are normalized, the last word may not be complete yet
+        prefix = " ".join(text.lower().split())
+        lo, hi = self.find(prefix)
+        if lo == hi:
+            # the text is a complete word in another form ("tomatoes" -> "tomato")
+            lo, hi = self.find(IngredientPhrases.normalize_phrase(text))
+
+        # select the most common keys of the range without sorting all of it; a phrase can be found through
+        # each of its keys, so enough keys are kept to fill the limit with distinct phrases
+        frequencies = self.key_frequencies[lo:hi]
+        count = limit * self.max_keys
+        if len(frequencies) > count:
+            selected = np.argpartition(-frequencies, count - 1)[:count]
+        else:
+            selected = np.arange(len(frequencies))
+        selected = selected[np.lexsort((selected, -frequencies[selected]))]
+
+        suggestions = dict.fromkeys(self.key_phrases[lo + selected].tolist())
+        return [self.phrases[phrase_id] for phrase_id in list(suggestions)[:limit]]
+
+    def find(self, prefix: str) -> tuple:
+        """
+        Finds the range of keys starting with the prefix.
+        :param prefix: normalized prefix
+        :return: (first key, end of the range), an empty range for an empty prefix
+        """
+        if not prefix:
+            return 0, 0
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        return lo, hi
@@ -0,0 +1,160 @@
+import itertools
+import numpy as np
+from IngredientPhrases import IngredientPhrases
+from StringHeap import StringHeap
+
+
+class IngredientTable:
+    """
+    Class that holds the ingredient lines of every recipe, parsed once from the Cleaned_Ingredients strings.
+    Each distinct line ("1 cup sugar") is stored once and recipes refer to lines by integer id:
+    the lines of recipe r are lines[line_ids[offsets[r]:offsets[r + 1]]].
+    Repeated lines across recipes are shared, and the matcher only normalizes each distinct line once.
+    The distinct lines are kept in a StringHeap, like the text columns of RecipeTable.
+    """
+
+    # number of recipes or distinct lines processed at a time
+    CHUNK_SIZE = 50000
+
+    def __init__(self, lines: StringHeap, line_ids, offsets):
+        """
+        Initializes the table from its arrays.
+        :param lines: distinct ingredient lines
+        :param line_ids: line id of every ingredient of every recipe, recipe after recipe
+        :param offsets: start of every recipe in line_ids, plus the end of the last one
+        """
+        self.lines = lines
+        self.line_ids = line_ids
+        self.offsets = offsets
+        self.n_recipes = len(offsets) - 1
+        self._labels = {}  # line id -> short name, for the lines shown as missing so far
+
+    @classmethod
+    def from_ingredients(cls, ingredients) -> "IngredientTable":
+        """
+        Parses the Cleaned_Ingredients column of the dataset.
+        :param ingredients: iterable of ingredients strings (Python list literals), one per recipe in row order
+        :return: the built IngredientTable
+        """
+        ids = {}  # line -> line id
+        line_ids = []
+        offsets = [0]
+        for text in ingredients:
+            for line in IngredientPhrases.split_items(text):
+                line_ids.append(ids.setdefault(line, len(ids)))
+            offsets.append(len(line_ids))
+        return cls(StringHeap.from_strings(list(ids)), np.array(line_ids, dtype=np.int32), np.array(offsets, dtype=np.int64))
+
+    @property
+    def sizes(self):
+        """
+        Returns the number of ingredient lines of every recipe.
+        :return: numpy array with one count per recipe
+        """
+        return np.diff(self.offsets).astype(np.int32)
+
+    def get_line_ids(self, recipe_id: int):
+        """
+        Returns the line ids of the ingredients of one recipe.
+        :param recipe_id: id (row position) of the recipe
+        :return: numpy array of line ids, in the recipe's order
+        """
+        return self.line_ids[self.offsets[recipe_id]:self.offsets[recipe_id + 1]]
+
+    def iter_lines(self, chunk_size: int = CHUNK_SIZE):
+        """
+        Iterates over the distinct lines a chunk at a time, so their parsed forms are never all in memory.
+        :param chunk_size: number of lines per chunk
+        :return: iterator over lists of lines, in line id order
+        """
+        lines = iter(self.lines)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_postings(self, value_ids, value_offsets, chunk_size: int = CHUNK_SIZE):
+        """
+        Lists the values of the lines of every chunk of recipes, each recipe at most once per value.
+        :param value_ids: value ids (phrases, runs of words) of every distinct line, line after line
+        :param value_offsets: start of every line in value_ids, plus the end of the last one
+        :param chunk_size: number of recipes grouped at a time
+        :return: iterator over (value id, recipe id) of the postings of every chunk, by value then recipe
+        """
+        for start in range(0, self.n_recipes, chunk_size):
+            end = min(start + chunk_size, self.n_recipes)
+            line_ids = np.asarray(self.line_ids[self.offsets[start]:self.offsets[end]], dtype=np.int64)
+            recipes = np.repeat(np.arange(start, end, dtype=np.int64), np.diff(self.offsets[start:end + 1]))
+
+            # the values of every line of the chunk, with the recipe of the line
+            counts = value_offsets[line_ids + 1] - value_offsets[line_ids]
+            positions = np.repeat(value_offsets[line_ids] - (np.cumsum(counts) - counts), counts) + np.arange(
+                counts.sum())
+            keys = np.unique((value_ids[positions].astype(np.int64) << 32) | np.repeat(recipes, counts))
+            yield keys >> 32, (keys & 0xFFFFFFFF).astype(np.int32)
+
+    def get(self, recipe_id: int) -> list:
+        """
+        Returns the ingredient lines of one recipe.
+        :param recipe_id: id (row position) of the recipe
+        :return: list of ingredient lines, in the recipe's order
+        """
+        return [self.lines[line_id] for line_id in self.get_line_ids(recipe_id).tolist()]
+
+    def gather(self, ids) -> tuple:
+        """
+        Collects the line ids of several recipes at once, without a Python loop over the recipes.
+        :param ids: recipe ids
+        :return: (line ids of every recipe, recipe after recipe, number of lines of each recipe)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        # positions of the lines of every recipe in line_ids
+        ends = np.cumsum(lengths)
+        positions = np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+        return self.line_ids[positions], lengths
+
+    def count_lines(self, ids, lines):
+        """
+        Counts the given lines among the lines of every given recipe in one vectorized pass over their lines.
+        :param ids: recipe ids
+        :param lines: numpy array of line ids (see IngredientIndex.get_lines)
+        :return: numpy array with the number of the recipe's lines that are in lines, for each recipe
+        """
+        line_ids, lengths = self.gather(ids)
+        # sum the marks of each recipe's lines, only the gathered lines are looked up
+        recipes = np.repeat(np.arange(len(lengths)), lengths)
+        return np.bincount(recipes, weights=np.isin(line_ids, lines), minlength=len(lengths)).astype(np.int64)
+
+    def get_missing(self, ids, lines) -> list:
+        """
+        Lists the ingredients of each given recipe whose lines are not given (used for the ranked results only).
+        :param ids: recipe ids
+        :param lines: numpy array of line ids (see IngredientIndex.get_lines)
+        :return: list of the distinct missing ingredient names of each recipe, in the recipe's order
+        """
+        line_ids, lengths = self.gather(ids)
+        missing = ~np.isin(line_ids, lines)
+        counts = np.bincount(np.repeat(np.arange(len(lengths)), lengths)[missing], minlength=len(lengths))
+        # the labels of the missing lines, then split back into one list per recipe
+        missing_ids = line_ids[missing].tolist()
+        for line_id in set(missing_ids).difference(self._labels):
+            self.get_label(line_id)
+        labels = list(map(self._labels.__getitem__, missing_ids))
+        ends = np.cumsum(counts).tolist()
+        # an ingredient listed on several lines of a recipe ("salt, salt") is missing once
+        return [list(dict.fromkeys(labels[end - count:end])) for end, count in zip(ends, counts.tolist())]
+
+    def get_label(self, line_id: int) -> str:
+        """
+        Returns the short name of an ingredient line, without its quantity and preparation notes.
+        :param line_id: id of the distinct line
+        :return: the ingredient name ("2 cups olive oil, divided" -> "olive oil"), or the line if it has none
+        """
+        label = self._labels.get(line_id)
+        if label is None:
+            line = self.lines[line_id]
+            label = self._labels[line_id] = " ".join(IngredientPhrases.get_name(line)) or line
+        return label
@@ -0,0 +1,238 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# upper bounds (in seconds) of the latency histogram buckets, chosen around the budgets of an interactive UI
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# prefix of every exported metric name
+PREFIX = "recipe_finder"
+
+
+class Span:
+    """
+    Class that times one stage and reports it to Metrics when the with-block ends.
+    """
+
+    __slots__ = ("metrics", "stage", "fields", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str, fields: dict):
+        """
+        Initializes the span.
+        :param metrics: the Metrics the duration is reported to
+        :param stage: name of the timed stage, like "query.search"
+        :param fields: extra values written to the log line of the span
+        """
+        self.metrics = metrics
+        self.stage = stage
+        self.fields = fields
+        self.start = 0
+
+    def set(self, **fields):
+        """
+        Adds values (like a result count) to the log line of the span.
+        :param fields: names and values to add
+        :return: None
+        """
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is not None:
+            self.fields["error"] = error_type.__name__
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, **self.fields)
+        return False
+
+
+class NullSpan:
+    """
+    Span used while metrics are turned off: it does nothing, so instrumented code pays only a method call.
+    """
+
+    __slots__ = ()
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Metrics:
+    """
+    Class that collects the latency of each stage (loading, matching, ranking, building the result list,
+    opening a recipe) and counters like result and widget counts, for the whole process.
+    Turned off unless one of these environment variables is set:
+        RECIPE_METRICS_LOG   file to append one JSON line per timed stage to, or - for stderr
+        RECIPE_METRICS_FILE  Prometheus text file the totals are written to (every few seconds and at exit)
+    """
+
+    # the process-wide metrics
+    _metrics = None
+    _metrics_lock = threading.Lock()
+
+    # minimum number of seconds between two writes of the Prometheus file
+    EXPORT_INTERVAL = 10.0
+
+    def __init__(self, log_path: str = None, export_path: str = None, export_interval: float = EXPORT_INTERVAL):
+        """
+        Initializes the metrics.
+        :param log_path: file to append JSON log lines to, - for stderr, or None for no log
+        :param export_path: Prometheus text file to write, or None for no file
+        :param export_interval: minimum number of seconds between two writes of the Prometheus file
+        """
+        self.log_path = log_path
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.enabled = bool(log_path or export_path)
+        self._lock = threading.Lock()
+        self._last_export = 0.0
+
+        self.histograms = {}  # stage -> [count per bucket (the last one is +Inf), sum of seconds, count]
+        self.counters = {}  # name -> total
+        self.gauges = {}  # name -> last value
+
+        self._log = None
+        if log_path:
+            self._log = sys.stderr if log_path == "-" else open(log_path, "a", buffering=1)
+        if export_path:
+            atexit.register(self.export)
+
+    @classmethod
+    def get(cls) -> "Metrics":
+        """
+        Returns the process-wide metrics, configured from the environment on first use.
+        :return: the shared Metrics
+        """
+        if cls._metrics is None:
+            with cls._metrics_lock:
+                if cls._metrics is None:
+                    cls._metrics = cls(os.environ.get("RECIPE_METRICS_LOG"), os.environ.get("RECIPE_METRICS_FILE"))
+        return cls._metrics
+
+    def span(self, stage: str, **fields):
+        """
+        Returns a context manager that times the stage run inside its with-block.
+        :param stage: name of the stage, like "query.search"
+        :param fields: extra values written to the log line of the span
+        :return: a Span, or a span that does nothing if metrics are turned off
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage, fields)
+
+    def observe(self, stage: str, seconds: float, **fields):
+        """
+        Records the duration of a stage that was timed by the caller (for example across threads).
+        :param stage: name of the stage
+        :param seconds: duration of the stage
+        :param fields: extra values written to the log line
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            bucket = 0
+            while bucket < len(BUCKETS) and seconds > BUCKETS[bucket]:
+                bucket += 1
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+        if self._log is not None:
+            self.write_log(dict(stage=stage, ms=round(seconds * 1000, 3), **fields))
+        self.export_if_due()
+
+    def count(self, name: str, value: int = 1):
+        """
+        Adds to a counter (a total that only grows, like the number of queries).
+        :param name: name of the counter
+        :param value: amount to add
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value):
+        """
+        Sets a gauge (a current value, like the number of rows in the result list).
+        :param name: name of the gauge
+        :param value: current value
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def write_log(self, record: dict):
+        """
+        Writes one structured log line.
+        :param record: JSON-serializable values of the line
+        :return: None
+        """
+        record = dict(time=round(time.time(), 3), pid=os.getpid(), **record)
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._log.write(line)
+
+    def to_prometheus(self) -> str:
+        """
+        Formats the metrics in the Prometheus text exposition format.
+        :return: text of the metrics
+        """
+        lines = []
+        with self._lock:
+            name = f"{PREFIX}_stage_duration_seconds"
+            lines += [f"# HELP {name} Duration of each stage.", f"# TYPE {name} histogram"]
+            for stage, (buckets, total, count) in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ("+Inf",), buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+            for counter, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {PREFIX}_{counter}_total counter", f"{PREFIX}_{counter}_total {value}"]
+            for gauge, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {PREFIX}_{gauge} gauge", f"{PREFIX}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = None):
+        """
+        Writes the metrics to a Prometheus text file (atomically, so a scraper never reads half a file).
+        :param path: file to write, the configured export file if None
+        :return: None
+        """
+        path = path or self.export_path
+        if not path:
+            return
+        self._last_export = time.monotonic()
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+    def export_if_due(self):
+        """
+        Writes the Prometheus file if the export interval passed since the last write.
+        :return: None
+        """
+        if self.export_path and time.monotonic() - self._last_export >= self.export_interval:
+            self.export()
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Class that keeps the matches of recent queries, so a pantry that is submitted again is not recomputed.
+    Queries are keyed by their sorted, normalized phrases, so "Onions, garlic" and "garlic, onion" share
+    an entry. The least recently used entries are evicted above max_entries, entries expire after ttl seconds,
+    and everything is dropped when the dataset is reloaded.
+    A query that contains a cached one can start from its matches instead of merging every posting list.
+    """
+
+    # default number of cached queries
+    MAX_ENTRIES = 256
+
+    # default number of seconds a cached query is kept
+    TTL = 600.0
+
+    # largest number of cached entries scanned for a query contained in a new one
+    SUBSET_SCAN = 64
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        """
+        Initializes an empty cache.
+        :param max_entries: maximum number of cached queries
+        :param ttl: number of seconds a cached query is kept, or None to keep it until it is evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None  # version of the dataset the entries were computed on
+        self.entries = OrderedDict()  # sorted phrases -> (time added, result), least recently used first
+        self.hits = 0
+        self.subset_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, version: int, key: tuple):
+        """
+        Returns the cached result of a query, or else of the largest recently used query it contains.
+        :param version: version of the dataset (see RecipeStore.version)
+        :param key: sorted normalized phrases of the query
+        :return: (phrases of the cached query, its result), or None; the phrases are the key on an exact hit
+        """
+        with self._lock:
+            if not self.check_version(version):
+                self.misses += 1
+                return None
+            result = self.get_entry(key)
+            if result is not None:
+                self.hits += 1
+                return key, result
+
+            # the most recent queries that only have phrases of this one, the largest first
+            phrases = set(key)
+            best = None
+            for scanned, cached in enumerate(reversed(self.entries)):
+                if scanned == self.SUBSET_SCAN:
+                    break
+                if (len(cached) < len(key) and (best is None or len(cached) > len(best))
+                        and phrases.issuperset(cached)):
+                    best = cached
+            result = self.get_entry(best) if best is not None else None
+            if result is None:
+                self.misses += 1
+                return None
+            self.subset_hits += 1
+            return best, result
+
+    def put(self, version: int, key: tuple, result):
+        """
+        Caches the result of a query, evicting the least recently used queries above the size limit.
+        :param version: version of the dataset the result was computed on
+        :param key: sorted normalized phrases of the query
+        :param result: the result, which must not be modified afterwards
+        :return: None
+        """
+        with self._lock:
+            if not self.check_version(version) or self.max_entries <= 0:
+                return
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_entry(self, key: tuple):
+        """
+        Returns a cached result and marks it as recently used, dropping it if it expired (lock held).
+        :param key: sorted normalized phrases of the query
+        :return: the cached result, or None
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        added, result = entry
+        if self.ttl is not None and time.monotonic() - added > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def check_version(self, version: int) -> bool:
+        """
+        Drops every entry if the dataset was reloaded since they were computed (lock held).
+        :param version: version of the dataset the caller works on
+        :return: False if the caller works on an older version than the cached entries
+        """
+        if self.version is None or version > self.version:
+            self.entries.clear()
+            self.version = version
+        return version == self.version
+
+    def clear(self):
+        """
+        Drops every cached query.
+        :return: None
+        """
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss statistics of the cache.
+        :return: dict of entries, hits, subset_hits, misses, evictions and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.subset_hits + self.misses
+            return {"entries": len(self.entries), "hits": self.hits, "subset_hits": self.subset_hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": (self.hits + self.subset_hits) / lookups if lookups else 0.0}
@@ -0,0 +1,140 @@
+import numpy as np
+from IngredientPhrases import IngredientPhrases, REQUIRED_PREFIX, EXCLUDED_PREFIX
+
+
+class QuerySession:
+    """
+    Class that keeps the match state of the current ingredient list between edits.
+    Adding or removing an ingredient only touches the scores of the recipes that contain it, so results can be
+    updated live instead of rescoring the whole dataset on every Submit.
+    Required ("+chicken") and excluded ("-peanut") ingredients are applied to the candidates with
+    recipe bitmaps when the results are read.
+    The results are ranked from a copy of the state (see get_state), so they can be ranked on another thread
+    while the ingredient list keeps changing.
+    """
+
+    def __init__(self, index, title_rank, ingredient_table, bitmaps):
+        """
+        Initializes an empty session over the given index.
+        :param index: IngredientIndex of the dataset
+        :param title_rank: alphabetical rank of every recipe title (see RecipeStore.title_rank)
+        :param ingredient_table: IngredientTable of the dataset, used to find the missing ingredients
+        :param bitmaps: IngredientBitmaps of the dataset, used for the required and excluded ingredients
+        """
+        self.index = index
+        self.title_rank = title_rank
+        self.ingredient_table = ingredient_table
+        self.bitmaps = bitmaps
+        self.counts = np.zeros(index.n_recipes, dtype=np.int64)  # score of every recipe
+        self.ingredients = {}  # ingredient -> number of times it is in the user's list
+        self.phrases = {}  # phrase -> ingredients in the user's list that normalize to it, first added first
+        # prefix -> phrase -> ingredients in the user's list with that prefix that normalize to it
+        self.constraints = {REQUIRED_PREFIX: {}, EXCLUDED_PREFIX: {}}
+
+    def add(self, ingredient: str):
+        """
+        Adds an ingredient, updating only the recipes that contain it.
+        :param ingredient: ingredient input by the user, possibly prefixed with "+" or "-"
+        :return: None
+        """
+        # an ingredient that is already in the list does not count twice
+        self.ingredients[ingredient] = self.ingredients.get(ingredient, 0) + 1
+        if self.ingredients[ingredient] > 1:
+            return
+
+        # required and excluded ingredients are only recorded, an excluded one does not count as a match
+        operator, name = IngredientPhrases.split_operator(ingredient)
+        phrase = IngredientPhrases.normalize_phrase(name)
+        if operator:
+            self.constraints[operator].setdefault(phrase, []).append(name)
+            if operator == EXCLUDED_PREFIX:
+                return
+
+        # neither does another spelling of the same phrase ("Onions" after "onion")
+        self.phrases.setdefault(phrase, []).append(name)
+        if len(self.phrases[phrase]) > 1:
+            return
+
+        posting = self.index.postings.get(phrase)
+        if posting is None:
+            return
+        self.counts[posting] += 1
+
+    def remove(self, ingredient: str):
+        """
+        Removes one occurrence of an ingredient, undoing its contribution once none is left.
+        :param ingredient: ingredient to remove
+        :return: None
+        """
+        if ingredient not in self.ingredients:
+            return
+        self.ingredients[ingredient] -= 1
+        if self.ingredients[ingredient] > 0:
+            return
+        del self.ingredients[ingredient]
+
+        operator, name = IngredientPhrases.split_operator(ingredient)
+        phrase = IngredientPhrases.normalize_phrase(name)
+        if operator:
+            spellings = self.constraints[operator][phrase]
+            spellings.remove(name)
+            if not spellings:
+                del self.constraints[operator][phrase]
+            if operator == EXCLUDED_PREFIX:
+                return
+
+        # the phrase still counts while another spelling of it is in the list
+        self.phrases[phrase].remove(name)
+        if self.phrases[phrase]:
+            return
+        del self.phrases[phrase]
+
+        posting = self.index.postings.get(phrase)
+        if posting is None:
+            return
+        self.counts[posting] -= 1
+
+    def clear(self):
+        """
+        Removes every ingredient from the session.
+        :return: None
+        """
+        for ingredient in list(self.ingredients):
+            self.ingredients[ingredient] = 1
+            self.remove(ingredient)
+
+    def get_state(self) -> tuple:
+        """
+        Copies what the results depend on, so they can be ranked while the session is edited.
+        :return: (score of every recipe, phrase -> ingredient shown for it, required phrases, excluded phrases)
+        """
+        return (self.counts.copy(), {phrase: names[0] for phrase, names in self.phrases.items()},
+                [phrase for phrase in self.constraints[REQUIRED_PREFIX] if phrase],
+                [phrase for phrase in self.constraints[EXCLUDED_PREFIX] if phrase])
+
+    def results(self, top_k=None, mode: str = "matches", state=None) -> tuple:
+        """
+        Returns the current ranking, ordered like RecipeEngine.rank.
+        :param top_k: maximum number of recipes to return, or None to return every match
+        :param mode: order of the results, one of IngredientIndex.RANK_MODES
+        :param state: state returned by get_state, or None to rank the current state
+        :return: (recipe ids, number of matched ingredients, list of matched ingredients,
+                  list of missing ingredients), best first
+        """
+        counts, labels, required, excluded = state if state is not None else self.get_state()
+        # only recipes with at least one matched ingredient are candidates
+        ids = np.flatnonzero(counts)
+        # that have every required ingredient and no excluded one
+        allowed = self.bitmaps.get_allowed(required, excluded)
+        if allowed is not None:
+            ids = ids[self.bitmaps.test(allowed, ids)]
+        scores = counts[ids]
+        # the ingredient lines the user has, counted for every candidate at once
+        lines = self.index.get_lines(labels)
+        covered = self.ingredient_table.count_lines(ids, lines)
+        order = self.index.rank(ids, scores, self.title_rank, top_k, covered, mode)
+
+        ids, scores = ids[order], scores[order]
+        # matched phrases are listed only for the returned recipes, as the user spelled them
+        matched = [[labels[phrase] for phrase in phrases] for phrases in self.index.get_matched(ids, list(labels))]
+        return ids, scores, matched, self.ingredient_table.get_missing(ids, lines)
@@ -0,0 +1,69 @@
+import threading
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class QueryWorkerSignals(QObject):
+    """
+    Signals used by QueryWorker to send its result back to the GUI thread.
+    """
+    # emitted with the query generation and the result of the query
+    finished = pyqtSignal(int, object)
+    # emitted with the query generation and the error message if the query raised
+    failed = pyqtSignal(int, str)
+
+
+class QueryWorker(QRunnable):
+    """
+    Class that runs a recipe query on a thread pool so the window stays responsive.
+    Each worker is tagged with a generation number so results of superseded queries can be recognized,
+    and it can be cancelled before it starts or before it reports its result.
+    """
+
+    def __init__(self, generation: int, function, *args, **kwargs):
+        """
+        Initializes the worker with the query to run.
+        :param generation: number of the submission that created this worker
+        :param function: function that runs the query
+        :param args: positional arguments of the function
+        :param kwargs: keyword arguments of the function
+        """
+        super().__init__()
+        self.generation = generation
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = QueryWorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Cancels the query: it is skipped if it has not started yet and its result is dropped otherwise.
+        :return: None
+        """
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        """
+        Returns whether the query was cancelled.
+        :return: True if cancel() was called
+        """
+        return self._cancelled.is_set()
+
+    def run(self):
+        """
+        Runs the query on a pool thread and emits its result unless it was cancelled.
+        :return: None
+        """
+        # a newer submission already replaced this query
+        if self.is_cancelled():
+            return
+
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as error:
+            if not self.is_cancelled():
+                self.signals.failed.emit(self.generation, str(error))
+            return
+
+        if not self.is_cancelled():
+            self.signals.finished.emit(self.generation, result)
@@ -1,7 +1,10 @@
-import os.path
-from PyQt5.QtWidgets import QWidget, QLabel, QGroupBox, QTextBrowser, QGraphicsDropShadowEffect
-from PyQt5.QtGui import QFont, QColor, QPixmap
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QLabel, QGroupBox, QTextBrowser, QGraphicsDropShadowEffect, QListWidget, \
+    QListWidgetItem
+from PyQt5.QtGui import QFont, QColor
+from PyQt5.QtCore import Qt, pyqtSignal
+from RecipeStore import RecipeStore
+from ImageService import ImageService
+from Metrics import Metrics
 
 
 class RecipeDetail(QWidget):
@@ -9,13 +12,23 @@ class RecipeDetail(QWidget):
     Class that controls the Recipe Detail GUI for each recipe.
     """
 
-    def __init__(self, title, ingredient, instruction, image):
+    # emitted with the recipe id when one of the similar recipes is clicked
+    openRecipe = pyqtSignal(int)
+
+    # width of the instructions box, narrower when the similar recipes are shown next to it
+    INSTRUCTIONS_WIDTH = 641
+    INSTRUCTIONS_WIDTH_WITH_SIMILAR = 401
+
+    def __init__(self, title, ingredient, instruction, image, similar=None):
         """
         Initializes the class given a title, ingredient, instruction and image of a recipe.
         :param title: the name of a recipe
-        :param ingredient: all the ingredients of a recipe as a string
+        :param ingredient: the ingredient lines of a recipe as a list
         :param instruction: all the instructions of a recipe as a string
         :param image: the image file name of a recipe
+        :param similar: recipes with similar ingredients as dicts with recipe_id, title and similarity,
+                        an empty list to keep their place until they are found (see showSimilar),
+                        or None to leave them out
         :return None
         """
 
@@ -24,6 +37,7 @@ class RecipeDetail(QWidget):
         self.ingredients = ingredient
         self.instructions = instruction
         self.image = image
+        self.similar = similar
 
         # initiate a main widget
         self.mainWidget = QWidget(self)
@@ -32,6 +46,22 @@ class RecipeDetail(QWidget):
 
         self.showDetail()
 
+    @classmethod
+    def fromRecipeId(cls, recipe_id: int, store: RecipeStore = None) -> "RecipeDetail":
+        """
+        Creates the Recipe Detail page of a recipe, fetching its text fields from the recipe store on demand.
+        The similar recipes are looked up separately and shown once they are found (see showSimilar).
+        :param recipe_id: id (row position) of the recipe in the dataset
+        :param store: the RecipeStore the recipe belongs to, the shared store of the default dataset if None
+        :return: the RecipeDetail of the recipe
+        """
+        store = store or RecipeStore.get()
+        with Metrics.get().span("detail.fetch", recipe_id=recipe_id):
+            recipe = store.get_recipe(recipe_id)
+            # the ingredient lines were parsed when the dataset was loaded
+            ingredients = store.get_ingredients(recipe_id)
+        return cls(recipe["Title"], ingredients, recipe["Instructions"], recipe["Image_Name"], [])
+
     def showDetail(self):
         """
         Shows GUI of the Recipe Detail page for each recipe.
@@ -69,6 +99,63 @@ class RecipeDetail(QWidget):
             instructionsTextBrowser = self.getInstructionsTextBrowser(instructionsGroupBox)
             instructionsTextBrowser.append(instructions)
 
+        # show the recipes with the most similar ingredients next to the instructions
+        if self.similar is not None:
+            # create similar recipes group box and set the title
+            similarGroupBox = self.getSimilarGroupBox()
+            self.setSimilarTitle()
+
+            # create the list of similar recipes in the similar group box, filled now or once they are found
+            self.similarList = self.getSimilarList(similarGroupBox)
+            self.similarList.itemClicked.connect(self.openSimilar)
+            if self.similar:
+                self.showSimilar(self.similar)
+            else:
+                self.addSimilarNote("Finding similar recipes...")
+
+    def showSimilar(self, similar: list):
+        """
+        Fills the list of similar recipes, replacing what it showed before.
+        :param similar: recipes with similar ingredients as dicts with recipe_id, title and similarity
+        :return: None
+        """
+        self.similar = similar
+        self.similarList.clear()
+        for recipe in similar:
+            item = QListWidgetItem(f"{recipe['title']}\n{round(recipe['similarity'] * 100)}% same ingredients")
+            item.setData(Qt.UserRole, recipe["recipe_id"])
+            item.setToolTip(recipe["title"])
+            self.similarList.addItem(item)
+        if not similar:
+            self.addSimilarNote("No similar recipes")
+
+    def addSimilarNote(self, text: str):
+        """
+        Adds a line of text to the list of similar recipes that cannot be clicked.
+        :param text: text of the line
+        :return: None
+        """
+        item = QListWidgetItem(text)
+        item.setFlags(Qt.NoItemFlags)
+        self.similarList.addItem(item)
+
+    def openSimilar(self, item: object):
+        """
+        Asks for the detail page of a clicked similar recipe.
+        :param item: QListWidgetItem of the similar recipe
+        :return: None
+        """
+        recipe_id = item.data(Qt.UserRole)
+        if recipe_id is not None:
+            self.openRecipe.emit(recipe_id)
+
+    def getInstructionsWidth(self) -> int:
+        """
+        Returns the width of the instructions box, which shares its space with the similar recipes if they are shown.
+        :return: width in pixels
+        """
+        return self.INSTRUCTIONS_WIDTH_WITH_SIMILAR if self.similar is not None else self.INSTRUCTIONS_WIDTH
+
     def setRecipeTitle(self, title: str):
         """
         Sets a recipeTitle label with the given title string and handles its style.
@@ -105,11 +192,8 @@ class RecipeDetail(QWidget):
         backgroundLabel.setGeometry(0, 0, 1000, 180)
         backgroundLabel.setStyleSheet("background-color: #cccccc;")
 
-        # add image to the label
-        image_path = self.getImagePath(image)
-        pixmap = QPixmap(image_path)
-        scaled_pixmap = pixmap.scaled(backgroundLabel.width(), backgroundLabel.height(), Qt.KeepAspectRatioByExpanding)
-        backgroundLabel.setPixmap(scaled_pixmap)
+        # add image to the label once it is decoded at the label size (immediately if it was shown recently)
+        ImageService.get().request(image, backgroundLabel.size(), backgroundLabel.setPixmap)
 
     def setIngredientsTitle(self):
         """
@@ -146,7 +230,7 @@ class RecipeDetail(QWidget):
         instructionsTitle = QLabel("Instructions", self.mainWidget)
 
         # set the style of the label
-        instructionsTitle.setGeometry(310, 200, 641, 31)
+        instructionsTitle.setGeometry(310, 200, self.getInstructionsWidth(), 31)
         self.handleSubtitleStyle(instructionsTitle)
 
     def getInstructionsGroupBox(self) -> object:
@@ -158,21 +242,36 @@ class RecipeDetail(QWidget):
         instructionsGroupBox = QGroupBox(self.mainWidget)
 
         # set the style of the group box
-        instructionsGroupBox.setGeometry(310, 240, 641, 411)
+        instructionsGroupBox.setGeometry(310, 240, self.getInstructionsWidth(), 411)
         self.handleGroupBoxStyle(instructionsGroupBox)
 
         return instructionsGroupBox
 
-    @staticmethod
-    def getImagePath(image_path: str) -> str:
+    def setSimilarTitle(self):
         """
-        Returns the path to the image if it exits, otherwise the path to a default image.
-        :param image_path: path to the desired image
-        :return: path to either the desired image or the default image
+        Sets a similarTitle label and handles its style.
+        :return: None
         """
-        rout = "statics/images/"
-        name = image_path if os.path.exists(rout + image_path + ".jpg") else "default"
-        return rout + name + ".jpg"
+        # create a label for similar recipes title
+        similarTitle = QLabel("Similar", self.mainWidget)
+
+        # set the style of the label, right of the instructions
+        similarTitle.setGeometry(330 + self.INSTRUCTIONS_WIDTH_WITH_SIMILAR, 200, 221, 31)
+        self.handleSubtitleStyle(similarTitle)
+
+    def getSimilarGroupBox(self) -> object:
+        """
+        Creates a group box to wrap the similar recipes and handles its style.
+        :return: a group box to wrap the similar recipes
+        """
+        # create a group box to wrap the similar recipes
+        similarGroupBox = QGroupBox(self.mainWidget)
+
+        # set the style of the group box
+        similarGroupBox.setGeometry(330 + self.INSTRUCTIONS_WIDTH_WITH_SIMILAR, 240, 221, 411)
+        self.handleGroupBoxStyle(similarGroupBox)
+
+        return similarGroupBox
 
     @staticmethod
     def getIngredientsTextBrowser(ingredients_group_box: object) -> object:
@@ -197,29 +296,38 @@ class RecipeDetail(QWidget):
         """
         # create a text browser with given instructions group box
         instructionsTextBrowser = QTextBrowser(instructions_group_box)
-        instructionsTextBrowser.setGeometry(0, 0, 641, 411)
+        instructionsTextBrowser.setGeometry(0, 0, instructions_group_box.width(), 411)
         instructionsTextBrowser.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
         return instructionsTextBrowser
 
     @staticmethod
-    def handleIngredients(ingredients: str) -> str:
+    def getSimilarList(similar_group_box: object) -> object:
         """
-        Modifies the given ingredients text style to show it appropriately on the screen.
-        :param ingredients: ingredients text with a list format
-        :return: modified ingredients text
+        Creates similarList to put the similar recipes and sets its location.
+        :param similar_group_box: QGroupBox object to wrap the similar recipes
+        :return: QListWidget added to the given group box
         """
-        # remove '[' and ']' signs at the beginning and end and split it
-        split_list = ingredients[1:-1].split("', '")
+        # create a list with given similar group box, one clickable recipe per item
+        similarList = QListWidget(similar_group_box)
+        similarList.setGeometry(0, 0, 221, 411)
+        similarList.setWordWrap(True)
+        similarList.setSpacing(4)
+        similarList.setCursor(Qt.PointingHandCursor)
+        similarList.setStyleSheet("border: none;"
+                                  "font-size: 13px;")
 
-        # to handle ' sign at the beginning of the first element and at the end of the last element
-        first = split_list.pop(0)
-        last = split_list.pop()
+        return similarList
 
-        # add emoji at the beginning of each element and add the first and last element
-        res_list = ["✔️ " + s for s in split_list]
-        res_list.insert(0, "✔️ " + first[1:])
-        res_list.append("✔️ " + last[:-1])
+    @staticmethod
+    def handleIngredients(ingredients: list) -> str:
+        """
+        Modifies the given ingredients text style to show it appropriately on the screen.
+        :param ingredients: list of ingredient lines
+        :return: modified ingredients text
+        """
+        # add emoji at the beginning of each element
+        res_list = ["✔️ " + s for s in ingredients]
 
         return "\n\n".join(res_list)
 
@@ -0,0 +1,278 @@
+import pandas as pd
+from IngredientPhrases import IngredientPhrases
+from Metrics import Metrics
+from QueryCache import QueryCache
+from RecipeStore import RecipeStore, DATA_PATH
+
+
+class RecipeEngine:
+    """
+    Class that loads the recipe data and matches user ingredients against it, without any GUI dependency.
+    RecipeList calls into it, and it can be used without a display (see batch.py).
+    """
+
+    # maximum number of recipes ranked and returned for a query by default
+    RESULT_LIMIT = 200
+
+    def __init__(self, store: RecipeStore = None, cache_size: int = QueryCache.MAX_ENTRIES):
+        """
+        Initializes the engine over a recipe store.
+        :param store: the RecipeStore to query, the shared store of the default dataset if None
+        :param cache_size: number of recent queries whose matches are cached, 0 to compute every query
+        """
+        self.store = store or RecipeStore.get(DATA_PATH)
+        self.cache = QueryCache(cache_size) if cache_size > 0 else None
+
+    def rank(self, user_ingredients, backend: str = "index", top_k=RESULT_LIMIT, mode: str = "matches") -> tuple:
+        """
+        Finds the recipes with the user ingredients and ranks them from most user ingredients to least,
+        then fewest missing ingredients, then title (or by coverage or fewest missing first, see mode)
+        Misspelled ingredients are corrected to the closest ingredient of the dataset first
+        Ingredients prefixed with "+" must be in every result and ingredients prefixed with "-" in none
+        :param user_ingredients: list of ingredients input by the user ("garlic", "+chicken", "-peanut")
+        :param backend: "index" to merge the inverted index posting lists,
+                        "matrix" to score with a sparse matrix-vector product
+        :param top_k: number of best recipes to keep (partial ranking), or None to keep every match
+        :param mode: order of the results, one of IngredientIndex.RANK_MODES
+        :return: (recipe ids, number of matched ingredients, list of matched ingredients,
+                  list of missing ingredients), best first
+        """
+        metrics = Metrics.get()
+        metrics.count("queries")
+
+        # the prebuilt scoring structure of the chosen backend
+        engine = self.store.matrix if backend == "matrix" else self.store.index
+        phrases, labels, allowed = self.parse(user_ingredients)
+
+        # look up the recipes containing each user ingredient and how many of them each recipe matched
+        with metrics.span("query.search", backend=backend, ingredients=len(phrases)) as span:
+            ids, scores = self.count(engine, phrases, span, allowed)
+            span.set(matches=len(ids))
+        return self.rank_matches(ids, scores, phrases, labels, top_k, mode)
+
+    def rank_batch(self, pantries, backend: str = "index", top_k=RESULT_LIMIT, mode: str = "matches") -> list:
+        """
+        Ranks the recipes for many pantries, like rank for each of them
+        With the matrix backend the matches of all the pantries are counted together (see IngredientMatrix.count_batch)
+        :param pantries: list of ingredient lists, one per user
+        :param backend: "index" or "matrix" (see rank)
+        :param top_k: number of best recipes to keep per pantry, or None to keep every match
+        :param mode: order of the results (see rank)
+        :return: list of (recipe ids, number of matched ingredients, list of matched ingredients,
+                 list of missing ingredients), one per pantry
+        """
+        if backend != "matrix":
+            return [self.rank(pantry, backend, top_k, mode) for pantry in pantries]
+
+        metrics = Metrics.get()
+        metrics.count("queries", len(pantries))
+        queries = [self.parse(pantry) for pantry in pantries]
+        with metrics.span("query.search_batch", backend=backend, pantries=len(pantries)):
+            counts = self.store.matrix.count_batch([phrases for phrases, _, _ in queries],
+                                                   [allowed for _, _, allowed in queries])
+        return [self.rank_matches(ids, scores, phrases, labels, top_k, mode)
+                for (ids, scores), (phrases, labels, _) in zip(counts, queries)]
+
+    def parse(self, user_ingredients) -> tuple:
+        """
+        Turns the ingredients of a query into the phrases that are searched
+        Misspelled ingredients are corrected to the closest ingredient of the dataset first
+        :param user_ingredients: list of ingredients input by the user ("garlic", "+chicken", "-peanut")
+        :return: (distinct phrases in the user's order, phrase -> spelling shown to the user,
+                  packed bitmap of the recipes with every required ingredient and no excluded one,
+                  or None without constraints)
+        """
+        metrics = Metrics.get()
+
+        # correct the misspelled ingredients ("tomatoe" -> "tomato")
+        with metrics.span("query.correct", ingredients=len(user_ingredients)):
+            user_ingredients = self.store.speller.correct_all(user_ingredients)
+
+        # one phrase per distinct ingredient, in the user's order, with the spelling shown to the user
+        user_ingredients, required, excluded = IngredientPhrases.split_query(user_ingredients)
+        resolved = IngredientPhrases.resolve(user_ingredients)
+        phrases = [phrase for phrase, _ in resolved]
+        labels = dict(resolved)
+
+        # the recipes with every required ingredient and no excluded one, so the others are never counted
+        required = [phrase for phrase, _ in IngredientPhrases.resolve(required)]
+        excluded = [phrase for phrase, _ in IngredientPhrases.resolve(excluded)]
+        allowed = None
+        if required or excluded:
+            with metrics.span("query.filter", required=len(required), excluded=len(excluded)):
+                allowed = self.store.bitmaps.get_allowed(required, excluded)
+        return phrases, labels, allowed
+
+    def rank_matches(self, ids, scores, phrases: list, labels: dict, top_k=RESULT_LIMIT,
+                     mode: str = "matches") -> tuple:
+        """
+        Ranks the recipes that matched a query and lists their matched and missing ingredients
+        :param ids: recipe ids of the matches in ascending order
+        :param scores: number of matched phrases per recipe
+        :param phrases: distinct phrases of the query (see parse)
+        :param labels: phrase -> spelling shown to the user
+        :param top_k: number of best recipes to keep (partial ranking), or None to keep every match
+        :param mode: order of the results, one of IngredientIndex.RANK_MODES
+        :return: (recipe ids, number of matched ingredients, list of matched ingredients,
+                  list of missing ingredients), best first
+        """
+        # rank only the matching recipes, selecting the best top_k without sorting all of them
+        with Metrics.get().span("query.rank", matches=len(ids), top_k=top_k, mode=mode):
+            index, ingredients = self.store.index, self.store.ingredients
+            # the ingredient lines the user has, counted for every matching recipe at once
+            lines = index.get_lines(phrases)
+            covered = ingredients.count_lines(ids, lines)
+            order = index.rank(ids, scores, self.store.title_rank, top_k, covered, mode)
+            ids, scores = ids[order], scores[order]
+            # which ingredients each ranked recipe matched and misses, only for the recipes that are returned
+            target_ingredients = [[labels[phrase] for phrase in matched] for matched in index.get_matched(ids, phrases)]
+            missing_ingredients = ingredients.get_missing(ids, lines)
+        return ids, scores, target_ingredients, missing_ingredients
+
+    def count(self, engine, phrases: list, span, allowed=None) -> tuple:
+        """
+        Counts the matched phrases of every recipe, reusing the matches of recent queries.
+        On an exact hit nothing is computed; if a recent query had only some of the phrases,
+        only the posting lists of the other phrases are merged into its matches.
+        :param engine: the IngredientIndex or IngredientMatrix to compute with
+        :param phrases: distinct normalized phrases of the query
+        :param span: metrics span of the search, the cache outcome is added to it
+        :param allowed: packed bitmap of the recipes that can match (see IngredientBitmaps.get_allowed),
+                        or None to count every recipe
+        :return: (recipe ids in ascending order, number of matched phrases per recipe)
+        """
+        # matches restricted by required or excluded ingredients are not cached, other queries cannot reuse them
+        if self.cache is None or not phrases or allowed is not None:
+            return engine.count(phrases, allowed)
+
+        # the same pantry in any order or spelling has the same key
+        key = tuple(sorted(phrases))
+        version = self.store.version
+        cached = self.cache.get(version, key)
+        if cached is not None and cached[0] == key:
+            Metrics.get().count("query_cache_hits")
+            span.set(cache="hit")
+            return cached[1]
+
+        if cached is not None:
+            # extend the matches of the recent query with the phrases it did not have
+            Metrics.get().count("query_cache_subset_hits")
+            span.set(cache="subset")
+            cached_key, (ids, scores) = cached
+            ids, scores = engine.extend(ids, scores, set(key) - set(cached_key))
+        else:
+            Metrics.get().count("query_cache_misses")
+            span.set(cache="miss")
+            ids, scores = engine.count(phrases)
+        # the cached arrays are shared by later queries
+        ids.flags.writeable = scores.flags.writeable = False
+        self.cache.put(version, key, (ids, scores))
+        return ids, scores
+
+    def filter_data(self, user_ingredients, backend: str = "index", top_k=RESULT_LIMIT,
+                    mode: str = "matches") -> pd.DataFrame:
+        """
+        Filters the data set so only recipes with the user ingredients appears
+        Sort the list of recipes from most user ingredients to least, then fewest missing ingredients, then title
+        :param user_ingredients: list of ingredients input by the user
+        :param backend: "index" or "matrix" (see rank)
+        :param top_k: number of best recipes to keep (partial ranking), or None to keep every match
+        :param mode: order of the results (see rank)
+        :return: the filtered dataset
+        """
+        return self.make_result_frame(*self.rank(user_ingredients, backend, top_k, mode))
+
+    def make_result_frame(self, ids, scores, target_ingredients, missing_ingredients) -> pd.DataFrame:
+        """
+        Builds the filtered dataset from ranked query results
+        Only the titles of the ranked recipes are loaded, the other fields are loaded when a recipe is opened
+        :param ids: ids (row positions) of the ranked recipes
+        :param scores: number of matched ingredients of each recipe
+        :param target_ingredients: list of matched ingredients of each recipe
+        :param missing_ingredients: list of missing ingredients of each recipe
+        :return: the titles of the recipes with Target_Ingredients, Missing_Ingredients and score columns,
+                 indexed by recipe id, in ranked order
+        """
+        with Metrics.get().span("query.take", results=len(ids)):
+            return self.store.take(ids, columns=("Title",)).assign(Target_Ingredients=target_ingredients,
+                                                                  Missing_Ingredients=missing_ingredients,
+                                                                  score=scores)
+
+    def query(self, user_ingredients, backend: str = "index", top_k=RESULT_LIMIT, mode: str = "matches") -> list:
+        """
+        Ranks the recipes for the user ingredients as plain records (for JSON output)
+        :param user_ingredients: list of ingredients input by the user
+        :param backend: "index" or "matrix" (see rank)
+        :param top_k: number of best recipes to keep, or None to keep every match
+        :param mode: order of the results (see rank)
+        :return: list of dicts with recipe_id, title, score, matched and missing ingredients, best first
+        """
+        return self.make_records(*self.rank(user_ingredients, backend, top_k, mode))
+
+    def query_batch(self, pantries, backend: str = "index", top_k=RESULT_LIMIT, mode: str = "matches") -> list:
+        """
+        Ranks the recipes for many pantries as plain records (see rank_batch and query)
+        :param pantries: list of ingredient lists, one per user
+        :param backend: "index" or "matrix" (see rank)
+        :param top_k: number of best recipes to keep per pantry, or None to keep every match
+        :param mode: order of the results (see rank)
+        :return: list of result records (see query), one per pantry
+        """
+        return [self.make_records(*results) for results in self.rank_batch(pantries, backend, top_k, mode)]
+
+    def make_records(self, ids, scores, target_ingredients, missing_ingredients) -> list:
+        """
+        Builds the plain records of ranked query results
+        :param ids: ids (row positions) of the ranked recipes
+        :param scores: number of matched ingredients of each recipe
+        :param target_ingredients: list of matched ingredients of each recipe
+        :param missing_ingredients: list of missing ingredients of each recipe
+        :return: list of dicts with recipe_id, title, score, matched and missing ingredients, best first
+        """
+        titles = self.store.take(ids, columns=("Title",))["Title"].tolist()
+        return [{"recipe_id": recipe_id, "title": title if isinstance(title, str) else "", "score": score,
+                 "matched": matched, "missing": missing}
+                for recipe_id, title, score, matched, missing
+                in zip(ids.tolist(), titles, scores.tolist(), target_ingredients, missing_ingredients)]
+
+    def search_text(self, query: str, top_k=RESULT_LIMIT, prefix: bool = False) -> tuple:
+        """
+        Finds the recipes whose title or instructions match a text query and ranks them by BM25, then title
+        :param query: words and quoted phrases typed by the user, e.g. 'risotto "slow cooker"'
+        :param top_k: number of best recipes to keep, or None to keep every match
+        :param prefix: whether the last word is still being typed (see TextIndex.search)
+        :return: (recipe ids, BM25 scores), best first
+        """
+        metrics = Metrics.get()
+        metrics.count("text_queries")
+        text_index = self.store.text_index
+        with metrics.span("text.search") as span:
+            ids, scores = text_index.search(query, prefix)
+            span.set(matches=len(ids))
+        with metrics.span("text.rank", matches=len(ids), top_k=top_k):
+            order = text_index.rank(ids, scores, self.store.title_rank, top_k)
+        return ids[order], scores[order]
+
+    def filter_text(self, query: str, top_k=RESULT_LIMIT, prefix: bool = False) -> pd.DataFrame:
+        """
+        Ranks the recipes for a text query (see search_text) with their titles
+        :param query: words and quoted phrases typed by the user
+        :param top_k: number of best recipes to keep, or None to keep every match
+        :param prefix: whether the last word is still being typed
+        :return: the titles of the recipes with a score column, indexed by recipe id, in ranked order
+        """
+        ids, scores = self.search_text(query, top_k, prefix)
+        with Metrics.get().span("query.take", results=len(ids)):
+            return self.store.take(ids, columns=("Title",)).assign(score=scores)
+
+    def query_text(self, query: str, top_k=RESULT_LIMIT) -> list:
+        """
+        Ranks the recipes for a text query as plain records (for JSON output)
+        :param query: words and quoted phrases typed by the user
+        :param top_k: number of best recipes to keep, or None to keep every match
+        :return: list of dicts with recipe_id, title and score, best first
+        """
+        frame = self.filter_text(query, top_k)
+        return [{"recipe_id": recipe_id, "title": title, "score": score}
+                for recipe_id, title, score in zip(frame.index.tolist(), frame["Title"].tolist(),
+                                                   frame["score"].tolist())]
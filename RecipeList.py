@@ -1,11 +1,18 @@
 import sys
-from PyQt5.QtWidgets import (QWidget, QLabel, QVBoxLayout, QPushButton, QGraphicsDropShadowEffect,
-                             QHBoxLayout, QLineEdit, QListWidget, QScrollArea)
-from PyQt5.QtGui import QFont, QColor, QPixmap
-from PyQt5.QtCore import Qt
-import pandas as pd
+import time
+from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QGraphicsDropShadowEffect, QLineEdit, QListWidget,
+                             QListWidgetItem, QTableView, QHeaderView, QAbstractItemView, QCompleter, QComboBox)
+from PyQt5.QtGui import QFont, QColor
+from PyQt5.QtCore import Qt, QThreadPool, QStringListModel, QTimer
 from RecipeDetail import RecipeDetail
-from functools import partial
+from ImageService import ImageService
+from IngredientPhrases import IngredientPhrases, REQUIRED_PREFIX, EXCLUDED_PREFIX
+from IngredientSuggester import IngredientSuggester
+from Metrics import Metrics
+from RecipeEngine import RecipeEngine
+from QueryWorker import QueryWorker
+from QuerySession import QuerySession
+from RecipeTableModel import RecipeTableModel, RecipeItemDelegate
 
 
 class RecipeList(QWidget):
@@ -13,16 +20,57 @@ class RecipeList(QWidget):
     Class that controls the main GUI and manages layout, taking user input, filtering the data, and updating the UI
     """
 
-    def __init__(self, width, height):
+    # maximum number of recipes ranked and displayed for a query
+    RESULT_LIMIT = RecipeEngine.RESULT_LIMIT
+
+    # orders of the results offered to the user (see IngredientIndex.RANK_MODES), with their labels
+    RANK_MODE_LABELS = (("matches", "Matches"), ("coverage", "Coverage"), ("missing", "Missing"))
+
+    # what the input line searches: ingredients added to the list, or the titles and instructions as the user types
+    SEARCH_MODE_LABELS = (("ingredients", "Ingredients"), ("text", "Text"))
+
+    # structures of the dataset the query session is made of, and the speller of its ingredients
+    # (see get_query_session)
+    SESSION_STRUCTURES = ("ingredients", "index", "title_rank", "bitmaps", "speller")
+
+    # structures of the dataset built on the data thread when the page opens, in the order they are needed
+    LOADED_STRUCTURES = ("ingredients", "index", "suggester", "speller", "title_rank", "bitmaps", "text_index",
+                         "similarity")
+
+    # data role of an ingredient of the list that holds what the user typed, until its spelling is corrected
+    UNCORRECTED_ROLE = Qt.UserRole + 1
+
+    # placeholder of the input line in each search mode
+    SEARCH_MODE_PLACEHOLDERS = {"ingredients": "Enter your ingredient here (+chicken: must have, -peanut: exclude)",
+                                "text": 'Search recipe titles and instructions (risotto, "slow cooker")'}
+
+    def __init__(self, width, height, engine=None):
         """
         Initializes the class given a width and height
         Contains variables involving widget layouts, display, and list contents
         :param width of window
         :param height of window
+        :param engine: RecipeEngine that loads and filters the data, the engine of the default dataset if None
         """
         super().__init__()
         self.width, self.height = width, height  # sets the width and height of the window
         self.user_ingredients = []  # an empty list to hold the user-input ingredients
+        self.engine = engine or RecipeEngine()  # loads and filters the recipe data (no GUI code)
+        self.querySession = None  # match state of the ingredient list, updated live as ingredients change
+
+        # queries run on a single background thread so the window does not freeze while they run
+        self.queryPool = QThreadPool(self)
+        self.queryPool.setMaxThreadCount(1)
+        self.queryGeneration = 0  # number of the latest submission, older results are ignored
+        self.activeQuery = None  # worker of the latest submission
+        self.querySubmitted = 0  # time the latest submission started, for its end-to-end latency
+
+        # the structures of the dataset are built on their own thread, so the first Add does not freeze the window
+        self.dataPool = QThreadPool(self)
+        self.dataPool.setMaxThreadCount(1)
+        self.loading = set()  # names of the structures being built on the data thread
+        self.detailGeneration = 0  # number of the latest detail page, similar recipes of older pages are ignored
+        self.similarQuery = None  # worker looking up the similar recipes of the latest detail page
 
         # main widget layout and properties
         self.mainWidget = QWidget(self)
@@ -38,20 +86,27 @@ class RecipeList(QWidget):
         self.submitButton = QPushButton('Submit', self.mainWidget)
         self.clearButton = QPushButton('Clear All', self.mainWidget)
 
+        # initializing the choice of how results are ordered and of what the input line searches
+        self.rankModeBox = QComboBox(self.mainWidget)
+        self.searchModeBox = QComboBox(self.mainWidget)
+
+        # initializing the autocomplete popup of the input line and the list of suggestions it shows
+        self.ingredientCompleter = QCompleter(self)
+        self.suggestionModel = QStringListModel(self)
+
         # initializing the list of ingredients
         self.ingredientList = QListWidget(self.mainWidget)
 
         # initializing the recipe details by calling the class RecipeDetail
         self.detailWidget = RecipeDetail(None, None, None, None)
 
-        # initializing the scrolling area that contains the list of ingredients
-        self.scrollArea = QScrollArea(self.mainWidget)
-        self.scrollAreaWidgetContents = QWidget()
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents)
-
-        # initializing a layout to organize content within the scrolling area
-        self.recipeLayout = QVBoxLayout(self.scrollAreaWidgetContents)
+        # initializing the scrolling table of recipes: a view over a model of the results,
+        # which only paints the rows that are visible
+        self.recipeView = QTableView(self.mainWidget)
+        self.recipeModel = RecipeTableModel(self.recipeView)
+        self.recipeDelegate = RecipeItemDelegate(self.recipeView)
+        self.recipeView.setModel(self.recipeModel)
+        self.recipeView.setItemDelegate(self.recipeDelegate)
 
         # allows for setting up the layout with the setup_ui function
         self.setup_ui()
@@ -59,6 +114,9 @@ class RecipeList(QWidget):
         # displays the main page
         self.show_recipe_list()
 
+        # builds the structures of the dataset in the background
+        self.load_data()
+
     def setup_ui(self):
         """
         Organizes the main layout of the page
@@ -68,15 +126,12 @@ class RecipeList(QWidget):
         # setting the dimensions and color
         self.backgroundLabel.setGeometry(0, 0, 1000, 121)
         self.backgroundLabel.setStyleSheet("background-color: #cccccc;")
-        # uses pixmap to map the image from the statics folder
-        pixmap = QPixmap("statics/images/default.jpg")
-        # scales the image to match the defined area
-        scaled_pixmap = pixmap.scaled(self.backgroundLabel.width(), self.backgroundLabel.height(),
-                                      Qt.KeepAspectRatioByExpanding)
-        self.backgroundLabel.setPixmap(scaled_pixmap)
+        # loads the default image from the statics folder in the background, scaled to match the defined area
+        ImageService.get().request("default", self.backgroundLabel.size(), self.backgroundLabel.setPixmap)
 
         # input line: box where the user inputs ingredients
-        self.inputLine.setPlaceholderText("Enter your ingredient here")  # text that goes away once user types
+        # text that goes away once user types
+        self.inputLine.setPlaceholderText(self.SEARCH_MODE_PLACEHOLDERS["ingredients"])
         # styling the input line
         self.inputLine.setGeometry(40, 40, 811, 41)
         self.inputLine.setStyleSheet("border: None;"
@@ -91,6 +146,15 @@ class RecipeList(QWidget):
         # allow user to press "return" in order to call the handle_input function
         self.inputLine.returnPressed.connect(self.handle_input)
 
+        # autocomplete: suggests ingredients of the dataset, most common first, on every keystroke
+        self.ingredientCompleter.setModel(self.suggestionModel)
+        # the suggestions are already filtered and ranked, so the popup shows them as they are
+        self.ingredientCompleter.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.ingredientCompleter.setMaxVisibleItems(IngredientSuggester.LIMIT)
+        self.ingredientCompleter.popup().setFont(QFont("Arial", 14))
+        self.inputLine.setCompleter(self.ingredientCompleter)
+        self.inputLine.textEdited.connect(self.handle_edit)
+
         # add button: button clicked to add that ingredient to the user list
         self.addButton.clicked.connect(self.handle_input)  # clicking the add button calls the handle_input function
         # styling the button
@@ -117,6 +181,9 @@ class RecipeList(QWidget):
                                           "background-color: #eeeeee;"
                                           "padding: 15px;")
         self.ingredientList.setFont(QFont("Arial", 14))
+        # double-clicking an ingredient removes it from the list
+        self.ingredientList.setToolTip("Double-click an ingredient to remove it")
+        self.ingredientList.itemDoubleClicked.connect(self.remove_ingredient)
         # styling the scroll bar to be hidden
         self.ingredientList.verticalScrollBar().setStyleSheet("""
                             QScrollBar:vertical {
@@ -148,276 +215,573 @@ class RecipeList(QWidget):
         # changes cursor style on button
         self.submitButton.setCursor(Qt.PointingHandCursor)
 
-        # scroll area: a scrollable area containing widgets including the list of original recipes (before filter)
+        # rank mode box: orders the results by matched ingredients, by the share of the recipe the user has,
+        # or by fewest missing ingredients
+        for mode, label in self.RANK_MODE_LABELS:
+            self.rankModeBox.addItem(label, mode)
+        self.rankModeBox.setGeometry(870, 92, 91, 31)
+        self.rankModeBox.setFont(QFont("Arial", 12))
+        self.rankModeBox.setStyleSheet("QComboBox {"
+                                       "    background-color: white;"
+                                       "    color: #333333;"
+                                       "    border: None;"
+                                       "    border-radius: 7px;"
+                                       "    padding-left: 8px;"
+                                       "}"
+                                       "QComboBox::drop-down { border: None; width: 0px; }")  # no arrow, the label fits
+        self.rankModeBox.setToolTip("Order of the recipes: most matched ingredients, largest share of the recipe "
+                                    "you have, or fewest missing ingredients")
+        self.rankModeBox.setCursor(Qt.PointingHandCursor)
+        self.rankModeBox.currentIndexChanged.connect(self.change_rank_mode)
+
+        # search mode box: searches with the ingredient list, or the recipe titles and instructions as the user types
+        for mode, label in self.SEARCH_MODE_LABELS:
+            self.searchModeBox.addItem(label, mode)
+        self.searchModeBox.setGeometry(750, 92, 101, 31)
+        self.searchModeBox.setFont(QFont("Arial", 12))
+        self.searchModeBox.setStyleSheet(self.rankModeBox.styleSheet())
+        self.searchModeBox.setToolTip("Search with your ingredients, or search the recipe titles and instructions "
+                                      "(put a phrase in quotes)")
+        self.searchModeBox.setCursor(Qt.PointingHandCursor)
+        self.searchModeBox.currentIndexChanged.connect(self.change_search_mode)
+
+        # recipe view: a scrollable table containing the list of original recipes (before filter)
         # styling the area
-        self.scrollArea.setGeometry(40, 250, 921, 401)
+        self.recipeView.setGeometry(40, 250, 921, 401)
+        self.recipeView.setStyleSheet("border: None;"
+                                      "background-color: rgb(248, 248, 248);")
+        # styling the column headers
+        self.recipeView.horizontalHeader().setStyleSheet("QHeaderView::section {"
+                                                         "    border: None;"
+                                                         "    color: #333333;"
+                                                         "    background-color: rgb(248, 248, 248);"
+                                                         "    font: bold 16pt Arial;"
+                                                         "}")
+        self.recipeView.horizontalHeader().setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        self.recipeView.horizontalHeader().setFixedHeight(40)
+        self.recipeView.horizontalHeader().setStretchLastSection(True)
+        self.recipeView.verticalHeader().hide()
+        # every row has the same height, so the view never has to measure the rows
+        self.recipeView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.recipeView.verticalHeader().setDefaultSectionSize(RecipeItemDelegate.ROW_HEIGHT)
+        self.recipeView.setShowGrid(False)
+        self.recipeView.setSelectionMode(QAbstractItemView.NoSelection)
+        self.recipeView.setFocusPolicy(Qt.NoFocus)
+        self.recipeView.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.recipeView.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.recipeView.setMouseTracking(True)  # repaints the hovered recipe button
+        self.recipeView.viewport().setCursor(Qt.PointingHandCursor)
+        # opens the detail page if user clicks a recipe title
+        self.recipeView.clicked.connect(self.handle_recipe_click)
         # styling the scroll bar
-        self.scrollArea.verticalScrollBar().setStyleSheet("""
+        self.recipeView.verticalScrollBar().setStyleSheet("""
                     QScrollBar:vertical {
                         background: None;
                         width:10px; 
                         margin: 0px 0px 0px 0px;
                     }""")
-        self.scrollAreaWidgetContents.setGeometry(0, 0, 919, 399)
 
     def show_recipe_list(self):
         """
         Displays the original list of recipes in default order prior to the user inputting ingredients
         """
-        # loading the data
-        data = self.load_data()
-        # calling a function to break up the data columns
-        titles, images, ingredients, instructions = self.convert_df(data)
-
-        # iterate through each row of the recipe data
-        for idx in range(50):  # shows 50 recipes by default for application efficiency
-            # gets the item at each index in each feature
-            title, ingredient, instruction, image = titles[idx], ingredients[idx], instructions[idx], images[idx]
-
-            # create button with the title of recipe and connect it with a details page
-            btn = QPushButton(str(title))
-            btn.clicked.connect(
-                # opens the corresponding information for the recipe
-                lambda _, t=title, ing=ingredient, ins=instruction, img=image: self.open_detail_page(t, ing, ins, img)
-            )
-            # set button style and dimensions
-            btn.setFixedSize(871, 40)
-            self.set_button_style(btn)  # calls set_button_style function
-
-            # adds the button to the recipe layout (vertical layout box inside the scrollable area)
-            self.recipeLayout.addWidget(btn)
-            self.recipeLayout.update()  # updates the layout for clarity
+        metrics = Metrics.get()
+
+        # loading the first recipes of the data (decoded from the snapshot when there is one)
+        with metrics.span("recipe_list.load"):
+            store = self.engine.store
+            data = store.take(range(min(50, store.n_recipes)), columns=("Title",))
+
+        # shows 50 recipes by default, without the matched ingredients column
+        with metrics.span("recipe_list.update", rows=len(data)):
+            self.recipeModel.set_results(data, show_matches=False)
+            self.recipeView.horizontalHeader().hide()
+        metrics.gauge("list_rows", len(data))
+
+    def load_data(self):
+        """
+        Builds the structures of the dataset that are not built yet on the data thread, one worker per structure
+        Each structure is reported to the GUI thread once it is built (see handle_loaded)
+        :return: None
+        """
+        store = self.engine.store
+        for name in self.LOADED_STRUCTURES:
+            if name in self.loading or store.is_built(name):
+                continue
+            self.loading.add(name)
+            worker = QueryWorker(store.version, store.prepare, name)
+            worker.signals.finished.connect(self.handle_loaded)
+            worker.signals.failed.connect(self.show_load_error)
+            self.dataPool.start(worker)
+
+    def handle_loaded(self, version, name):
+        """
+        Receives a structure built on the data thread
+        Once the query session can be created, the ingredients added in the meantime are ranked
+        :param version: version of the dataset the structure was built for
+        :param name: name of the structure
+        :return: None
+        """
+        self.loading.discard(name)
+        # suggestions for what was typed while the suggester was built
+        if name == "suggester" and self.searchModeBox.currentData() == "ingredients" and self.inputLine.text():
+            self.suggest_ingredients(self.inputLine.text())
+        if (name in self.SESSION_STRUCTURES and self.ingredientList.count()
+                and self.searchModeBox.currentData() == "ingredients" and self.get_query_session() is not None):
+            self.show_live_results()
+
+    def show_load_error(self, version, message):
+        """
+        Receives the error of a structure that could not be built on the data thread
+        The structures are built again the next time they are needed
+        :param version: version of the dataset the structure was built for
+        :param message: error message
+        :return: None
+        """
+        self.loading.clear()
+        Metrics.get().count("load_errors")
+        print(f"Loading failed: {message}", file=sys.stderr)
 
     def handle_input(self):
         """
         Retrieves the text input by the user
+        Corrects its spelling, adds it to the query session and updates the list of recipes right away
+        Until the speller and the session were built on the data thread, the ingredient is listed as it was typed
+        and corrected once they are (see get_query_session)
         :return: None
         """
-        ing = self.inputLine.text()  # gets the text from the input line (from the user)
+        # in text mode the query is searched as it is typed, Return or Add only runs it again
+        if self.searchModeBox.currentData() == "text":
+            self.show_text_results(self.inputLine.text(), prefix=False)
+            return
+
+        ing = self.inputLine.text().strip()  # gets the text from the input line (from the user)
+        operator, name = IngredientPhrases.split_operator(ing)
         # if it exists, add the ingredient to the ingredient list which will be displayed and stored
-        if ing:
-            self.ingredientList.addItem(ing)
-            self.inputLine.clear()  # clear the input line for new ingredient
+        if name:
+            item = QListWidgetItem()
+            store = self.engine.store
+            if store.is_built("speller"):
+                with Metrics.get().span("input.correct"):
+                    self.show_ingredient(item, ing, store.speller.correct(ing))
+            else:
+                self.show_ingredient(item, ing)
+            self.ingredientList.addItem(item)
+            # clear the input line for new ingredient, once the event is done: when Return chose a suggestion,
+            # the completer writes it back into the line after this
+            QTimer.singleShot(0, self.inputLine.clear)
+            # only the recipes containing the new ingredient are rescored, once the session can be created
+            session = self.get_query_session()
+            if session is not None:
+                session.add(item.data(Qt.UserRole))
+            self.show_live_results()
+
+    def show_ingredient(self, item, ing, corrected=None):
+        """
+        Shows an ingredient of the list, marking required and excluded ingredients
+        A misspelled ingredient is searched as its correction, which the list shows next to what was typed
+        :param item: QListWidgetItem of the ingredient
+        :param ing: ingredient as the user typed it
+        :param corrected: ingredient that is searched (see IngredientSpeller.correct), or None if the spelling
+                          was not corrected yet
+        :return: None
+        """
+        operator, name = IngredientPhrases.split_operator(ing)
+        item.setText(ing if corrected in (None, ing) else f"{ing} \u2192 {corrected}")
+        item.setData(Qt.UserRole, corrected or ing)  # the ingredient that is searched
+        item.setData(self.UNCORRECTED_ROLE, ing if corrected is None else None)
+        tips = []
+        if corrected not in (None, ing):
+            tips.append(f'"{name}" is not in any recipe, showing recipes with "{corrected.lstrip(operator)}"')
+        # required ingredients are shown in green and excluded ones in red
+        if operator == REQUIRED_PREFIX:
+            item.setForeground(QColor("#2E7D32"))
+            tips.append("Every recipe must have this ingredient")
+        elif operator == EXCLUDED_PREFIX:
+            item.setForeground(QColor("#B22222"))
+            tips.append("Recipes with this ingredient are hidden")
+        item.setToolTip("\n".join(tips))
+
+    def handle_edit(self, text):
+        """
+        Reacts to the text typed so far: suggests ingredients, or searches the recipe text in text mode
+        :param text: current text of the input line
+        :return: None
+        """
+        if self.searchModeBox.currentData() == "text":
+            self.show_text_results(text)
+        else:
+            self.suggest_ingredients(text)
+
+    def suggest_ingredients(self, text):
+        """
+        Updates the autocomplete suggestions for the text typed so far
+        There are none until the suggester was built on the data thread (see handle_loaded)
+        :param text: current text of the input line
+        :return: None
+        """
+        store = self.engine.store
+        if not store.is_built("suggester"):
+            self.load_data()
+            return
+        # a required or excluded prefix is kept on the suggestions
+        operator, name = IngredientPhrases.split_operator(text)
+        with Metrics.get().span("autocomplete.suggest"):
+            self.suggestionModel.setStringList([operator + suggestion for suggestion in store.suggester.suggest(name)])
+
+    def remove_ingredient(self, item):
+        """
+        Removes an ingredient from the user list and undoes its contribution to the results
+        :param item: QListWidgetItem of the ingredient
+        :return: None
+        """
+        self.ingredientList.takeItem(self.ingredientList.row(item))
+        session = self.get_query_session()
+        if session is not None:
+            session.remove(item.data(Qt.UserRole))
+        self.show_live_results()
+
+    def get_query_session(self):
+        """
+        Returns the query session of the ingredient list, recreating it if the dataset was reloaded
+        The session is only created once its structures were built on the data thread (see load_data)
+        :return: the QuerySession, or None while its structures are being built
+        """
+        store = self.engine.store
+        if not all(store.is_built(name) for name in self.SESSION_STRUCTURES):
+            self.load_data()
+            return None
+        index = store.index
+        if self.querySession is None or self.querySession.index is not index:
+            self.querySession = QuerySession(index, store.title_rank, store.ingredients, store.bitmaps)
+            # replays the ingredients already in the list on the new dataset, correcting the ones that were added
+            # before the speller was built
+            for i in range(self.ingredientList.count()):
+                item = self.ingredientList.item(i)
+                ing = item.data(self.UNCORRECTED_ROLE)
+                if ing is not None:
+                    self.show_ingredient(item, ing, store.speller.correct(ing))
+                self.querySession.add(item.data(Qt.UserRole))
+        return self.querySession
+
+    def show_live_results(self):
+        """
+        Displays the current ranking of the query session without a Submit round-trip
+        The ranking runs on the query thread and the list is updated when it finishes (see show_live_result)
+        :return: None
+        """
+        # the live results are newer than any submission still running
+        self.supersede_query()
+        session = self.get_query_session()
+
+        # without ingredients the default list of recipes is shown
+        if not self.ingredientList.count():
+            self.show_recipe_list()
+            return
+        # the ingredients are ranked once the session can be created (see handle_loaded)
+        if session is None:
+            return
+        # the state of the session is copied now, the ingredient list can change while the ranking runs
+        self.activeQuery = QueryWorker(self.queryGeneration, self.rank_live_results, session, session.get_state(),
+                                       self.rankModeBox.currentData())
+        self.activeQuery.signals.finished.connect(self.show_live_result)
+        self.activeQuery.signals.failed.connect(self.show_query_error)
+        self.queryPool.start(self.activeQuery)
+
+    def rank_live_results(self, session, state, mode):
+        """
+        Ranks the query session and builds the list of recipes, on the query thread
+        :param session: the QuerySession
+        :param state: state of the session when the ranking was started (see QuerySession.get_state)
+        :param mode: order of the results, one of IngredientIndex.RANK_MODES
+        :return: the ranked dataset
+        """
+        with Metrics.get().span("live.rank", ingredients=len(state[1])):
+            results = session.results(self.RESULT_LIMIT, mode, state)
+        return self.engine.make_result_frame(*results)
+
+    def show_live_result(self, generation, filtered_df):
+        """
+        Receives the live ranking on the GUI thread and displays it
+        :param generation: number of the ranking the result belongs to
+        :param filtered_df: the ranked dataset
+        :return: None
+        """
+        # ignore rankings that were superseded by a newer edit or submission
+        if generation != self.queryGeneration:
+            return
+        self.activeQuery = None
+        self.update_list(filtered_df)
+
+    def change_rank_mode(self):
+        """
+        Orders the displayed results by the newly chosen rank mode
+        :return: None
+        """
+        # the default list of recipes has no ranking
+        if self.ingredientList.count():
+            self.show_live_results()
+
+    def change_search_mode(self):
+        """
+        Switches the input line between adding ingredients and searching the recipe text
+        The ingredient list is kept and its results come back when switching back to ingredients
+        :return: None
+        """
+        mode = self.searchModeBox.currentData()
+        self.inputLine.clear()
+        self.inputLine.setPlaceholderText(self.SEARCH_MODE_PLACEHOLDERS[mode])
+        self.suggestionModel.setStringList([])
+        # the ingredient list and its buttons only apply to ingredient searches
+        for widget in (self.ingredientList, self.submitButton, self.clearButton, self.rankModeBox):
+            widget.setEnabled(mode == "ingredients")
+        if mode == "text":
+            self.show_text_results("")
+        else:
+            self.show_live_results()
+
+    def show_text_results(self, query, prefix=True):
+        """
+        Displays the recipes whose title or instructions match the text query, best match first
+        The search runs on the query thread and the list is updated when it finishes (see show_text_result)
+        :param query: words and quoted phrases typed by the user
+        :param prefix: whether the last word is still being typed and also matches the words it starts
+        :return: None
+        """
+        # the text results replace any ingredient submission or older text search still running
+        self.supersede_query()
+        # without a query the default list of recipes is shown
+        if not query.strip():
+            self.show_recipe_list()
+            return
+        self.activeQuery = QueryWorker(self.queryGeneration, self.search_text, query, prefix)
+        self.activeQuery.signals.finished.connect(self.show_text_result)
+        self.activeQuery.signals.failed.connect(self.show_query_error)
+        self.queryPool.start(self.activeQuery)
+
+    def search_text(self, query, prefix):
+        """
+        Ranks the recipes for a text query with their titles, on the query thread
+        :param query: words and quoted phrases typed by the user
+        :param prefix: whether the last word is still being typed
+        :return: the ranked titles (see RecipeEngine.filter_text)
+        """
+        with Metrics.get().span("live.text_search"):
+            return self.engine.filter_text(query, self.RESULT_LIMIT, prefix)
+
+    def show_text_result(self, generation, frame):
+        """
+        Receives the result of a text search on the GUI thread and displays it
+        :param generation: number of the search the result belongs to
+        :param frame: the ranked titles
+        :return: None
+        """
+        # ignore the results of searches that were superseded by a newer keystroke
+        if generation != self.queryGeneration:
+            return
+        self.activeQuery = None
+        self.update_list(frame, show_matches=False)
 
     def submit_ing_list(self):
         """
         Function for the submit ingredient button
         Iterates through the list of user ingredients
-        Calls a function to filter the data
-        Calls a function to update the list of recipes in the UI
+        Starts filtering the data on a background thread, cancelling any query still in flight
+        The list of recipes in the UI is updated when the query finishes (see show_query_result)
         :return: None
         """
         # creates a python and pandas interpretable list
-        self.user_ingredients = [self.ingredientList.item(i).text() for i in range(self.ingredientList.count())]
-        # calls filter function on the user ingredients
-        filtered_df = self.filter_data(self.user_ingredients)
+        self.user_ingredients = [self.ingredientList.item(i).data(Qt.UserRole)
+                                 for i in range(self.ingredientList.count())]
+
+        # a newer submission supersedes the one still running
+        self.supersede_query()
+
+        # calls filter function on the user ingredients in the background
+        self.activeQuery = QueryWorker(self.queryGeneration, self.engine.filter_data,
+                                       list(self.user_ingredients), top_k=self.RESULT_LIMIT,
+                                       mode=self.rankModeBox.currentData())
+        self.activeQuery.signals.finished.connect(self.show_query_result)
+        self.activeQuery.signals.failed.connect(self.show_query_error)
+        self.set_busy(True)
+        self.querySubmitted = time.perf_counter()
+        self.queryPool.start(self.activeQuery)
+
+    def show_query_result(self, generation, filtered_df):
+        """
+        Receives the result of a background query on the GUI thread and displays it
+        :param generation: number of the submission the result belongs to
+        :param filtered_df: the filtered dataset
+        :return: None
+        """
+        # ignore results of queries that were superseded by a newer submission
+        if generation != self.queryGeneration:
+            return
+        self.activeQuery = None
+        self.set_busy(False)
         # calls the updateList function on the filtered dataset of recipes
         self.update_list(filtered_df)
+        # time from the click on Submit to the updated list, including the wait for the query thread
+        Metrics.get().observe("submit.total", time.perf_counter() - self.querySubmitted,
+                              ingredients=len(self.user_ingredients), results=len(filtered_df))
 
-    def filter_data(self, user_ingredients):
+    def show_query_error(self, generation, message):
         """
-        Filters the data set so only recipes with the user ingredients appears
-        Sort the list of recipes from most user ingredients to least
-        :param user_ingredients:
-        :return: the filtered dataset
+        Receives the error of a failed background query on the GUI thread
+        :param generation: number of the submission the error belongs to
+        :param message: error message
+        :return: None
         """
-        # loads the dataset
-        data = self.load_data()
-        # gets each word from the ingredients column of the dataset to compare with the user list
-        data['Cleaned_Ingredients'] = data['Cleaned_Ingredients'].apply(lambda x: x.split(' '))
-
-        # create a column to list out the ingredients that overlap
-        data['Target_Ingredients'] = data['Cleaned_Ingredients'].apply(
-            lambda x: list(set([item for item in x if item in user_ingredients])))
-        # create a score column to keep track of the amount of ingredients that overlap
-        data['score'] = data['Target_Ingredients'].apply(lambda x: len(list(x)))
-
-        # sort by score in descending order
-        df_sorted = data.sort_values('score', ascending=False)
-
-        # remove rows that do not contain any matching ingredients
-        df_filtered = df_sorted[df_sorted['score'] > 0].copy()
-        # make list of ingredients in the dataset a list again for proper handling
-        df_filtered['Cleaned_Ingredients'] = df_filtered['Cleaned_Ingredients'].apply(lambda x: ' '.join(x))
-
-        # return the new filtered dataset
-        return df_filtered
+        if generation != self.queryGeneration:
+            return
+        self.activeQuery = None
+        self.set_busy(False)
+        Metrics.get().count("query_errors")
+        print(f"Query failed: {message}", file=sys.stderr)
+
+    def supersede_query(self):
+        """
+        Cancels the query still in flight so its result is never displayed
+        :return: None
+        """
+        if self.activeQuery is not None:
+            self.activeQuery.cancel()
+            self.activeQuery = None
+            self.set_busy(False)
+        self.queryGeneration += 1
 
-    def update_list(self, filtered_df):
+    def set_busy(self, busy):
+        """
+        Shows or hides the busy state of the page while a query runs
+        :param busy: True while a query is running
+        :return: None
+        """
+        # the submit button stays enabled so a new submission can replace the running one
+        self.submitButton.setText('...' if busy else 'Submit')
+        if busy:
+            self.recipeView.setCursor(Qt.BusyCursor)
+        else:
+            self.recipeView.unsetCursor()
+
+    def update_list(self, filtered_df, show_matches=True):
         """
         Takes the filtered dataset to update the UI to display the new correct list of recipes that contain their
         ingredients
         :param filtered_df:
+        :param show_matches: whether to show the matched ingredients column (not for text searches)
         :return: None
         """
-        # clears the existing layout
-        self.clear_layout()
-
-        # obtains the last column of target ingredients to display to the user
-        target_ings = filtered_df['Target_Ingredients'].reset_index(drop=True)
-        # abstracts the other columns from the dataframe via the convert_df function
-        titles, images, ingredients, instructions = self.convert_df(filtered_df)
-
-        # creating headers for the layout
-        # makes a horizontal box layout to put the recipes on the left and the user ingredients on the right
-        labelTitles = QHBoxLayout()
-        # header for recipe column
-        recipeLabel = QLabel("Recipes:", self.scrollAreaWidgetContents)
-        # sets style for the header
-        recipeLabel.setFixedSize(700, 40)
-        recipeLabel.setStyleSheet("border: None;"
-                                  "color: #333333;")
-        recipeLabel.setFont(QFont("Arial", 16, QFont.Bold))
-        # header for the ingredients column
-        ingTitle = QLabel("Ingredients:", self.scrollAreaWidgetContents)
-        # sets style for the header
-        ingTitle.setFixedSize(187, 40)
-        ingTitle.setStyleSheet("border: None;"
-                               "color: #333333;")
-        ingTitle.setFont(QFont("Arial", 16, QFont.Bold))
-
-        # adds each label header to the horizontal box layout
-        labelTitles.addWidget(recipeLabel)
-        labelTitles.addWidget(ingTitle)
-
-        # adds the box layout to the top of the scrollable area
-        self.recipeLayout.addLayout(labelTitles)
-
-        # iterates through each row of the filtered data frame by column
-        for idx in range(len(titles)):
-            # gets the specifics at each index of the filtered data frame
-            title, ingredient, instruction, image, target_ing = titles[idx], ingredients[idx], instructions[idx], \
-                                                                images[idx], target_ings[idx]
-
-            # creates a new horizontal layout for each recipe to also include list of user ingredients
-            recipeHLayout = QHBoxLayout()
-
-            # creates button for each recipe
-            btn = QPushButton(str(title), self.scrollAreaWidgetContents)
-            # opens the detail page if user presses the recipe button
-            btn.clicked.connect(partial(self.open_detail_page, title, ingredient, instruction, image))
-            # sets the button dimensions and style
-            btn.setFixedSize(700, 40)
-            self.set_button_style(btn)
-            # adds the button to be the left side of the horizontal layout
-            recipeHLayout.addWidget(btn)
-
-            # adds a list of the user ingredients next to each recipe button
-            # displays the list and makes it readable to user by removing [] and '
-            ingredientLabel = QLabel(str(target_ing).replace("'", "").strip("[]"), self.scrollAreaWidgetContents)
-            # styles the ingredients to be red
-            ingredientLabel.setStyleSheet("border: None;"
-                                          "color: #B22222")
-            ingredientLabel.setFont(QFont("Arial", 15))
-            # adds it to the horizontal layout
-            recipeHLayout.addWidget(ingredientLabel)
-
-            # adds each horizontal layout to the overall vertical layout
-            self.recipeLayout.addLayout(recipeHLayout)
-
-    def clear_layout(self):
-        """
-        Removes all widgets from the recipe list layout
-        """
-        # remove widget until all widgets are removed
-        while self.recipeLayout.count():
-            # get the first item from the layout
-            layoutItem = self.recipeLayout.takeAt(0)
-            if layoutItem.widget():
-                layoutItem.widget().deleteLater()  # delete if the widget exists
-            elif layoutItem.layout():
-                self.clear_nested_layout(layoutItem.layout())  # call function to remove nested widget
-
-    def clear_nested_layout(self, layout):
-        """
-        Removes all widgets from a nested layout (e.g. horizontal or vertical layouts)
-        :param: type of layout
+        metrics = Metrics.get()
+        with metrics.span("list.update", rows=len(filtered_df)):
+            # replaces the results of the model, the view then paints only the visible rows
+            self.recipeModel.set_results(filtered_df, show_matches=show_matches)
+            self.recipeView.scrollToTop()
+
+            # shows the headers for the recipe column on the left and the user ingredients on the right
+            self.recipeView.horizontalHeader().show()
+            self.recipeView.setColumnWidth(0, 708)
+
+        metrics.gauge("list_rows", len(filtered_df))
+        if metrics.enabled:
+            # widgets of the page, which stay constant as the rows are painted by the view
+            metrics.gauge("widgets", len(self.findChildren(QWidget)))
+
+    def handle_recipe_click(self, index):
+        """
+        Opens the detail page of the recipe whose title was clicked
+        :param index: model index of the clicked cell
         :return: None
         """
-        # iterate until no layouts left
-        while layout.count():
-            # get first layout
-            item = layout.takeAt(0)
-            # get the widget in the layout
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()  # delete widget if it exists
-            elif item.layout():  # check for layout within layout and call function again
-                self.clear_nested_layout(item.layout())
+        # only the title column acts as a button
+        if index.column() != 0:
+            return
+        # opens the recipe in the clicked row by its id
+        self.open_detail_page(self.recipeModel.ids[index.row()])
 
     def clear_ing_list(self):
         """
-        Remove all items in the user ingredient list
+        Remove all items in the user ingredient list and show the default list of recipes again
         :return:
         """
         self.ingredientList.clear()
+        session = self.get_query_session()
+        if session is not None:
+            session.clear()
+        self.show_live_results()
 
-    def open_detail_page(self, title, ingredient, instruction, image):
+    def open_detail_page(self, recipe_id):
         """
         Opens the detail page associated with the clicked on recipe
-        :param title:
-        :param ingredient:
-        :param instruction:
-        :param image:
+        The ingredients, instructions and image of the recipe are only loaded now
+        :param recipe_id: id of the recipe in the dataset
         :return: None
         """
-        # connect RecipeDetail class
-        self.detailWidget = RecipeDetail(title, ingredient, instruction, image)
-        # style detail background
-        self.detailWidget.setStyleSheet("background-color: white;")
-
-        # make the title of the window the recipe title
-        self.detailWidget.setWindowTitle(title)
-        # open window to the same size as the main page
-        self.detailWidget.resize(self.width, self.height)
-        # display the details
-        self.detailWidget.show()
-
-    @staticmethod
-    def load_data():
+        metrics = Metrics.get()
+        metrics.count("details_opened")
+        # a similar recipe opened from a detail page replaces that page, at the same position
+        previous = getattr(self, "detailWidget", None)
+        previous = previous if previous is not None and previous.isVisible() else None
+        with metrics.span("detail.open", recipe_id=recipe_id):
+            # connect RecipeDetail class
+            with metrics.span("detail.build"):
+                self.detailWidget = RecipeDetail.fromRecipeId(recipe_id, self.engine.store)
+                # style detail background
+                self.detailWidget.setStyleSheet("background-color: white;")
+                # clicking a similar recipe opens its detail page
+                self.detailWidget.openRecipe.connect(self.open_detail_page)
+
+            # make the title of the window the recipe title
+            self.detailWidget.setWindowTitle(self.detailWidget.title)
+            # open window to the same size as the main page
+            self.detailWidget.resize(self.width, self.height)
+            if previous is not None:
+                self.detailWidget.move(previous.pos())
+                previous.close()
+            # display the details
+            with metrics.span("detail.show"):
+                self.detailWidget.show()
+
+        # the similar recipes are looked up on the data thread and listed once they are found
+        if self.similarQuery is not None:
+            self.similarQuery.cancel()
+        self.detailGeneration += 1
+        self.similarQuery = QueryWorker(self.detailGeneration, self.find_similar, recipe_id)
+        self.similarQuery.signals.finished.connect(self.show_similar)
+        self.similarQuery.signals.failed.connect(self.show_similar_error)
+        self.dataPool.start(self.similarQuery)
+
+    def find_similar(self, recipe_id):
         """
-        Loads data from statics folder
-        :return: the dataset as a pandas dataframe
+        Looks up the recipes with the most similar ingredients to a recipe, on the data thread
+        :param recipe_id: id of the recipe in the dataset
+        :return: list of dicts with recipe_id, title and similarity (see RecipeStore.get_similar)
         """
-        # load data from statics folder
-        data = pd.read_csv("statics/data/Food Ingredients and Recipe Dataset with Image Name Mapping.csv")
-        return data
+        with Metrics.get().span("detail.similar", recipe_id=recipe_id):
+            return self.engine.store.get_similar(recipe_id)
 
-    @staticmethod
-    def convert_df(data):
+    def show_similar(self, generation, similar):
         """
-        Extracts the columns from the data for easier code manipulation
-        :param data:
-        :return: Title, Image_Name, Cleaned_Ingredients, and Instructions columns as individual lists
+        Receives the similar recipes of a detail page on the GUI thread and lists them on the page
+        :param generation: number of the detail page the recipes belong to
+        :param similar: list of dicts with recipe_id, title and similarity
+        :return: None
         """
-        titles = data["Title"].tolist()
-        images = data["Image_Name"].tolist()
-        ingredients = data["Cleaned_Ingredients"].tolist()
-        instructions = data["Instructions"].tolist()
-
-        return titles, images, ingredients, instructions
+        # the page was replaced or closed while the recipes were looked up
+        if generation != self.detailGeneration or not self.detailWidget.isVisible():
+            return
+        self.similarQuery = None
+        self.detailWidget.showSimilar(similar)
 
-    @staticmethod
-    def set_button_style(btn):
+    def show_similar_error(self, generation, message):
         """
-        Sets the style of the recipe button
-        :param btn:
+        Receives the error of a failed lookup of similar recipes on the GUI thread
+        :param generation: number of the detail page the error belongs to
+        :param message: error message
         :return: None
         """
-        # calls setStyleSheet to set the color of the button
-        btn.setStyleSheet("border: None;"
-                          "border-radius: 10px;"
-                          "color: #333333;"
-                          "background-color: white;")
-        # sets button font
-        btn.setFont(QFont("Arial", 15, QFont.Bold))
-
-        # changes cursor style when on button
-        btn.setCursor(Qt.PointingHandCursor)
-
-        # adds drop shadow
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setOffset(0, 1)
-        shadow.setBlurRadius(20)
-        shadow.setColor(QColor("#dddddd"))
-        btn.setGraphicsEffect(shadow)
+        if generation != self.detailGeneration:
+            return
+        self.similarQuery = None
+        self.detailWidget.showSimilar([])
+        Metrics.get().count("similar_errors")
+        print(f"Similar recipes failed: {message}", file=sys.stderr)
@@ -0,0 +1,145 @@
+import json
+import os
+import numpy as np
+from IngredientIndex import IngredientIndex
+from IngredientSuggester import IngredientSuggester
+from IngredientTable import IngredientTable
+from RecipeTable import RecipeTable, RECIPE_COLUMNS
+from SimilarityIndex import SimilarityIndex
+from StringHeap import StringHeap
+from TextIndex import TextIndex
+
+# version of the snapshot layout, snapshots written with another version are ignored
+SNAPSHOT_FORMAT = 10
+
+
+class RecipeSnapshot:
+    """
+    Class that reads a precompiled binary snapshot of the recipe dataset.
+    A snapshot is a directory of .npy arrays that are memory-mapped instead of parsed:
+    every text column is a UTF-8 string heap with its offsets (the layout of RecipeTable), next to the
+    parsed ingredient lines, the ingredient index (vocabulary, posting lists, recipe sizes), the compressed
+    full-text index of the titles and instructions, the MinHash signatures and LSH buckets of similar recipes,
+    the ingredient suggestions and the title ranks. Snapshots are written by SnapshotBuilder.
+    """
+
+    def __init__(self, path: str, meta: dict):
+        """
+        Memory-maps the arrays of the snapshot at the given path.
+        :param path: snapshot directory
+        :param meta: contents of the snapshot's meta.json
+        """
+        self.path = path
+        self.meta = meta
+        self.n_recipes = meta["n_recipes"]
+        self.table = RecipeTable({column: StringHeap(self.load_array(column), self.load_array(column + ".offsets"))
+                                  for column in RECIPE_COLUMNS})
+        self.title_rank = self.load_array("title_rank")
+        self._index = None
+        self._ingredients = None
+        self._text_index = None
+        self._similarity = None
+        self._suggester = None
+
+    @classmethod
+    def open(cls, path: str, signature):
+        """
+        Opens the snapshot if it exists and was built from the data file with the given signature.
+        :param path: snapshot directory
+        :param signature: (mtime, size) of the data file, or None if the data file is missing
+        :return: the RecipeSnapshot, or None if the snapshot is missing or stale
+        """
+        try:
+            with open(os.path.join(path, "meta.json")) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        # a snapshot of another layout or of an older data file is stale
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None
+        if signature is not None and tuple(meta.get("source", ())) != tuple(signature):
+            return None
+        return cls(path, meta)
+
+    def load_array(self, name: str):
+        """
+        Memory-maps one array of the snapshot.
+        :param name: name of the array file without the .npy extension
+        :return: read-only numpy array backed by the mapped file
+        """
+        # a plain array view of the mapping, slicing a np.memmap is several times slower
+        return np.asarray(np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r"))
+
+    @property
+    def index(self) -> IngredientIndex:
+        """
+        Returns the ingredient index stored in the snapshot, with posting lists that are views into the mapped file.
+        :return: the IngredientIndex
+        """
+        if self._index is None:
+            vocabulary = list(StringHeap(self.load_array("vocabulary"), self.load_array("vocabulary.offsets")))
+            postings = self.load_array("postings")
+            postings_offsets = self.load_array("postings.offsets")
+            line_postings = self.load_array("line_postings")
+            line_postings_offsets = self.load_array("line_postings.offsets")
+            self._index = IngredientIndex(
+                {phrase: postings[postings_offsets[i]:postings_offsets[i + 1]] for i, phrase in enumerate(vocabulary)},
+                self.load_array("sizes"),
+                {phrase: line_postings[line_postings_offsets[i]:line_postings_offsets[i + 1]]
+                 for i, phrase in enumerate(vocabulary)})
+        return self._index
+
+    @property
+    def ingredients(self) -> IngredientTable:
+        """
+        Returns the parsed ingredient lines stored in the snapshot, decoded from the mapped file when accessed.
+        :return: the IngredientTable
+        """
+        if self._ingredients is None:
+            self._ingredients = IngredientTable(StringHeap(self.load_array("lines"), self.load_array("lines.offsets")),
+                                                self.load_array("line_ids"), self.load_array("line_ids.offsets"))
+        return self._ingredients
+
+    @property
+    def text_index(self) -> TextIndex:
+        """
+        Returns the full-text index stored in the snapshot, whose posting blocks are decoded from the mapped file
+        when a word is searched.
+        :return: the TextIndex
+        """
+        if self._text_index is None:
+            self._text_index = TextIndex(StringHeap(self.load_array("text_vocabulary"),
+                                                    self.load_array("text_vocabulary.offsets")),
+                                         self.load_array("text_postings"), self.load_array("text_postings.offsets"),
+                                         self.load_array("text_positions.offsets"), self.load_array("text_df"),
+                                         self.load_array("text_title_lengths"), self.load_array("text_lengths"))
+        return self._text_index
+
+    @property
+    def similarity(self) -> SimilarityIndex:
+        """
+        Returns the similar-recipe index stored in the snapshot, read from the mapped file when a recipe is looked up.
+        :return: the SimilarityIndex
+        """
+        if self._similarity is None:
+            self._similarity = SimilarityIndex(self.load_array("similarity_names"),
+                                               self.load_array("similarity_names.offsets"),
+                                               self.load_array("similarity_signatures"),
+                                               self.load_array("similarity_band_keys"),
+                                               self.load_array("similarity_band_order"))
+        return self._similarity
+
+    @property
+    def suggester(self) -> IngredientSuggester:
+        """
+        Returns the ingredient suggester stored in the snapshot, its names and keys decoded from the mapped file.
+        :return: the IngredientSuggester
+        """
+        if self._suggester is None:
+            self._suggester = IngredientSuggester(
+                list(StringHeap(self.load_array("suggester_phrases"), self.load_array("suggester_phrases.offsets"))),
+                self.load_array("suggester_frequencies"),
+                list(StringHeap(self.load_array("suggester_keys"), self.load_array("suggester_keys.offsets"))),
+                self.load_array("suggester_key_phrases"))
+        return self._suggester
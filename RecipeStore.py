@@ -0,0 +1,362 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from IngredientBitmaps import IngredientBitmaps
+from IngredientIndex import IngredientIndex
+from IngredientMatrix import IngredientMatrix
+from IngredientPhrases import IngredientPhrases
+from IngredientSpeller import IngredientSpeller
+from IngredientSuggester import IngredientSuggester
+from IngredientTable import IngredientTable
+from Metrics import Metrics
+from RecipeSnapshot import RecipeSnapshot
+from RecipeTable import RecipeTable, RECIPE_COLUMNS
+from SimilarityIndex import SimilarityIndex
+from TextIndex import TextIndex
+
+# location of the Kaggle recipe dataset (relative to the project root)
+DATA_PATH = "statics/data/Food Ingredients and Recipe Dataset with Image Name Mapping.csv"
+
+
+class RecipeStore:
+    """
+    Class that keeps the recipe dataset in memory and shares it across the whole application.
+    The dataset is loaded once and only loaded again when the data file's modification time or size changes.
+    If a binary snapshot of the current data file exists (see build_snapshot.py), it is memory-mapped
+    instead of parsing the CSV; otherwise the store falls back to the CSV. Either way the recipes are kept
+    as a compact RecipeTable of string heaps rather than a DataFrame.
+    """
+
+    # one store per data file for the whole process
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    # number of recently opened recipes whose details are kept in memory
+    DETAIL_CACHE_SIZE = 32
+
+    # number of leading bytes of the lower-case titles sorted at once when the titles are ranked
+    TITLE_KEY_BYTES = 16
+
+    # number of titles encoded at a time when the titles are ranked
+    TITLE_CHUNK_SIZE = 50000
+
+    def __init__(self, path: str = DATA_PATH, snapshot_path: str = None):
+        """
+        Initializes the store for the given CSV file without reading it yet.
+        :param path: path to the recipe CSV file
+        :param snapshot_path: snapshot directory, next to the CSV file by default
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path or self.get_snapshot_path(path)
+        self.version = 0  # increases every time the dataset is (re)loaded
+        self._signature = None  # (mtime, size) of the file the cached data was read from
+        self._snapshot = None  # memory-mapped snapshot of the current data file, if there is one
+        self._table = None  # text columns read from the CSV file when there is no snapshot
+        self._derived = {}  # structures built from the data, keyed by name
+        self._building = {}  # name -> lock held while that structure is built
+        self._details = OrderedDict()  # LRU cache of recently opened recipes, keyed by recipe id
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get(cls, path: str = DATA_PATH) -> "RecipeStore":
+        """
+        Returns the process-wide store for the given data file, creating it on first use.
+        :param path: path to the recipe CSV file
+        :return: the shared RecipeStore
+        """
+        with cls._stores_lock:
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    @staticmethod
+    def get_snapshot_path(path: str) -> str:
+        """
+        Returns the default snapshot directory of a data file.
+        :param path: path to the recipe CSV file
+        :return: the CSV path with a .snapshot extension instead of .csv
+        """
+        return os.path.splitext(path)[0] + ".snapshot"
+
+    def refresh(self):
+        """
+        Checks whether the data file changed and, if so, drops everything loaded from the old file.
+        Opens the snapshot when it matches the data file.
+        :return: None
+        """
+        signature = self.get_signature()
+        with self._lock:
+            if self.version and signature == self._signature:
+                return
+            with Metrics.get().span("store.open_snapshot") as span:
+                self._snapshot = RecipeSnapshot.open(self.snapshot_path, signature)
+                span.set(found=self._snapshot is not None)
+            if self._snapshot is None and signature is None:
+                raise FileNotFoundError(f"No recipe data at {self.path}")
+            self._table = None
+            self._derived = {}
+            self._details = OrderedDict()
+            self._signature = signature
+            self.version += 1
+
+    @property
+    def snapshot(self):
+        """
+        Returns the snapshot of the current data file.
+        :return: the RecipeSnapshot, or None if there is no up to date snapshot
+        """
+        self.refresh()
+        return self._snapshot
+
+    @property
+    def table(self) -> RecipeTable:
+        """
+        Returns the text columns of every recipe, reloading them only if the file changed since they were last read.
+        The columns are memory-mapped from the snapshot, or read from the CSV file into string heaps.
+        :return: the shared RecipeTable
+        """
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot.table
+        with self._lock:
+            if self._table is None:
+                with Metrics.get().span("store.load_csv"):
+                    self._table = RecipeTable.from_csv(self.path)
+                Metrics.get().gauge("recipes", self._table.n_recipes)
+            return self._table
+
+    @property
+    def n_recipes(self) -> int:
+        """
+        Returns the number of recipes in the dataset.
+        :return: number of recipes
+        """
+        return self.table.n_recipes
+
+    def take(self, ids, columns=RECIPE_COLUMNS) -> pd.DataFrame:
+        """
+        Returns the given recipes, decoded from the recipe table.
+        :param ids: ids (row positions) of the recipes
+        :param columns: columns to return, lists only need the Title
+        :return: dataframe of the recipes indexed by recipe id, in the given order
+        """
+        return self.table.take(ids, columns)
+
+    def get_recipe(self, recipe_id: int) -> dict:
+        """
+        Returns the title, ingredients, instructions and image name of one recipe.
+        The long text fields are only read when a recipe is opened, and the last few opened
+        recipes are kept in a small LRU cache.
+        :param recipe_id: id (row position) of the recipe
+        :return: dict from column name to text (missing values are empty strings)
+        """
+        table = self.table
+        with self._lock:
+            if recipe_id in self._details:
+                self._details.move_to_end(recipe_id)
+                Metrics.get().count("detail_cache_hits")
+                return self._details[recipe_id]
+        Metrics.get().count("detail_cache_misses")
+
+        # read the fields by offset from the string heaps
+        recipe = {column: table.get_text(column, recipe_id) for column in RECIPE_COLUMNS}
+
+        with self._lock:
+            self._details[recipe_id] = recipe
+            if len(self._details) > self.DETAIL_CACHE_SIZE:
+                self._details.popitem(last=False)
+        return recipe
+
+    @property
+    def ingredients(self) -> IngredientTable:
+        """
+        Returns the parsed ingredient lines of every recipe, parsed once per (re)load or read from the snapshot.
+        :return: the shared IngredientTable
+        """
+        return self.get_derived("ingredients", lambda snapshot: snapshot.ingredients if snapshot is not None else
+                                IngredientTable.from_ingredients(self.table.columns["Cleaned_Ingredients"]))
+
+    def get_ingredients(self, recipe_id: int) -> list:
+        """
+        Returns the ingredient lines of one recipe.
+        :param recipe_id: id (row position) of the recipe
+        :return: list of ingredient lines, in the recipe's order
+        """
+        # until the lines of every recipe are parsed (on a background thread), only this recipe's are
+        if not self.is_built("ingredients"):
+            return IngredientPhrases.split_items(self.table.columns["Cleaned_Ingredients"][recipe_id])
+        return self.ingredients.get(recipe_id)
+
+    @property
+    def index(self) -> IngredientIndex:
+        """
+        Returns the inverted ingredient index of the current dataset, built once per (re)load
+        from the parsed ingredient lines or read from the snapshot.
+        :return: the shared IngredientIndex
+        """
+        return self.get_derived("index", lambda snapshot: snapshot.index if snapshot is not None else
+                                IngredientIndex.from_table(self.ingredients))
+
+    @property
+    def matrix(self) -> IngredientMatrix:
+        """
+        Returns the sparse recipe-by-ingredient matrix of the current dataset, built once per (re)load.
+        :return: the shared IngredientMatrix
+        """
+        return self.get_derived("matrix", lambda snapshot: IngredientMatrix.from_index(self.index))
+
+    @property
+    def bitmaps(self) -> IngredientBitmaps:
+        """
+        Returns the recipe bitmaps of the common ingredients of the current dataset, built once per (re)load.
+        :return: the shared IngredientBitmaps
+        """
+        return self.get_derived("bitmaps", lambda snapshot: IngredientBitmaps.from_index(self.index))
+
+    @property
+    def text_index(self) -> TextIndex:
+        """
+        Returns the full-text index of the titles and instructions, read from the snapshot or built once per (re)load.
+        :return: the shared TextIndex
+        """
+        return self.get_derived("text_index", lambda snapshot: snapshot.text_index if snapshot is not None else
+                                TextIndex.from_table(self.table))
+
+    @property
+    def similarity(self) -> SimilarityIndex:
+        """
+        Returns the MinHash/LSH index of similar recipes, read from the snapshot or built once per (re)load.
+        :return: the shared SimilarityIndex
+        """
+        return self.get_derived("similarity", lambda snapshot: snapshot.similarity if snapshot is not None else
+                                SimilarityIndex.from_table(self.ingredients))
+
+    def get_similar(self, recipe_id: int, top_k: int = SimilarityIndex.LIMIT, exact: bool = True) -> list:
+        """
+        Returns the recipes with the most similar ingredients to a recipe.
+        :param recipe_id: id (row position) of the recipe
+        :param top_k: number of recipes to return
+        :param exact: whether to rank them by exact Jaccard similarity instead of the MinHash estimate
+        :return: list of dicts with recipe_id, title and similarity (0 to 1), most similar first
+        """
+        similarity = self.similarity
+        with Metrics.get().span("store.similar", recipe_id=recipe_id, exact=exact) as span:
+            ids, scores = similarity.similar(recipe_id, top_k, exact)
+            span.set(results=len(ids))
+        titles = self.take(ids, columns=("Title",))["Title"].tolist()
+        return [{"recipe_id": similar_id, "title": title, "similarity": score}
+                for similar_id, title, score in zip(ids.tolist(), titles, scores.tolist())]
+
+    @property
+    def suggester(self) -> IngredientSuggester:
+        """
+        Returns the ingredient autocompleter of the current dataset, read from the snapshot or built once per (re)load.
+        :return: the shared IngredientSuggester
+        """
+        return self.get_derived("suggester", lambda snapshot: snapshot.suggester if snapshot is not None else
+                                IngredientSuggester.from_table(self.ingredients, self.index.postings))
+
+    @property
+    def speller(self) -> IngredientSpeller:
+        """
+        Returns the spelling corrector of the ingredients of the current dataset, built once per (re)load.
+        :return: the shared IngredientSpeller
+        """
+        return self.get_derived("speller", lambda snapshot: IngredientSpeller.from_index(self.index))
+
+    @property
+    def title_rank(self):
+        """
+        Returns the alphabetical rank of every recipe title, used to break ties when ranking results.
+        :return: numpy array with one unique rank per recipe
+        """
+        return self.get_derived("title_rank", lambda snapshot: snapshot.title_rank if snapshot is not None else
+                                self.rank_titles(self.table.columns["Title"]))
+
+    def get_derived(self, name: str, build):
+        """
+        Returns a structure computed from the dataset, building it on first use after each (re)load.
+        Every structure is built under its own lock, so a structure being built on a background thread
+        does not block the threads that use the others.
+        :param name: name the structure is cached under
+        :param build: function that takes the snapshot (or None) and returns the structure
+        :return: the cached structure
+        """
+        snapshot = self.snapshot
+        with self._lock:
+            if name in self._derived:
+                return self._derived[name]
+            version = self.version
+            building = self._building.setdefault(name, threading.Lock())
+        with building:
+            # another thread may have built it while this one waited
+            with self._lock:
+                if name in self._derived:
+                    return self._derived[name]
+            with Metrics.get().span(f"store.build_{name}"):
+                derived = build(snapshot)
+            with self._lock:
+                # a structure of a dataset that was reloaded in the meantime is not kept
+                if version == self.version:
+                    self._derived[name] = derived
+            return derived
+
+    def is_built(self, name: str) -> bool:
+        """
+        Returns whether a structure of the current dataset was already built, without building it.
+        :param name: name of the structure (see prepare)
+        :return: True if the structure can be used without building it
+        """
+        with self._lock:
+            return name in self._derived
+
+    def prepare(self, name: str) -> str:
+        """
+        Builds a structure of the dataset ahead of its first use, so it can be built on a background thread.
+        :param name: name of the structure, one of the properties of the store ("index", "title_rank", ...)
+        :return: the name of the structure
+        """
+        getattr(self, name)
+        return name
+
+    def get_signature(self):
+        """
+        Returns the modification time and size of the data file, used to detect changes.
+        :return: (mtime in nanoseconds, size in bytes), or None if the file does not exist
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def rank_titles(cls, titles):
+        """
+        Ranks the recipe titles alphabetically (case-insensitive, ties in dataset order).
+        The titles are never all decoded at once: the first TITLE_KEY_BYTES bytes of every lower-case title
+        are collected a chunk of titles at a time and sorted together (UTF-8 bytes sort like the characters),
+        then only the titles that share those bytes are decoded again and ordered by their full text.
+        :param titles: title of every recipe, in row order (a list or a StringHeap)
+        :return: numpy array where entry i is the rank of the title of recipe i
+        """
+        keys = np.empty(len(titles), dtype=f"S{cls.TITLE_KEY_BYTES}")
+        remaining = iter(titles)
+        for start in range(0, len(titles), cls.TITLE_CHUNK_SIZE):
+            keys[start:start + cls.TITLE_CHUNK_SIZE] = [str(title).lower().encode("utf-8")[:cls.TITLE_KEY_BYTES]
+                                                        for title in itertools.islice(remaining, cls.TITLE_CHUNK_SIZE)]
+        order = np.argsort(keys, kind='stable')
+
+        # runs of equal keys; shorter keys are whole titles, so only full-length keys can hide a difference
+        keys = keys[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        ends = np.append(starts[1:], len(keys))
+        ties = (ends - starts > 1) & (np.char.str_len(keys[starts]) == cls.TITLE_KEY_BYTES)
+        for start, end in zip(starts[ties].tolist(), ends[ties].tolist()):
+            order[start:end] = sorted(order[start:end].tolist(), key=lambda recipe_id: str(titles[recipe_id]).lower())
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order), dtype=np.int32)
+        return ranks
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from StringHeap import StringHeap
+
+# text columns of the dataset kept in memory
+RECIPE_COLUMNS = ("Title", "Cleaned_Ingredients", "Instructions", "Image_Name")
+
+
+class RecipeTable:
+    """
+    Class that holds the text columns of the recipe dataset in a compact form.
+    Every column is one StringHeap (a contiguous UTF-8 buffer and its offsets) instead of one Python string
+    per field, and a field is only decoded when it is read. The same layout is memory-mapped from a snapshot,
+    so both the CSV and the snapshot path index into the table without copying it.
+    """
+
+    # number of CSV rows parsed at a time, so the parsed frame of the whole file is never in memory
+    CHUNK_SIZE = 50000
+
+    def __init__(self, columns: dict):
+        """
+        Initializes the table from its columns.
+        :param columns: dict from column name to StringHeap, every column has one string per recipe
+        """
+        self.columns = columns
+        self.n_recipes = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_csv(cls, path: str, columns=RECIPE_COLUMNS, chunk_size: int = CHUNK_SIZE) -> "RecipeTable":
+        """
+        Reads the text columns of a recipe CSV file chunk by chunk.
+        :param path: path to the recipe CSV file
+        :param columns: text columns to keep
+        :param chunk_size: number of rows parsed at a time
+        :return: the built RecipeTable
+        """
+        heaps = {column: bytearray() for column in columns}
+        lengths = {column: [] for column in columns}
+        for chunk in pd.read_csv(path, usecols=list(columns), chunksize=chunk_size):
+            for column in columns:
+                # missing values are stored as empty strings
+                encoded = [value.encode("utf-8") if isinstance(value, str) else b"" for value in chunk[column]]
+                heaps[column] += b"".join(encoded)
+                lengths[column].extend(len(item) for item in encoded)
+        return cls({column: StringHeap(np.frombuffer(heaps[column], dtype=np.uint8),
+                                       np.concatenate(([0], np.cumsum(lengths[column], dtype=np.int64))))
+                    for column in columns})
+
+    def get_text(self, column: str, recipe_id: int) -> str:
+        """
+        Decodes one text field.
+        :param column: name of the text column
+        :param recipe_id: id (row position) of the recipe
+        :return: the text, or an empty string if it is missing
+        """
+        return self.columns[column][recipe_id]
+
+    def take(self, ids, columns=RECIPE_COLUMNS) -> pd.DataFrame:
+        """
+        Decodes the given recipes into a dataframe, like data.iloc[ids] on the CSV dataset.
+        :param ids: ids (row positions) of the recipes
+        :param columns: text columns to decode
+        :return: dataframe indexed by recipe id
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        return pd.DataFrame({column: [self.columns[column][recipe_id] for recipe_id in ids.tolist()]
+                             for column in columns}, index=ids)
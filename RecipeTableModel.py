@@ -0,0 +1,170 @@
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtGui import QFont, QColor, QPainter
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSize
+
+
+class RecipeTableModel(QAbstractTableModel):
+    """
+    Table model over the recipe results: the recipe title in the first column and,
+    after a query, the matched user ingredients in the second column, with the missing ones below them.
+    Only the rows the view asks for are formatted, so the cost does not grow with the number of results.
+    """
+
+    # header of each column
+    HEADERS = ("Recipes:", "Ingredients:")
+
+    # data role of the "missing: x, y" label of the ingredients column
+    MissingRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        """
+        Initializes an empty model.
+        :param parent: parent QObject
+        """
+        super().__init__(parent)
+        self.ids = []  # recipe id of every row, used to load the recipe when it is opened
+        self.titles = []
+        self.target_ingredients = []
+        self.missing_ingredients = []
+        self.show_matches = False
+
+    def set_results(self, frame, show_matches: bool):
+        """
+        Replaces the displayed results.
+        :param frame: dataframe of recipes indexed by recipe id, with a Title column
+                      (and Target_Ingredients and Missing_Ingredients if show_matches)
+        :param show_matches: whether to show the matched ingredients column
+        :return: None
+        """
+        self.beginResetModel()
+        self.ids = frame.index.tolist()
+        self.titles = frame["Title"].tolist()
+        self.target_ingredients = frame["Target_Ingredients"].tolist() if show_matches else []
+        self.missing_ingredients = (frame["Missing_Ingredients"].tolist()
+                                    if show_matches and "Missing_Ingredients" in frame else [])
+        self.show_matches = show_matches
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        """
+        Returns the number of results.
+        :param parent: parent index (results are a flat table)
+        :return: number of rows
+        """
+        return 0 if parent.isValid() else len(self.titles)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        """
+        Returns the number of columns: title, and matched ingredients after a query.
+        :param parent: parent index (results are a flat table)
+        :return: number of columns
+        """
+        return 0 if parent.isValid() else (2 if self.show_matches else 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """
+        Returns the text of a cell.
+        :param index: index of the cell
+        :param role: requested data role
+        :return: the title, matched or missing ingredients text, or None
+        """
+        if not index.isValid():
+            return None
+        if index.column() == 0:
+            return str(self.titles[index.row()]) if role == Qt.DisplayRole else None
+        if role == Qt.DisplayRole:
+            # displays the list and makes it readable to user by removing [] and '
+            return str(self.target_ingredients[index.row()]).replace("'", "").strip("[]")
+        if role in (self.MissingRole, Qt.ToolTipRole):
+            missing = self.missing_ingredients[index.row()] if self.missing_ingredients else []
+            return "missing: " + ", ".join(missing) if missing else None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """
+        Returns the column headers.
+        :param section: column number
+        :param orientation: header orientation
+        :param role: requested data role
+        :return: header text, or None
+        """
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+
+class RecipeItemDelegate(QStyledItemDelegate):
+    """
+    Delegate that draws each title as a rounded white recipe button and each ingredients cell as red text
+    (with the missing ingredients in grey below), instead of creating a button widget with its own stylesheet
+    and shadow effect for every result.
+    """
+
+    # height of a result row including the space between buttons
+    ROW_HEIGHT = 48
+
+    def __init__(self, parent=None):
+        """
+        Initializes the delegate and its fonts.
+        :param parent: parent QObject
+        """
+        super().__init__(parent)
+        self.titleFont = QFont("Arial", 15, QFont.Bold)
+        self.ingredientFont = QFont("Arial", 15)
+        self.missingFont = QFont("Arial", 12)
+
+    def paint(self, painter, option, index):
+        """
+        Paints one cell.
+        :param painter: QPainter of the view
+        :param option: style options of the cell
+        :param index: index of the cell
+        :return: None
+        """
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect.adjusted(4, 4, -4, -4)
+        text = index.data()
+
+        if index.column() == 0:
+            # light drop shadow under the button
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor("#dddddd"))
+            painter.drawRoundedRect(rect.translated(0, 1), 10, 10)
+            # the button itself, slightly darker while hovered
+            hovered = option.state & QStyle.State_MouseOver
+            painter.setBrush(QColor("#f4f4f4" if hovered else "white"))
+            painter.drawRoundedRect(rect, 10, 10)
+            # the recipe title
+            painter.setPen(QColor("#333333"))
+            painter.setFont(self.titleFont)
+            text = painter.fontMetrics().elidedText(text, Qt.ElideRight, rect.width() - 20)
+            painter.drawText(rect, Qt.AlignCenter, text)
+        else:
+            missing = index.data(RecipeTableModel.MissingRole)
+            # the matched ingredients in red
+            painter.setPen(QColor("#B22222"))
+            painter.setFont(self.ingredientFont)
+            if not missing:
+                painter.drawText(rect, Qt.AlignLeft | Qt.AlignVCenter | Qt.TextWordWrap, text)
+            else:
+                # one line each for the matched and the missing ingredients, the missing ones in grey
+                top = rect.adjusted(0, 0, 0, -rect.height() // 2)
+                bottom = rect.adjusted(0, rect.height() // 2, 0, 0)
+                text = painter.fontMetrics().elidedText(text, Qt.ElideRight, top.width())
+                painter.drawText(top, Qt.AlignLeft | Qt.AlignBottom, text)
+                painter.setPen(QColor("#888888"))
+                painter.setFont(self.missingFont)
+                missing = painter.fontMetrics().elidedText(missing, Qt.ElideRight, bottom.width())
+                painter.drawText(bottom, Qt.AlignLeft | Qt.AlignTop, missing)
+
+        painter.restore()
+
+    def sizeHint(self, option, index) -> QSize:
+        """
+        Returns the size of a cell (every row has the same height).
+        :param option: style options of the cell
+        :param index: index of the cell
+        :return: size of the cell
+        """
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
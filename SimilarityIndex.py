@@ -0,0 +1,206 @@
+import numpy as np
+from IngredientPhrases import IngredientPhrases
+
+
+class SimilarityIndex:
+    """
+    Class that finds the recipes with the most similar ingredients to a recipe without comparing it to every recipe.
+    The ingredient set of a recipe is the names of its ingredient lines ("2 cups olive oil, divided" -> "olive oil").
+    Every set is summarized by a MinHash signature of NUM_PERMUTATIONS hashes, where two recipes agree on a hash
+    with probability equal to the Jaccard similarity of their sets. The signatures are cut into BANDS bands, and
+    recipes that agree on a whole band fall in the same bucket (locality-sensitive hashing): a lookup only scores
+    the recipes that share a bucket with the recipe, which are very likely the similar ones.
+    The buckets of a band are one array of recipe ids sorted by band key, so a bucket is found by binary search.
+    """
+
+    # number of hashes of a signature, and how they are split into bands: recipes share a bucket with probability
+    # 1 - (1 - J^ROWS)^BANDS for a Jaccard similarity J, which rises around J = (1 / BANDS)^(1 / ROWS) = 0.18
+    # (recipes share few ingredients, the closest ones are often around J = 0.25)
+    NUM_PERMUTATIONS = 64
+    BANDS = 32
+    ROWS = NUM_PERMUTATIONS // BANDS
+
+    # the hashes are (a * x + b) mod PRIME with random a and b drawn from SEED, so they are the same in every build
+    PRIME = (1 << 31) - 1
+    SEED = 7
+
+    # number of similar recipes returned by default
+    LIMIT = 8
+
+    # number of recipes read at a time while the index is built
+    CHUNK_SIZE = 50000
+
+    def __init__(self, names, offsets, signatures, band_keys, band_order):
+        """
+        Initializes the index from its arrays.
+        :param names: ingredient name ids of every recipe, sorted within a recipe, recipe after recipe
+        :param offsets: start of every recipe in names, plus the end of the last one
+        :param signatures: MinHash signature of every recipe, n_recipes x NUM_PERMUTATIONS
+        :param band_keys: BANDS x n band keys of the recipes with ingredients, each row sorted
+        :param band_order: BANDS x n recipe ids in the order of band_keys
+        """
+        self.names = names
+        self.offsets = offsets
+        self.signatures = signatures
+        self.band_keys = band_keys
+        self.band_order = band_order
+        self.n_recipes = len(offsets) - 1
+
+    @classmethod
+    def from_table(cls, table, chunk_size: int = CHUNK_SIZE, allocate=None) -> "SimilarityIndex":
+        """
+        Builds the index from the parsed ingredient lines of the dataset.
+        The recipes are read twice, a chunk at a time: the first pass counts the distinct names of every recipe,
+        the second stores them and computes the signatures of the chunk, then the buckets are sorted one band
+        at a time.
+        :param table: IngredientTable of the dataset
+        :param chunk_size: number of recipes read at a time
+        :param allocate: function (name, shape, dtype) returning the arrays of the index ("names", "names.offsets",
+                         "signatures", "band_keys" and "band_order"), in memory if None
+        :return: the built SimilarityIndex
+        """
+        allocate = allocate or (lambda name, shape, dtype: np.empty(shape, dtype=dtype))
+
+        # the ingredient name of every distinct line, numbered; lines without a name are left out
+        ids = {"": -1}
+        line_names = np.fromiter((ids.setdefault(" ".join(IngredientPhrases.get_name(line)), len(ids) - 1)
+                                  for line in table.lines), dtype=np.int64, count=len(table.lines))
+
+        # the number of distinct names of every recipe, then where the names of each recipe start
+        offsets = allocate("names.offsets", (table.n_recipes + 1,), np.int64)
+        offsets[0] = 0
+        for start, counts, _ in cls.iter_names(table, line_names, chunk_size):
+            offsets[start + 1:start + 1 + len(counts)] = counts
+        np.cumsum(offsets, out=offsets)
+        has_names = np.diff(offsets) > 0
+
+        # the names of every recipe, and the minimum of every hash over them; recipes without names keep PRIME
+        rng = np.random.default_rng(cls.SEED)
+        a = rng.integers(1, cls.PRIME, cls.NUM_PERMUTATIONS, dtype=np.int64)
+        b = rng.integers(0, cls.PRIME, cls.NUM_PERMUTATIONS, dtype=np.int64)
+        names = allocate("names", (offsets[-1],), np.int32)
+        signatures = allocate("signatures", (table.n_recipes, cls.NUM_PERMUTATIONS), np.uint32)
+        for start, counts, chunk_names in cls.iter_names(table, line_names, chunk_size):
+            names[offsets[start]:offsets[start] + len(chunk_names)] = chunk_names
+            chunk = np.full((len(counts), cls.NUM_PERMUTATIONS), cls.PRIME, dtype=np.uint32)
+            if len(chunk_names):
+                # empty recipes have no names between their neighbors, so each start begins one recipe's names
+                starts = (np.cumsum(counts) - counts)[counts > 0]
+                for k in range(cls.NUM_PERMUTATIONS):
+                    chunk[counts > 0, k] = np.minimum.reduceat((a[k] * chunk_names + b[k]) % cls.PRIME, starts)
+            signatures[start:start + len(counts)] = chunk
+
+        # the buckets of every band, only of the recipes with ingredients
+        recipe_ids = np.flatnonzero(has_names).astype(np.int32)
+        band_keys = allocate("band_keys", (cls.BANDS, len(recipe_ids)), np.uint64)
+        band_order = allocate("band_order", (cls.BANDS, len(recipe_ids)), np.int32)
+        for band in range(cls.BANDS):
+            keys = cls.hash_band(signatures[recipe_ids, band * cls.ROWS:(band + 1) * cls.ROWS])
+            order = np.argsort(keys, kind="stable")
+            band_keys[band], band_order[band] = keys[order], recipe_ids[order]
+        return cls(names, offsets, signatures, band_keys, band_order)
+
+    @staticmethod
+    def iter_names(table, line_names, chunk_size: int):
+        """
+        Collects the distinct ingredient names of every chunk of recipes.
+        :param table: IngredientTable of the dataset
+        :param line_names: name id of every distinct line, -1 for the lines without a name
+        :param chunk_size: number of recipes read at a time
+        :return: iterator over (first recipe of the chunk, number of names of every recipe of the chunk,
+                 sorted names of every recipe, recipe after recipe)
+        """
+        for start in range(0, table.n_recipes, chunk_size):
+            end = min(start + chunk_size, table.n_recipes)
+            names = line_names[np.asarray(table.line_ids[table.offsets[start]:table.offsets[end]], dtype=np.int64)]
+            recipes = np.repeat(np.arange(end - start, dtype=np.int64), np.diff(table.offsets[start:end + 1]))
+            keys = np.unique((recipes[names >= 0] << 32) | names[names >= 0])
+            yield start, np.bincount(keys >> 32, minlength=end - start), (keys & 0xFFFFFFFF).astype(np.int32)
+
+    @classmethod
+    def get_band_keys(cls, signatures):
+        """
+        Hashes every band of some signatures into one 64-bit key.
+        :param signatures: MinHash signatures, one per row
+        :return: numpy uint64 array of BANDS x number of signatures
+        """
+        signatures = np.asarray(signatures)
+        return np.stack([cls.hash_band(signatures[:, band * cls.ROWS:(band + 1) * cls.ROWS])
+                         for band in range(cls.BANDS)])
+
+    @staticmethod
+    def hash_band(rows):
+        """
+        Hashes the rows of one band of some signatures into one 64-bit key per signature.
+        :param rows: the ROWS hashes of the band of every signature, one signature per row
+        :return: numpy uint64 array with one key per signature
+        """
+        keys = np.zeros(len(rows), dtype=np.uint64)
+        # polynomial hash of the rows of a band, wrapping around modulo 2^64
+        for row in range(rows.shape[1]):
+            keys = keys * np.uint64(0x100000001B3) + rows[:, row].astype(np.uint64)
+        return keys
+
+    def get_names(self, recipe_id: int):
+        """
+        Returns the ingredient names of one recipe.
+        :param recipe_id: id (row position) of the recipe
+        :return: sorted numpy array of name ids
+        """
+        return self.names[self.offsets[recipe_id]:self.offsets[recipe_id + 1]]
+
+    def get_candidates(self, recipe_id: int):
+        """
+        Finds the recipes that share at least one bucket with a recipe.
+        :param recipe_id: id (row position) of the recipe
+        :return: numpy array of recipe ids in ascending order, without the recipe itself
+        """
+        if self.offsets[recipe_id] == self.offsets[recipe_id + 1]:
+            return np.empty(0, dtype=np.int32)
+        keys = self.get_band_keys(self.signatures[recipe_id:recipe_id + 1])[:, 0]
+        buckets = []
+        for band, key in enumerate(keys):
+            start = np.searchsorted(self.band_keys[band], key, side="left")
+            end = np.searchsorted(self.band_keys[band], key, side="right")
+            buckets.append(self.band_order[band][start:end])
+        candidates = np.unique(np.concatenate(buckets))
+        return candidates[candidates != recipe_id]
+
+    def estimate(self, recipe_id: int, ids):
+        """
+        Estimates the Jaccard similarity of a recipe to other recipes from their signatures.
+        :param recipe_id: id (row position) of the recipe
+        :param ids: ids of the other recipes
+        :return: numpy float array, the share of hashes each recipe agrees on
+        """
+        return (self.signatures[ids] == self.signatures[recipe_id]).mean(axis=1)
+
+    def jaccard(self, recipe_id: int, ids):
+        """
+        Computes the exact Jaccard similarity of the ingredient names of a recipe to those of other recipes.
+        :param recipe_id: id (row position) of the recipe
+        :param ids: ids of the other recipes
+        :return: numpy float array, shared names over all names of each pair
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        own = self.get_names(recipe_id)
+        starts, sizes = self.offsets[ids], self.offsets[ids + 1] - self.offsets[ids]
+        # the names of all the recipes at once, and which of them the recipe also has
+        positions = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes) + np.arange(sizes.sum())
+        shared = np.bincount(np.repeat(np.arange(len(ids)), sizes), weights=np.isin(self.names[positions], own),
+                             minlength=len(ids))
+        return shared / np.maximum(len(own) + sizes - shared, 1)
+
+    def similar(self, recipe_id: int, top_k: int = LIMIT, exact: bool = True) -> tuple:
+        """
+        Finds the recipes most similar to a recipe among its LSH candidates.
+        :param recipe_id: id (row position) of the recipe
+        :param top_k: number of recipes to return, none if it is not positive
+        :param exact: whether to rank the candidates by exact Jaccard similarity instead of the signature estimate
+        :return: (recipe ids, similarities), most similar first (ties by recipe id)
+        """
+        candidates = self.get_candidates(recipe_id)
+        scores = self.jaccard(recipe_id, candidates) if exact else self.estimate(recipe_id, candidates)
+        # a negative top_k would otherwise drop only the last candidates
+        order = np.lexsort((candidates, -scores))[:max(top_k, 0)]
+        return candidates[order], scores[order]
@@ -0,0 +1,298 @@
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+import pandas as pd
+from IngredientIndex import IngredientIndex
+from IngredientPhrases import IngredientPhrases
+from IngredientSuggester import IngredientSuggester
+from IngredientTable import IngredientTable
+from RecipeSnapshot import SNAPSHOT_FORMAT
+from RecipeStore import RecipeStore
+from RecipeTable import RecipeTable, RECIPE_COLUMNS
+from SimilarityIndex import SimilarityIndex
+from StringHeap import StringHeap
+from TextIndex import TextIndex, TEXT_COLUMNS
+
+# digest that tells distinct ingredient lines apart while the CSV is read (128 bits, too long to collide in practice)
+LINE_DIGEST_DTYPE = np.dtype("S16")
+
+
+class SnapshotBuilder:
+    """
+    Class that streams a recipe CSV file into a snapshot (see RecipeSnapshot) without holding the dataset in memory.
+    The CSV is parsed a chunk of rows at a time: the text columns, the ingredient lines and the words of the titles
+    and instructions of a chunk are appended to files in the snapshot directory before the next chunk is read.
+    The indexes are then built from those memory-mapped files a chunk of recipes at a time, straight into the
+    arrays of the snapshot. No text is held for the whole dataset: memory grows with the vocabularies (distinct
+    words, phrases and ingredient names), with a few dozen bytes per distinct ingredient line (its digest while
+    the CSV is read, then the ids of its phrases) and per recipe (the title sort keys), and with the chunk size.
+    """
+
+    # number of CSV rows parsed at a time
+    CHUNK_SIZE = 10000
+
+    # number of bytes copied at a time when an appended file becomes an array of the snapshot
+    COPY_SIZE = 1 << 26
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        """
+        Initializes the builder.
+        :param path: snapshot directory (created if needed)
+        :param chunk_size: number of CSV rows parsed at a time
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.parts = {}  # name -> [open file, dtype, number of values] of the arrays being appended to
+        self.arrays = []  # memory-mapped arrays of the snapshot, flushed before the meta file is written
+        self.temporary = []  # files only needed while building
+        # the distinct ingredient lines seen so far, as a few runs of the digests of their text in sorted order
+        # and their line ids (see append_ingredients)
+        self.line_runs = []
+
+    def get_path(self, name: str) -> str:
+        """
+        Returns the path of an array of the snapshot.
+        :param name: name of the array without the .npy extension
+        :return: path of the .npy file
+        """
+        return os.path.join(self.path, name + ".npy")
+
+    def append(self, name: str, values, dtype):
+        """
+        Appends values to an array that is written a chunk at a time.
+        :param name: name of the array
+        :param values: values to append
+        :param dtype: numpy type of the array
+        :return: None
+        """
+        if name not in self.parts:
+            self.parts[name] = [open(self.get_path(name) + ".part", "wb"), np.dtype(dtype), 0]
+        part = self.parts[name]
+        values = np.asarray(values, dtype=part[1])
+        part[0].write(values.tobytes())
+        part[2] += len(values)
+
+    def append_items(self, name: str, lengths, values, dtype):
+        """
+        Appends items stored back to back to an array, and where every item ends to its offsets (name.offsets).
+        :param name: name of the array
+        :param lengths: number of values of every item
+        :param values: values of the items, item after item
+        :param dtype: numpy type of the array
+        :return: None
+        """
+        if name not in self.parts:
+            self.append(name + ".offsets", [0], np.int64)
+            self.append(name, [], dtype)
+        self.append(name + ".offsets", self.parts[name][2] + np.cumsum(lengths, dtype=np.int64), np.int64)
+        self.append(name, values, dtype)
+
+    def append_strings(self, name: str, strings):
+        """
+        Appends strings to a string heap (see StringHeap) that is written a chunk at a time.
+        :param name: name of the heap
+        :param strings: strings to append
+        :return: None
+        """
+        encoded = [string.encode("utf-8") for string in strings]
+        self.append_items(name, [len(item) for item in encoded], np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                          np.uint8)
+
+    def finish(self, name: str, temporary: bool = False):
+        """
+        Closes an appended array and turns it into an array of the snapshot.
+        :param name: name of the array
+        :param temporary: whether the array is only needed while building, it is then read from the appended file
+        :return: the array, backed by the mapped file
+        """
+        file, dtype, count = self.parts.pop(name)
+        file.close()
+        if temporary:
+            self.temporary.append(file.name)
+            return np.asarray(np.memmap(file.name, dtype=dtype, mode="r")) if count else np.empty(0, dtype=dtype)
+        array = self.allocate(name, (count,), dtype)
+        if count:
+            # copied a block at a time, the appended file is never read into memory at once
+            values = np.memmap(file.name, dtype=dtype, mode="r")
+            step = max(self.COPY_SIZE // dtype.itemsize, 1)
+            for start in range(0, count, step):
+                array[start:start + step] = values[start:start + step]
+            del values
+        os.remove(file.name)
+        # a plain array view of the mapping, slicing a np.memmap is several times slower
+        return np.asarray(array)
+
+    def allocate(self, name: str, shape, dtype):
+        """
+        Creates an array of the snapshot, memory-mapped so it is filled without being held in memory.
+        :param name: name of the array
+        :param shape: shape of the array
+        :param dtype: numpy type of the array
+        :return: the writable array
+        """
+        path = self.get_path(name)
+        if not int(np.prod(shape)):
+            # an empty file cannot be memory-mapped
+            np.save(path, np.empty(shape, dtype=dtype))
+            return np.load(path)
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(int(size) for size in shape))
+        self.arrays.append(array)
+        return array
+
+    def get_allocator(self, prefix: str):
+        """
+        Returns a function that creates arrays of the snapshot whose names start with a prefix, for the index builds.
+        :param prefix: start of the names of the arrays
+        :return: function (name, shape, dtype) returning the writable array
+        """
+        return lambda name, shape, dtype: self.allocate(prefix + name, shape, dtype)
+
+    def save(self, name: str, array):
+        """
+        Writes a small array of the snapshot at once.
+        :param name: name of the array
+        :param array: the array
+        :return: None
+        """
+        np.save(self.get_path(name), array)
+
+    def save_strings(self, name: str, strings):
+        """
+        Writes a small string heap of the snapshot (see StringHeap) at once.
+        :param name: name of the heap
+        :param strings: the strings
+        :return: None
+        """
+        encoded = [string.encode("utf-8") for string in strings]
+        self.save(name, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.save(name + ".offsets", StringHeap.pack_offsets(encoded))
+
+    def build(self, data_path: str, signature) -> str:
+        """
+        Reads the recipe CSV file chunk by chunk and writes its snapshot.
+        :param data_path: path to the recipe CSV file
+        :param signature: (mtime, size) of the data file, taken before reading it
+        :return: the snapshot directory
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # readers ignore the snapshot while it is rewritten, the meta file is written last
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        # every array starts empty, so an empty CSV file still gives a complete snapshot
+        for name in RECIPE_COLUMNS + ("lines",):
+            self.append_items(name, [], [], np.uint8)
+        self.append_items("line_ids", [], [], np.int32)
+        for name in ("text_tokens", "text_title_lengths", "text_lengths"):
+            self.append(name, [], np.int32)
+
+        # the rows of each chunk are appended and dropped before the next chunk is parsed
+        words = {}  # distinct word of the titles and instructions -> id in order of first appearance
+        for chunk in pd.read_csv(data_path, usecols=list(RECIPE_COLUMNS), chunksize=self.chunk_size):
+            # missing values are stored as empty strings
+            columns = {column: [value if isinstance(value, str) else "" for value in chunk[column]]
+                       for column in RECIPE_COLUMNS}
+            for column in RECIPE_COLUMNS:
+                self.append_strings(column, columns[column])
+            self.append_ingredients(columns["Cleaned_Ingredients"])
+            for name, values in zip(("text_tokens", "text_title_lengths", "text_lengths"),
+                                    TextIndex.tokenize_recipes(*(columns[column] for column in TEXT_COLUMNS), words)):
+                self.append(name, values, np.int32)
+        # the digests are only needed while the lines are read
+        self.line_runs = []
+
+        # the text columns and ingredient lines, memory-mapped from the snapshot from now on
+        table = RecipeTable({column: StringHeap(self.finish(column), self.finish(column + ".offsets"))
+                             for column in RECIPE_COLUMNS})
+        ingredients = IngredientTable(StringHeap(self.finish("lines"), self.finish("lines.offsets")),
+                                      self.finish("line_ids"), self.finish("line_ids.offsets"))
+
+        # the ingredient index: the posting lists are built into the snapshot in the order of the vocabulary,
+        # then the vocabulary heap, the offsets of the lists and the recipe sizes are written
+        index = IngredientIndex.from_table(ingredients, allocate=self.allocate)
+        self.save_strings("vocabulary", list(index.postings))
+        self.save("postings.offsets", StringHeap.pack_offsets(list(index.postings.values())))
+        self.save("line_postings.offsets", StringHeap.pack_offsets([index.line_postings[phrase]
+                                                                    for phrase in index.postings]))
+        self.save("sizes", np.asarray(index.sizes, dtype=np.int32))
+
+        # the ingredient suggestions, phrases of the index
+        suggester = IngredientSuggester.from_table(ingredients, index.postings)
+        self.save_strings("suggester_phrases", suggester.phrases)
+        self.save("suggester_frequencies", suggester.frequencies)
+        self.save_strings("suggester_keys", suggester.keys)
+        self.save("suggester_key_phrases", suggester.key_phrases)
+        del index, suggester
+
+        # the full-text index from the appended words: encoded blocks built into the snapshot, then the vocabulary
+        text_index = TextIndex.from_tokens(words, self.finish("text_tokens", temporary=True),
+                                           self.finish("text_title_lengths"), self.finish("text_lengths"),
+                                           allocate=self.get_allocator("text_"))
+        self.save("text_vocabulary", text_index.vocabulary.heap)
+        self.save("text_vocabulary.offsets", text_index.vocabulary.offsets)
+        self.save("text_postings.offsets", text_index.offsets)
+        self.save("text_positions.offsets", text_index.position_offsets)
+        self.save("text_df", text_index.df)
+        del text_index, words
+
+        # the similarity index and the title ranks
+        SimilarityIndex.from_table(ingredients, allocate=self.get_allocator("similarity_"))
+        self.save("title_rank", RecipeStore.rank_titles(table.columns["Title"]))
+
+        for array in self.arrays:
+            array.flush()
+        self.arrays = []
+        for path in self.temporary:
+            os.remove(path)
+        self.temporary = []
+        with open(meta_path, "w") as file:
+            json.dump({"format": SNAPSHOT_FORMAT, "source": list(signature), "n_recipes": table.n_recipes,
+                       "columns": list(RECIPE_COLUMNS)}, file)
+        return self.path
+
+    def append_ingredients(self, ingredients):
+        """
+        Splits the Cleaned_Ingredients strings of a chunk into lines and appends their line ids (see IngredientTable).
+        The lines of the chunk are told apart from the earlier ones by the digests of their text, looked up
+        with a binary search in each sorted run of the digests of the distinct lines so far; new lines are numbered
+        in order of first appearance and appended to the lines heap.
+        The new digests of each chunk become a run of their own, and a run is merged into the one before it
+        once it is at least half its size, so there are only a few runs and every digest is merged a few times.
+        :param ingredients: ingredients strings, one per recipe of the chunk
+        :return: None
+        """
+        items = [IngredientPhrases.split_items(text) for text in ingredients]
+        lines = list(itertools.chain.from_iterable(items))
+        digests = np.array([hashlib.blake2b(line.encode("utf-8"), digest_size=LINE_DIGEST_DTYPE.itemsize).digest()
+                            for line in lines], dtype=LINE_DIGEST_DTYPE)
+        distinct, first, inverse = np.unique(digests, return_index=True, return_inverse=True)
+
+        # the distinct lines of the chunk that were seen in an earlier chunk keep their id
+        # (each run is only searched for the lines the larger runs before it do not have)
+        distinct_ids = np.full(len(distinct), -1, dtype=np.int32)
+        missing = np.arange(len(distinct))
+        for run_digests, run_ids in self.line_runs:
+            positions = np.searchsorted(run_digests, distinct[missing])
+            found = positions < len(run_digests)
+            found[found] = run_digests[positions[found]] == distinct[missing[found]]
+            distinct_ids[missing[found]] = run_ids[positions[found]]
+            missing = missing[~found]
+
+        # the others get the next ids, in the order they appear in the chunk
+        new = np.flatnonzero(distinct_ids < 0)
+        by_appearance = new[np.argsort(first[new])]
+        distinct_ids[by_appearance] = sum(len(run_ids) for _, run_ids in self.line_runs) + np.arange(
+            len(new), dtype=np.int32)
+        self.append_strings("lines", [lines[i] for i in first[by_appearance].tolist()])
+
+        # the new digests are a sorted run, merged with the runs before it while they are not much larger
+        self.line_runs.append((distinct[new], distinct_ids[new]))
+        while len(self.line_runs) > 1 and len(self.line_runs[-2][0]) <= 2 * len(self.line_runs[-1][0]):
+            (digests, ids), (run_digests, run_ids) = self.line_runs[-2:]
+            positions = np.searchsorted(digests, run_digests)
+            self.line_runs[-2:] = [(np.insert(digests, positions, run_digests), np.insert(ids, positions, run_ids))]
+
+        self.append_items("line_ids", [len(recipe_items) for recipe_items in items], distinct_ids[inverse], np.int32)
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class StringHeap:
+    """
+    Class that stores many strings back to back in one UTF-8 byte array, indexed by offsets.
+    It behaves like a read-only list of strings: a string is only decoded when it is accessed, so a few
+    large arrays replace one Python object per string and can be memory-mapped from a snapshot.
+    """
+
+    def __init__(self, heap, offsets):
+        """
+        Initializes the heap from its arrays.
+        :param heap: uint8 array of the encoded strings
+        :param offsets: len(strings) + 1 offsets, string i spans heap[offsets[i]:offsets[i + 1]]
+        """
+        self.heap = heap
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings) -> "StringHeap":
+        """
+        Encodes a sequence of strings into a heap.
+        :param strings: sequence of strings
+        :return: the built StringHeap
+        """
+        encoded = [string.encode("utf-8") for string in strings]
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), cls.pack_offsets(encoded))
+
+    @staticmethod
+    def pack_offsets(items, start: int = 0):
+        """
+        Returns the offsets of items stored back to back.
+        :param items: sequence of byte strings or arrays
+        :param start: offset of the first item
+        :return: numpy array of len(items) + 1 offsets, item i spans offsets[i]:offsets[i + 1]
+        """
+        lengths = np.fromiter((len(item) for item in items), dtype=np.int64, count=len(items))
+        return np.concatenate(([start], start + np.cumsum(lengths))).astype(np.int64)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of strings.
+        :return: number of strings
+        """
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        """
+        Decodes one string.
+        :param i: position of the string
+        :return: the string
+        """
+        return self.heap[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        """
+        Decodes every string in order.
+        :return: iterator over the strings
+        """
+        return (self[i] for i in range(len(self)))
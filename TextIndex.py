@@ -0,0 +1,454 @@
+import bisect
+import re
+import numpy as np
+import pandas as pd
+from StringHeap import StringHeap
+
+# text columns of the recipes that are searched, the title first
+TEXT_COLUMNS = ("Title", "Instructions")
+
+
+class TextIndex:
+    """
+    Class that searches the titles and instructions of the recipes with a positional inverted index.
+    Every word of the vocabulary has one compressed posting block: the gaps between the ids of the recipes
+    that contain it, how many times it appears in each of them (in total and in the title) and the gaps
+    between its positions, all variable-byte encoded back to back in one uint8 array. Recipes are ranked
+    with BM25, words of the title counting TITLE_WEIGHT times, and quoted phrases are matched on positions.
+    The arrays are written to the snapshot and memory-mapped at startup, and the vocabulary is kept sorted
+    so a word is found by binary search without building a dictionary.
+    """
+
+    # BM25 term frequency saturation and document length normalization
+    K1 = 1.2
+    B = 0.75
+
+    # a word in the title counts as this many words of the instructions
+    TITLE_WEIGHT = 3
+
+    # number of recipes tokenized at a time while the index is built
+    CHUNK_SIZE = 20000
+
+    # a word being typed that is not in the vocabulary yet matches at most this many of the most common words
+    # it starts, once it is this long
+    PREFIX_LIMIT = 10
+    PREFIX_MIN_LENGTH = 2
+
+    # number of values variable-byte encoded at a time
+    ENCODE_BATCH = 1 << 20
+
+    # words are runs of letters and digits, case-insensitive
+    WORD_PATTERN = re.compile(r"[^\W_]+")
+
+    # a query is quoted phrases and bare words, a phrase still being typed has no closing quote
+    QUERY_PATTERN = re.compile(r'"([^"]*)"?|([^\s"]+)')
+
+    def __init__(self, vocabulary, data, offsets, position_offsets, df, title_lengths, lengths):
+        """
+        Initializes the index from its arrays.
+        :param vocabulary: StringHeap of the words, sorted
+        :param data: uint8 array of the encoded posting blocks, in vocabulary order
+        :param offsets: len(vocabulary) + 1 offsets, the block of word i spans data[offsets[i]:offsets[i + 1]]
+        :param position_offsets: offset of the position gaps within the block of every word
+        :param df: number of recipes that contain every word
+        :param title_lengths: number of words in the title of every recipe
+        :param lengths: number of words in the title and instructions of every recipe
+        """
+        self.vocabulary = vocabulary
+        self.data = data
+        self.offsets = offsets
+        self.position_offsets = position_offsets
+        self.df = df
+        self.title_lengths = title_lengths
+        self.lengths = lengths
+        self.n_recipes = len(lengths)
+        # length of every recipe as BM25 sees it, with the title words weighted
+        self.weighted_lengths = np.asarray(lengths, dtype=np.float64) + (self.TITLE_WEIGHT - 1) * np.asarray(
+            title_lengths, dtype=np.float64)
+        self.average_length = max(float(self.weighted_lengths.mean()) if self.n_recipes else 0.0, 1.0)
+
+    @classmethod
+    def tokenize(cls, text: str) -> list:
+        """
+        Splits a text into lowercase words.
+        :param text: text of a title, instructions or query
+        :return: list of words
+        """
+        return cls.WORD_PATTERN.findall(text.lower())
+
+    @classmethod
+    def from_table(cls, table, chunk_size: int = CHUNK_SIZE) -> "TextIndex":
+        """
+        Builds the index from the Title and Instructions columns of a RecipeTable.
+        :param table: RecipeTable of the dataset
+        :param chunk_size: number of recipes tokenized at a time
+        :return: the built TextIndex
+        """
+        titles, instructions = (table.columns[column] for column in TEXT_COLUMNS)
+        words = {}  # word -> id in order of first appearance
+        parts = ([], [], [])  # word ids, title lengths and lengths of every chunk
+        for start in range(0, table.n_recipes, chunk_size):
+            end = min(start + chunk_size, table.n_recipes)
+            chunk = cls.tokenize_recipes((titles[i] for i in range(start, end)),
+                                         (instructions[i] for i in range(start, end)), words)
+            for part, values in zip(parts, chunk):
+                part.append(values)
+        term_ids, title_lengths, lengths = (np.concatenate(part) if part else np.empty(0, dtype=np.int32)
+                                            for part in parts)
+        return cls.from_tokens(words, term_ids, title_lengths, lengths, chunk_size)
+
+    @classmethod
+    def tokenize_recipes(cls, titles, instructions, words: dict) -> tuple:
+        """
+        Splits the titles and instructions of some recipes into words, numbered in order of first appearance.
+        Only the distinct words of the recipes go through the words dictionary.
+        :param titles: title of every recipe
+        :param instructions: instructions of every recipe, in the same order
+        :param words: dict from word to id, new words are added to it
+        :return: (word ids of the title then instructions of every recipe, recipe after recipe,
+                  number of words in every title, number of words in every title and instructions)
+        """
+        tokens, title_lengths, lengths = [], [], []
+        for title, body in zip(titles, instructions):
+            title, body = cls.tokenize(title), cls.tokenize(body)
+            tokens += title
+            tokens += body
+            title_lengths.append(len(title))
+            lengths.append(len(title) + len(body))
+        codes, uniques = pd.factorize(np.array(tokens, dtype=object))
+        mapping = np.fromiter((words.setdefault(word, len(words)) for word in uniques), dtype=np.int32,
+                              count=len(uniques))
+        return mapping[codes], np.asarray(title_lengths, dtype=np.int32), np.asarray(lengths, dtype=np.int32)
+
+    @classmethod
+    def from_tokens(cls, words: dict, term_ids, title_lengths, lengths, chunk_size: int = CHUNK_SIZE,
+                    allocate=None) -> "TextIndex":
+        """
+        Builds the index from the words of every recipe (see tokenize_recipes).
+        The recipes are read twice, a chunk at a time: the first pass adds up the size of every posting block,
+        the second encodes the postings of each chunk straight into their place in the blocks, so only one
+        chunk of postings is in memory at a time.
+        :param words: dict from word to id, for every word of term_ids
+        :param term_ids: word ids of every recipe, recipe after recipe (may be memory-mapped)
+        :param title_lengths: number of words in the title of every recipe
+        :param lengths: number of words in the title and instructions of every recipe
+        :param chunk_size: number of recipes grouped at a time
+        :param allocate: function (name, shape, dtype) returning the array of the encoded blocks, in memory if None
+        :return: the built TextIndex
+        """
+        # number the words in sorted order, the order of the vocabulary
+        vocabulary = sorted(words)
+        renumber = np.empty(len(words), dtype=np.int32)
+        renumber[[words[word] for word in vocabulary]] = np.arange(len(words), dtype=np.int32)
+
+        # the block of a word: recipe gaps, frequencies, title frequencies, then position gaps; the size of
+        # every section of every block, then where each section starts in the data
+        section_sizes = np.zeros((4, len(vocabulary)), dtype=np.int64)
+        df = np.zeros(len(vocabulary), dtype=np.int32)
+        for posting_terms, sections in cls.iter_sections(renumber, term_ids, title_lengths, lengths, chunk_size):
+            df += np.bincount(posting_terms, minlength=len(vocabulary)).astype(np.int32)
+            for section, (values, terms) in enumerate(sections):
+                section_sizes[section] += np.bincount(terms, weights=cls.get_sizes(values),
+                                                      minlength=len(vocabulary)).astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(section_sizes.sum(axis=0)))).astype(np.int64)
+        section_starts = offsets[:-1] + np.cumsum(section_sizes, axis=0) - section_sizes
+
+        # every chunk adds its postings at the end of the sections filled so far, in recipe order
+        data = (allocate or (lambda name, shape, dtype: np.empty(shape, dtype=dtype)))("postings", (offsets[-1],),
+                                                                                      np.uint8)
+        cursors = section_starts.copy()
+        for _, sections in cls.iter_sections(renumber, term_ids, title_lengths, lengths, chunk_size):
+            for section, (values, terms) in enumerate(sections):
+                encoded, sizes = cls.encode(values)
+                term_sizes = np.bincount(terms, weights=sizes, minlength=len(vocabulary)).astype(np.int64)
+                chunk_starts = np.cumsum(term_sizes) - term_sizes
+                data[np.arange(len(encoded)) + np.repeat(cursors[section] - chunk_starts, term_sizes)] = encoded
+                cursors[section] += term_sizes
+        return cls(StringHeap.from_strings(vocabulary), data, offsets, section_starts[3], df, title_lengths, lengths)
+
+    @classmethod
+    def iter_sections(cls, renumber, term_ids, title_lengths, lengths, chunk_size: int):
+        """
+        Groups the word occurrences of every chunk of recipes by word, into the values of the four sections
+        of the posting blocks. Recipe ids are gaps from the previous recipe of the same word (across chunks),
+        positions are gaps within a recipe.
+        :param renumber: vocabulary id of every word id of term_ids
+        :param term_ids: word ids of every recipe, recipe after recipe
+        :param title_lengths: number of words in the title of every recipe
+        :param lengths: number of words in the title and instructions of every recipe
+        :param chunk_size: number of recipes grouped at a time
+        :return: iterator over (word of every posting, ((values, word of every value) of each section)),
+                 each section ordered by word, then recipe, then position
+        """
+        last_recipe = np.zeros(len(renumber), dtype=np.int64)  # last recipe of every word in the previous chunks
+        token_start = 0
+        for start in range(0, len(lengths), chunk_size):
+            chunk_lengths = np.asarray(lengths[start:start + chunk_size], dtype=np.int64)
+            chunk_titles = np.asarray(title_lengths[start:start + chunk_size], dtype=np.int64)
+            token_end = token_start + int(chunk_lengths.sum())
+            terms = renumber[np.asarray(term_ids[token_start:token_end])]
+            token_start = token_end
+
+            # recipe and position of every word occurrence; the instructions start one position after the title,
+            # so a phrase never spans both
+            recipes = np.repeat(np.arange(len(chunk_lengths), dtype=np.int64), chunk_lengths)
+            positions = np.arange(len(terms), dtype=np.int64) - np.repeat(np.cumsum(chunk_lengths) - chunk_lengths,
+                                                                          chunk_lengths)
+            positions += positions >= chunk_titles[recipes]
+
+            # group the occurrences by word, keeping them in recipe and position order within a word
+            order = np.argsort(terms, kind="stable")
+            terms, recipes, positions = terms[order], recipes[order], positions[order]
+            in_title = positions < chunk_titles[recipes]
+            recipes += start
+
+            # one posting per (word, recipe)
+            first = np.ones(len(terms), dtype=bool)
+            first[1:] = (terms[1:] != terms[:-1]) | (recipes[1:] != recipes[:-1])
+            starts = np.flatnonzero(first)
+            posting_terms, posting_recipes = terms[starts], recipes[starts]
+            tf = np.diff(np.append(starts, len(terms)))
+            title_tf = np.add.reduceat(in_title.astype(np.int64), starts) if len(starts) else np.empty(0, np.int64)
+
+            recipe_gaps = posting_recipes.copy()
+            recipe_gaps[1:] -= posting_recipes[:-1]
+            new_term = np.ones(len(starts), dtype=bool)
+            new_term[1:] = posting_terms[1:] != posting_terms[:-1]
+            recipe_gaps[new_term] = posting_recipes[new_term] - last_recipe[posting_terms[new_term]]
+            last_term = np.append(new_term[1:], True)
+            last_recipe[posting_terms[last_term]] = posting_recipes[last_term]
+            position_gaps = positions.copy()
+            position_gaps[1:] -= positions[:-1]
+            position_gaps[first] = positions[first]
+
+            yield posting_terms, ((recipe_gaps, posting_terms), (tf, posting_terms), (title_tf, posting_terms),
+                                  (position_gaps, terms))
+
+    @classmethod
+    def encode(cls, values) -> tuple:
+        """
+        Variable-byte encodes non-negative integers: 7 bits per byte, low bits first,
+        the high bit set on every byte but the last of a value.
+        :param values: numpy array of non-negative integers
+        :return: (uint8 array of the encoded values, number of bytes of every value)
+        """
+        values = np.asarray(values, dtype=np.int64)
+        sizes = cls.get_sizes(values)
+        # the per-byte temporaries are eight times the output, so the values are encoded a batch at a time
+        data = []
+        for start in range(0, len(values), cls.ENCODE_BATCH):
+            batch, batch_sizes = values[start:start + cls.ENCODE_BATCH], sizes[start:start + cls.ENCODE_BATCH]
+            value_of_byte = np.repeat(np.arange(len(batch)), batch_sizes)
+            byte_of_value = np.arange(len(value_of_byte)) - np.repeat(np.cumsum(batch_sizes) - batch_sizes,
+                                                                      batch_sizes)
+            encoded = ((batch[value_of_byte] >> (7 * byte_of_value)) & 0x7F).astype(np.uint8)
+            encoded[byte_of_value < batch_sizes[value_of_byte] - 1] |= 0x80
+            data.append(encoded)
+        return (np.concatenate(data) if data else np.empty(0, dtype=np.uint8)), sizes
+
+    @staticmethod
+    def get_sizes(values):
+        """
+        Returns how many bytes every value takes once variable-byte encoded (see encode).
+        :param values: numpy array of non-negative integers
+        :return: numpy int8 array of the number of bytes of every value
+        """
+        values = np.asarray(values, dtype=np.int64)
+        sizes = np.ones(len(values), dtype=np.int8)
+        for shift in range(7, 63, 7):
+            sizes += values >= (1 << shift)
+        return sizes
+
+    @staticmethod
+    def decode(data):
+        """
+        Decodes variable-byte encoded integers (see encode).
+        :param data: uint8 array of encoded values
+        :return: numpy int64 array of the values
+        """
+        data = np.asarray(data)
+        if not len(data):
+            return np.empty(0, dtype=np.int64)
+        last = data < 0x80
+        # small values (most gaps and frequencies) are a single byte
+        if last.all():
+            return data.astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+        value_of_byte = np.cumsum(np.concatenate(([0], last[:-1])))
+        byte_of_value = np.arange(len(data)) - starts[value_of_byte]
+        return np.add.reduceat((data & 0x7F).astype(np.int64) << (7 * byte_of_value), starts)
+
+    def get_term_id(self, word: str) -> int:
+        """
+        Finds a word in the sorted vocabulary.
+        :param word: lowercase word
+        :return: id of the word, or -1 if no recipe contains it
+        """
+        i = bisect.bisect_left(self.vocabulary, word)
+        return i if i < len(self.vocabulary) and self.vocabulary[i] == word else -1
+
+    def get_postings(self, term_id: int) -> tuple:
+        """
+        Decodes the recipes of a word and its frequencies, without its positions.
+        :param term_id: id of the word
+        :return: (recipe ids in ascending order, frequency in each recipe, frequency in each title)
+        """
+        df = int(self.df[term_id])
+        values = self.decode(self.data[self.offsets[term_id]:self.position_offsets[term_id]])
+        return np.cumsum(values[:df]), values[df:2 * df], values[2 * df:3 * df]
+
+    def get_positions(self, term_id: int) -> tuple:
+        """
+        Decodes the recipes of a word and every position it appears at.
+        :param term_id: id of the word
+        :return: (recipe id of every occurrence, position of every occurrence), by recipe then position
+        """
+        recipes, tf, _ = self.get_postings(term_id)
+        gaps = self.decode(self.data[self.position_offsets[term_id]:self.offsets[term_id + 1]])
+        # positions restart from zero in every recipe
+        positions = np.cumsum(gaps)
+        starts = np.cumsum(tf) - tf
+        positions -= np.repeat(positions[starts] - gaps[starts], tf)
+        return np.repeat(recipes, tf), positions
+
+    def match_phrase(self, term_ids) -> tuple:
+        """
+        Finds the recipes where the words appear next to each other in order.
+        :param term_ids: ids of the words of the phrase
+        :return: (recipe ids in ascending order, number of occurrences of the phrase in each recipe,
+                  number of occurrences in each title)
+        """
+        # an occurrence is keyed by recipe id and the position the phrase would start at; the rarest words
+        # are intersected first so the candidate set shrinks fastest
+        keys = None
+        for offset in sorted(range(len(term_ids)), key=lambda i: self.df[term_ids[i]]):
+            recipes, positions = self.get_positions(term_ids[offset])
+            found = (recipes << 32) + positions - offset
+            if keys is None:
+                keys = found
+            else:
+                # both key arrays are sorted, so each candidate is looked up by binary search
+                at = np.minimum(np.searchsorted(found, keys), len(found) - 1)
+                keys = keys[found[at] == keys]
+            if not len(keys):
+                break
+        recipes, starts = keys >> 32, keys & 0xFFFFFFFF
+        in_title = starts + len(term_ids) <= self.title_lengths[recipes]
+        ids, inverse, tf = np.unique(recipes, return_inverse=True, return_counts=True)
+        return ids, tf, np.bincount(inverse, weights=in_title, minlength=len(ids)).astype(np.int64)
+
+    def bm25(self, recipes, tf, title_tf):
+        """
+        Scores the recipes that contain a word or phrase.
+        :param recipes: ids of the recipes that contain it
+        :param tf: number of occurrences in each recipe
+        :param title_tf: number of occurrences in each title
+        :return: numpy float array of the BM25 score of every recipe
+        """
+        weighted = tf + (self.TITLE_WEIGHT - 1) * title_tf
+        idf = np.log(1 + (self.n_recipes - len(recipes) + 0.5) / (len(recipes) + 0.5))
+        norm = self.K1 * (1 - self.B + self.B * self.weighted_lengths[recipes] / self.average_length)
+        return idf * weighted * (self.K1 + 1) / (weighted + norm)
+
+    @classmethod
+    def parse_query(cls, query: str) -> tuple:
+        """
+        Splits a query into bare words and quoted phrases.
+        :param query: text typed by the user, e.g. 'risotto "slow cooker"'
+        :return: (list of words, list of phrases as lists of words)
+        """
+        words, phrases = [], []
+        for phrase, word in cls.QUERY_PATTERN.findall(query):
+            if word:
+                words += cls.tokenize(word)
+            elif cls.tokenize(phrase):
+                phrases.append(cls.tokenize(phrase))
+        return words, phrases
+
+    def get_completions(self, prefix: str):
+        """
+        Finds the most common words that start with a prefix.
+        :param prefix: lowercase start of a word
+        :return: numpy array of the ids of at most PREFIX_LIMIT words
+        """
+        # the words starting with the prefix are one range of the sorted vocabulary
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + chr(0x10FFFF), start)
+        term_ids = np.arange(start, end)
+        if len(term_ids) > self.PREFIX_LIMIT:
+            term_ids = term_ids[np.argsort(-np.asarray(self.df[start:end]), kind="stable")[:self.PREFIX_LIMIT]]
+        return term_ids
+
+    def search(self, query: str, prefix: bool = False) -> tuple:
+        """
+        Finds the recipes matching a query and scores them with BM25.
+        Bare words are optional and add to the score of the recipes that contain them, quoted phrases
+        must all appear and add to the score like a word.
+        :param query: text typed by the user
+        :param prefix: whether the last word may be incomplete (search as you type): if it is not a word of the
+                       vocabulary, it matches the most common words it starts instead
+        :return: (recipe ids in ascending order, BM25 score of each recipe)
+        """
+        words, phrases = self.parse_query(query)
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # the word being typed is the last bare word, if the query ends with it (outside of quotes)
+        partial = None
+        typing = prefix and self.WORD_PATTERN.search(query[-1:]) and query.count('"') % 2 == 0
+        if typing and len(words[-1]) >= self.PREFIX_MIN_LENGTH and self.get_term_id(words[-1]) < 0:
+            partial = words.pop()
+
+        # (recipe ids, scores) of every word and phrase of the query
+        hits = []
+        for word in dict.fromkeys(words):
+            term_id = self.get_term_id(word)
+            if term_id >= 0:
+                postings = self.get_postings(term_id)
+                hits.append((postings[0], self.bm25(*postings)))
+        if partial is not None:
+            completions = [self.get_postings(term_id) for term_id in self.get_completions(partial)]
+            if completions:
+                # a recipe scores as its best completion of the word
+                ids, inverse = np.unique(np.concatenate([postings[0] for postings in completions]),
+                                         return_inverse=True)
+                best = np.zeros(len(ids))
+                np.maximum.at(best, inverse, np.concatenate([self.bm25(*postings) for postings in completions]))
+                hits.append((ids, best))
+        required = None
+        for phrase in phrases:
+            term_ids = [self.get_term_id(word) for word in phrase]
+            if min(term_ids) < 0:
+                return empty
+            postings = self.match_phrase(term_ids)
+            hits.append((postings[0], self.bm25(*postings)))
+            required = postings[0] if required is None else np.intersect1d(required, postings[0], assume_unique=True)
+        if not hits:
+            return empty
+
+        # the score of a recipe is the sum of the scores of the words and phrases it contains
+        ids, inverse = np.unique(np.concatenate([recipes for recipes, _ in hits]), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate([scores for _, scores in hits]), minlength=len(ids))
+        if required is not None:
+            keep = np.isin(ids, required, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+        return ids, scores
+
+    @staticmethod
+    def rank(ids, scores, title_rank, top_k=None):
+        """
+        Orders the matching recipes from highest to lowest score, then by title.
+        :param ids: ids of the matching recipes
+        :param scores: score of each recipe
+        :param title_rank: alphabetical rank of every recipe title
+        :param top_k: number of best recipes to keep, or None to keep every match
+        :return: positions into ids of the best recipes, best first
+        """
+        candidates = np.arange(len(ids))
+        if top_k is not None and len(ids) > top_k:
+            if top_k <= 0:
+                return np.empty(0, dtype=np.int64)
+            # every recipe scoring at least the top_k-th score, so ties are broken by title below
+            threshold = np.partition(scores, len(ids) - top_k)[len(ids) - top_k]
+            candidates = np.flatnonzero(scores >= threshold)
+        order = np.lexsort((title_rank[ids[candidates]], -scores[candidates]))
+        return candidates[order[:top_k]]
@@ -14,7 +14,7 @@ class WelcomeWindow(QWidget):
         """
         super().__init__()
         self.mainWidget = QWidget(self)
-        self.mainWidget.setGeometry(0, 0, 500, 340)
+        self.mainWidget.setGeometry(0, 0, 500, 540)
         self.mainWidget.setStyleSheet("background-color: rgb(248, 248, 248);")
 
         self.set_ui()
@@ -35,16 +35,18 @@ class WelcomeWindow(QWidget):
         title.setGeometry(0, 0, 500, 50)
 
         # initializes a message widget to show instructions for the program
-        message = QLabel("Please input a single-word ingredient into the text bar at the top of the main page to add an"
-                         " ingredient. Once you have added all of your desired ingredients, press the submit button and"
+        message = QLabel("Please input an ingredient (like garlic or olive oil) into the text bar at the top of the main"
+                         " page to add it (+garlic if every recipe must have it, -garlic to leave it out). Once you have"
+                         " added all of your desired ingredients, press the submit button and"
                          " wait for the page to load (this may take some time). Find a Recipe will provide you with a"
-                         " list of recipes that contain your ingredients. \n\nHope you are ready to cook!",
+                         " list of recipes that contain your ingredients. Choose Text under the text bar to search"
+                         " recipe names and instructions instead. \n\nHope you are ready to cook!",
                          self.mainWidget)
         message.setWordWrap(True)
 
         # handles the style of the message widget
         message.setFont(QFont("Arial", 15))
-        message.setGeometry(20, 70, 460, 210)
+        message.setGeometry(20, 70, 460, 410)
         message.setStyleSheet("padding: 20px;"
                               "background-color: white;"
                               "border-radius: 10px;")
@@ -61,4 +63,4 @@ class WelcomeWindow(QWidget):
         authors.setStyleSheet("background: None;")
         authors.setFont(QFont("Arial", 15, QFont.Bold))
         authors.setAlignment(Qt.AlignCenter)
-        authors.setGeometry(20, 285, 460, 50)
+        authors.setGeometry(20, 485, 460, 50)
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from RecipeEngine import RecipeEngine
+from RecipeStore import DATA_PATH, RecipeStore
+
+# engine of the current worker process, created once by init_worker
+_engine = None
+
+
+def init_worker(data_path: str):
+    """
+    Loads the recipe data and its index once in a worker process.
+    :param data_path: path to the recipe CSV file
+    :return: None
+    """
+    global _engine
+    _engine = RecipeEngine(RecipeStore.get(data_path))
+    _engine.store.title_rank  # builds the index and the title ranks before the first query
+
+
+def score_chunk(queries: list, backend: str, top_k: int) -> list:
+    """
+    Ranks the recipes of a chunk of pantry queries in a worker process.
+    :param queries: list of (query id, list of ingredients)
+    :param backend: "index" or "matrix", which scores the whole chunk together (see RecipeEngine.rank_batch)
+    :param top_k: number of recipes to return per query
+    :return: list of JSON-serializable results, one per query
+    """
+    results = _engine.query_batch([ingredients for _, ingredients in queries], backend, top_k)
+    return [{"id": query_id, "results": records} for (query_id, _), records in zip(queries, results)]
+
+
+def read_queries(lines):
+    """
+    Parses pantry queries from JSONL lines.
+    Each line is either a list of ingredients or an object with "ingredients" and an optional "id".
+    :param lines: iterable of text lines
+    :return: generator of (query id, list of ingredients)
+    """
+    for number, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        query = json.loads(line)
+        if isinstance(query, list):
+            yield number, query
+        else:
+            yield query.get("id", number), query["ingredients"]
+
+
+def read_chunks(queries, chunk_size: int):
+    """
+    Groups queries into chunks sent to the worker processes.
+    :param queries: iterable of (query id, list of ingredients)
+    :param chunk_size: number of queries per chunk
+    :return: generator of lists of queries
+    """
+    chunk = []
+    for query in queries:
+        chunk.append(query)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(lines, output, data_path: str = DATA_PATH, workers: int = None, chunk_size: int = 256,
+              backend: str = "index", top_k: int = RecipeEngine.RESULT_LIMIT):
+    """
+    Scores pantry queries across a process pool and streams the ranked results as JSONL, in input order.
+    Only a few chunks per worker are in flight at a time, so any number of queries can be streamed.
+    :param lines: iterable of JSONL query lines
+    :param output: text file the JSONL results are written to
+    :param data_path: path to the recipe CSV file
+    :param workers: number of worker processes, the number of CPUs if None
+    :param chunk_size: number of queries per chunk
+    :param backend: "index" or "matrix" (see RecipeEngine.rank)
+    :param top_k: number of recipes to return per query
+    :return: number of queries scored
+    """
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data_path,)) as executor:
+        pending = deque()
+        for chunk in read_chunks(read_queries(lines), chunk_size):
+            pending.append(executor.submit(score_chunk, chunk, backend, top_k))
+            # write finished chunks in order once enough work is queued
+            while len(pending) >= workers * 4 or (pending and pending[0].done()):
+                count += write_results(pending.popleft().result(), output)
+        while pending:
+            count += write_results(pending.popleft().result(), output)
+    return count
+
+
+def write_results(results: list, output) -> int:
+    """
+    Writes results as JSONL.
+    :param results: list of JSON-serializable results
+    :param output: text file to write to
+    :return: number of results written
+    """
+    for result in results:
+        output.write(json.dumps(result) + "\n")
+    output.flush()
+    return len(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank recipes for many pantries without the GUI. "
+                                                 "Reads one JSON query per line, writes one JSON result per line.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of queries, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to write results to, or - for stdout")
+    parser.add_argument("--data", default=DATA_PATH, help="path to the recipe CSV file")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=256, help="number of queries sent to a worker at once")
+    parser.add_argument("--backend", choices=("index", "matrix"), default="index",
+                        help="scoring backend, matrix scores each chunk of queries together")
+    parser.add_argument("--top-k", type=int, default=RecipeEngine.RESULT_LIMIT, help="recipes returned per query")
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    with input_file, output_file:
+        run_batch(input_file, output_file, args.data, args.workers, args.chunk_size, args.backend, args.top_k)
@@ -0,0 +1,262 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+# sizes of the synthetic corpora benchmarked by default
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+# building blocks of the synthetic recipes
+QUANTITIES = ("1", "2", "3", "½", "¼", "1½", "4", "6")
+UNITS = ("cup", "cups", "tbsp.", "tsp.", "lb.", "oz.", "(14-oz.) can", "large", "medium", "")
+PREPARATIONS = ("", "", "", ", chopped", ", divided", ", finely grated", ", thinly sliced", ", plus more")
+SYLLABLES = ("ba", "co", "ri", "pe", "sa", "lo", "mi", "ta", "ne", "go", "ru", "ki", "fe", "do", "la", "chi")
+DISH_WORDS = ("Stew", "Salad", "Risotto", "Tart", "Soup", "Roast", "Pasta", "Curry", "Cake", "Skillet")
+
+
+def make_vocabulary(size: int, rng) -> list:
+    """
+    Makes up distinct ingredient names, some of them two words long.
+    :param size: number of ingredient names
+    :param rng: numpy random generator
+    :return: sorted list of ingredient names
+    """
+    names = set()
+    while len(names) < size:
+        word = "".join(rng.choice(SYLLABLES, rng.integers(2, 4)))
+        if rng.random() < 0.3:
+            word += " " + "".join(rng.choice(SYLLABLES, 2))
+        names.add(word)
+    return sorted(names)
+
+
+def generate_corpus(path: str, rows: int, seed: int = 0, vocabulary_size: int = 5000, zipf_exponent: float = 1.1):
+    """
+    Writes a synthetic recipe CSV with the schema of the Kaggle dataset
+    (Title, Ingredients, Instructions, Image_Name, Cleaned_Ingredients).
+    Ingredient frequencies follow a Zipf distribution, so a few ingredients (like salt or oil in real recipes)
+    appear in a large share of the recipes and most appear rarely.
+    :param path: path of the CSV file to write
+    :param rows: number of recipes
+    :param seed: random seed, the same seed gives the same corpus
+    :param vocabulary_size: number of distinct ingredient names
+    :param zipf_exponent: exponent of the Zipf distribution of ingredient frequencies
+    :return: None
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    weights = 1.0 / np.arange(1, vocabulary_size + 1) ** zipf_exponent
+    weights /= weights.sum()
+
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["", "Title", "Ingredients", "Instructions", "Image_Name", "Cleaned_Ingredients"])
+        # recipes are generated in blocks so the random draws are vectorized
+        block = 10_000
+        for start in range(0, rows, block):
+            count = min(block, rows - start)
+            sizes = rng.integers(4, 21, count)
+            names = rng.choice(vocabulary_size, sizes.sum(), p=weights)
+            quantities = rng.choice(QUANTITIES, sizes.sum())
+            units = rng.choice(UNITS, sizes.sum())
+            preparations = rng.choice(PREPARATIONS, sizes.sum())
+            position = 0
+            for offset, size in enumerate(sizes):
+                items = [" ".join(part for part in (quantities[i], units[i], vocabulary[names[i]]) if part)
+                         + preparations[i] for i in range(position, position + size)]
+                main = vocabulary[names[position]].title()
+                steps = "\n".join(f"Cook the {vocabulary[names[i]]} over medium heat until tender, about "
+                                  f"{5 + i % 20} minutes." for i in range(position, position + min(size, 6)))
+                position += size
+                recipe_id = start + offset
+                writer.writerow([recipe_id, f"{main} {DISH_WORDS[recipe_id % len(DISH_WORDS)]} {recipe_id}",
+                                 str(items), steps, f"synthetic-{recipe_id}", str(items)])
+
+
+def median_ms(function, repeat: int) -> float:
+    """
+    Runs a function several times and returns its median duration.
+    :param function: function without arguments
+    :param repeat: number of runs
+    :return: median duration in milliseconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def once_ms(function) -> tuple:
+    """
+    Runs a function once and returns its duration and result.
+    :param function: function without arguments
+    :return: (duration in milliseconds, result)
+    """
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory of this process so far.
+    :return: peak resident set size in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark_corpus(path: str, repeat: int, seed: int = 0) -> dict:
+    """
+    Measures every stage of the query path on one corpus.
+    :param path: path to the corpus CSV
+    :param repeat: number of runs of each query measurement
+    :param seed: random seed used to pick the pantries
+    :return: dict of measurements (durations in milliseconds)
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import pandas as pd
+    from build_snapshot import build_snapshot
+    from RecipeEngine import RecipeEngine
+    from RecipeStore import RecipeStore
+
+    report = {"corpus": path, "corpus_bytes": os.path.getsize(path)}
+
+    # loading: CSV parse, index and title ranks, then the snapshot build and a cold start from the snapshot
+    store = RecipeStore(path, snapshot_path=path + ".bench-none")
+    report["load_csv_ms"], table = once_ms(lambda: store.table)
+    report["recipes"] = table.n_recipes
+    report["build_index_ms"], index = once_ms(lambda: store.index)
+    report["rank_titles_ms"], _ = once_ms(lambda: store.title_rank)
+    report["build_matrix_ms"], _ = once_ms(lambda: store.matrix)
+    report["rss_after_csv_load_mb"] = peak_rss_mb()
+    snapshot_path = path + ".snapshot"
+    report["build_snapshot_ms"], _ = once_ms(lambda: build_snapshot(path, snapshot_path))
+    snapshot_store = RecipeStore(path, snapshot_path)
+    report["load_snapshot_ms"], _ = once_ms(lambda: (snapshot_store.index, snapshot_store.title_rank))
+
+    # pantries: a few common ingredients, many ingredients, and the single most common one
+    # (plain words only, quantities, units and tokens with punctuation are not what users type)
+    words = [token for token in index.postings if token.isalpha() and token not in ("cup", "cups", "can", "plus",
+                                                                                   "large", "medium")]
+    by_frequency = sorted(words, key=lambda token: -len(index.postings[token]))
+    rng = np.random.default_rng(seed)
+    pantries = {"small": [str(token) for token in rng.choice(by_frequency[:50], 3, replace=False)],
+                "large": [str(token) for token in rng.choice(by_frequency[:500], 20, replace=False)],
+                "most_common": by_frequency[:1]}
+    report["pantries"] = pantries
+
+    # query latency without the result cache, then of a repeated query answered from the cache
+    engine = RecipeEngine(store, cache_size=0)
+    cached_engine = RecipeEngine(store)
+    for name, pantry in pantries.items():
+        report[f"matches_{name}"] = int(len(index.search(pantry)[0]))
+        for backend in ("index", "matrix"):
+            report[f"filter_{name}_{backend}_ms"] = median_ms(lambda: engine.filter_data(pantry, backend), repeat)
+        report[f"filter_{name}_all_matches_ms"] = median_ms(lambda: engine.filter_data(pantry, top_k=None), repeat)
+        cached_engine.filter_data(pantry)
+        report[f"filter_{name}_cached_ms"] = median_ms(lambda: cached_engine.filter_data(pantry), repeat)
+
+        # sort cost: partial top-K ranking against a full ranking of the matches and a full-frame sort_values
+        ids, scores, _ = index.search(pantry)
+        report[f"rank_top_k_{name}_ms"] = median_ms(
+            lambda: index.rank(ids, scores, store.title_rank, RecipeEngine.RESULT_LIMIT), repeat)
+        report[f"rank_full_{name}_ms"] = median_ms(lambda: index.rank(ids, scores, store.title_rank), repeat)
+        full_scores = np.zeros(table.n_recipes, dtype=np.int64)
+        full_scores[ids] = scores
+        scored = pd.DataFrame({"Title": list(table.columns["Title"]), "score": full_scores})
+        report[f"sort_values_full_frame_{name}_ms"] = median_ms(
+            lambda: scored.sort_values("score", ascending=False), repeat)
+
+    # full-text search: the index build, then a word and a phrase of the instructions against a str.contains scan
+    report["build_text_index_ms"], text_index = once_ms(lambda: store.text_index)
+    report["text_index_bytes"] = int(text_index.data.nbytes)
+    instructions = pd.Series(list(table.columns["Instructions"]))
+    word = pantries["small"][0]
+    for name, query, pattern in (("word", word, word), ("phrase", f'"cook the {word}"', f"cook the {word}")):
+        report[f"text_{name}_ms"] = median_ms(lambda: engine.filter_text(query), repeat)
+        report[f"text_{name}_contains_ms"] = median_ms(lambda: instructions.str.contains(pattern, case=False), repeat)
+
+    # similar recipes: the MinHash/LSH build, then lookups of random recipes ranked by estimate and by exact Jaccard
+    report["build_similarity_ms"], similarity = once_ms(lambda: store.similarity)
+    sample = rng.choice(table.n_recipes, min(table.n_recipes, 100), replace=False)
+    for exact, label in ((False, "estimate"), (True, "exact")):
+        report[f"similar_{label}_ms"] = median_ms(
+            lambda: [similarity.similar(int(recipe_id), exact=exact) for recipe_id in sample], repeat) / len(sample)
+
+    # widget build: update_list on an offscreen window, for the common query (the largest result)
+    from PyQt5.QtWidgets import QApplication
+    from RecipeList import RecipeList
+    app = QApplication.instance() or QApplication([])
+    window = RecipeList(1000, 700, engine)
+    window.resize(1000, 700)
+    window.show()
+    for top_k, label in ((RecipeEngine.RESULT_LIMIT, "top_k"), (None, "all_matches")):
+        filtered = engine.filter_data(pantries["most_common"], top_k=top_k)
+
+        def build():
+            window.update_list(filtered)
+            window.recipeView.viewport().repaint()
+            app.processEvents()
+        report[f"update_list_{label}_ms"] = median_ms(build, repeat)
+        report[f"update_list_{label}_rows"] = len(filtered)
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def run(sizes, corpus_dir: str, repeat: int, seed: int) -> dict:
+    """
+    Generates the missing corpora and benchmarks each one in its own process, so memory is measured per size.
+    :param sizes: number of recipes of each corpus
+    :param corpus_dir: folder the generated corpora are kept in (reused between runs)
+    :param repeat: number of runs of each query measurement
+    :param seed: random seed of the corpora and pantries
+    :return: the full report
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    report = {"python": platform.python_version(), "platform": platform.platform(), "repeat": repeat,
+              "seed": seed, "results": []}
+    for size in sizes:
+        path = os.path.join(corpus_dir, f"recipes-{size}-seed{seed}.csv")
+        if not os.path.exists(path):
+            generation_ms, _ = once_ms(lambda: generate_corpus(path, size, seed))
+            print(f"generated {path} in {generation_ms / 1000:.1f}s", file=sys.stderr)
+        output = subprocess.run([sys.executable, __file__, "--single", path, "--repeat", str(repeat),
+                                 "--seed", str(seed)], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output)
+        report["results"].append(result)
+        print(f"{size} recipes: load {result['load_csv_ms']:.0f}ms, "
+              f"small pantry {result['filter_small_index_ms']:.1f}ms, "
+              f"update_list {result['update_list_top_k_ms']:.1f}ms", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading, matching, ranking and result display "
+                                                 "on synthetic recipe corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="number of recipes per corpus")
+    parser.add_argument("--corpus-dir", default="bench_data", help="folder for the generated corpora")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query measurement")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--report", default="bench_output.json", help="JSON report to write")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)  # benchmark one corpus, print JSON
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(benchmark_corpus(args.single, args.repeat, args.seed)))
+    else:
+        full_report = run(args.sizes, args.corpus_dir, args.repeat, args.seed)
+        with open(args.report, "w") as report_file:
+            json.dump(full_report, report_file, indent=2)
+        print(f"wrote {args.report}", file=sys.stderr)
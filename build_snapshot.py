@@ -0,0 +1,32 @@
+import argparse
+import time
+from RecipeStore import DATA_PATH, RecipeStore
+from SnapshotBuilder import SnapshotBuilder
+
+
+def build_snapshot(path: str, output: str = None, chunk_size: int = SnapshotBuilder.CHUNK_SIZE) -> str:
+    """
+    Streams the recipe CSV into its binary snapshot, which the app memory-maps at startup.
+    The CSV is read chunk by chunk, so files larger than the memory can be converted.
+    :param path: path to the recipe CSV file
+    :param output: snapshot directory, next to the CSV file by default
+    :param chunk_size: number of CSV rows parsed at a time
+    :return: the snapshot directory
+    """
+    output = output or RecipeStore.get_snapshot_path(path)
+    # the signature is taken before reading, so a file changed while reading makes the snapshot stale
+    signature = RecipeStore(path).get_signature()
+    return SnapshotBuilder(output, chunk_size).build(path, signature)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the binary recipe snapshot used for fast startup.")
+    parser.add_argument("--data", default=DATA_PATH, help="path to the recipe CSV file")
+    parser.add_argument("--output", default=None, help="snapshot directory (default: next to the CSV file)")
+    parser.add_argument("--chunk-size", type=int, default=SnapshotBuilder.CHUNK_SIZE,
+                        help="number of CSV rows parsed at a time")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot_path = build_snapshot(args.data, args.output, args.chunk_size)
+    print(f"Wrote {snapshot_path} in {time.perf_counter() - start:.2f}s")
@@ -39,7 +39,7 @@ class Recipe(QWidget):
         :return:
         """
         self.welcomeWindow.setWindowTitle("Find a Recipe")
-        self.welcomeWindow.resize(500, 340)
+        self.welcomeWindow.resize(500, 540)
         self.welcomeWindow.show()
 
 
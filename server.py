@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+from IngredientIndex import RANK_MODES
+from RecipeEngine import RecipeEngine
+from RecipeStore import DATA_PATH, RecipeStore
+from SimilarityIndex import SimilarityIndex
+
+
+class RecipeServer:
+    """
+    Class that serves recipe queries over HTTP from one shared in-memory copy of the data and its index,
+    so several frontends on the same machine can share it.
+    Endpoints:
+        GET /search?ingredients=chicken,garlic[&top_k=N][&mode=M]
+                                                           ranked recipes (title, matched and missing ingredients,
+                                                           score), ordered by a mode of IngredientIndex.RANK_MODES
+        GET /text?q=risotto "slow cooker"[&top_k=N]        recipes whose title or instructions match the words and
+                                                           quoted phrases, ranked by BM25
+        GET /recipe/<id>                                   title, ingredients, instructions and image name
+        GET /similar/<id>[?top_k=N][&exact=0]              recipes with the most similar ingredients, by exact
+                                                           Jaccard similarity or by its MinHash estimate (exact=0)
+        GET /stats                                         hit and miss statistics of the query cache
+    Scoring runs on an executor so the event loop stays responsive, and identical queries that arrive
+    while one is being computed share its result.
+    """
+
+    # maximum size of a request head
+    MAX_HEADER_BYTES = 64 * 1024
+
+    def __init__(self, engine: RecipeEngine, workers: int = 4):
+        """
+        Initializes the server.
+        :param engine: the RecipeEngine to answer queries with
+        :param workers: number of threads that run the queries
+        """
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.in_flight = {}  # query key -> future of the query being computed
+
+    async def load(self):
+        """
+        Loads the recipe data and its index before the first request.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, lambda: self.engine.store.title_rank)
+
+    async def search(self, ingredients: list, top_k: int, mode: str = "matches") -> list:
+        """
+        Ranks the recipes for a list of ingredients, sharing the result with identical concurrent queries.
+        :param ingredients: list of ingredients
+        :param top_k: number of recipes to return
+        :param mode: order of the results (see RecipeEngine.rank)
+        :return: list of result records (see RecipeEngine.query)
+        """
+        key = (tuple(ingredients), top_k, mode)
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self.engine.query, ingredients, "index", top_k, mode)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # shield so a client that disconnects does not cancel the query for the others waiting on it
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def get_top_k(params: dict, default: int) -> int:
+        """
+        Reads the number of results a request asks for, raising ValueError unless it is a non-negative integer.
+        :param params: parsed query string of the request
+        :param default: number of results when the request does not give one
+        :return: the number of results
+        """
+        try:
+            top_k = int(params.get("top_k", [default])[0])
+        except ValueError:
+            top_k = None
+        if top_k is None or top_k < 0:
+            raise ValueError("top_k must be a non-negative integer")
+        return top_k
+
+    async def handle_request(self, target: str) -> tuple:
+        """
+        Routes a GET request.
+        :param target: request target (path and query string)
+        :return: (HTTP status, JSON-serializable body)
+        """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+
+        if url.path == "/search":
+            # ingredients are comma-separated and/or given as repeated parameters
+            ingredients = [ing.strip() for value in params.get("ingredients", []) for ing in value.split(",")]
+            ingredients = [ing for ing in ingredients if ing]
+            try:
+                top_k = self.get_top_k(params, RecipeEngine.RESULT_LIMIT)
+            except ValueError as error:
+                return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+            mode = params.get("mode", ["matches"])[0]
+            if mode not in RANK_MODES:
+                return HTTPStatus.BAD_REQUEST, {"error": f"mode must be one of {', '.join(RANK_MODES)}"}
+            return HTTPStatus.OK, {"ingredients": ingredients,
+                                   "results": await self.search(ingredients, top_k, mode)}
+
+        if url.path == "/text":
+            query = params.get("q", [""])[0]
+            try:
+                top_k = self.get_top_k(params, RecipeEngine.RESULT_LIMIT)
+            except ValueError as error:
+                return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self.engine.query_text, query, top_k)
+            return HTTPStatus.OK, {"q": query, "results": results}
+
+        if url.path.startswith("/recipe/"):
+            recipe_id = unquote(url.path[len("/recipe/"):])
+            if not recipe_id.isdigit() or int(recipe_id) >= self.engine.store.n_recipes:
+                return HTTPStatus.NOT_FOUND, {"error": f"no recipe {recipe_id}"}
+            loop = asyncio.get_running_loop()
+            recipe = await loop.run_in_executor(self.executor, self.engine.store.get_recipe, int(recipe_id))
+            return HTTPStatus.OK, dict(recipe, recipe_id=int(recipe_id))
+
+        if url.path.startswith("/similar/"):
+            recipe_id = unquote(url.path[len("/similar/"):])
+            if not recipe_id.isdigit() or int(recipe_id) >= self.engine.store.n_recipes:
+                return HTTPStatus.NOT_FOUND, {"error": f"no recipe {recipe_id}"}
+            try:
+                top_k = self.get_top_k(params, SimilarityIndex.LIMIT)
+            except ValueError as error:
+                return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+            exact = params.get("exact", ["1"])[0] not in ("0", "false")
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self.engine.store.get_similar, int(recipe_id),
+                                                 top_k, exact)
+            return HTTPStatus.OK, {"recipe_id": int(recipe_id), "exact": exact, "results": results}
+
+        if url.path == "/stats":
+            return HTTPStatus.OK, {"query_cache": self.engine.cache.stats() if self.engine.cache else None}
+
+        return HTTPStatus.NOT_FOUND, {"error": f"unknown path {url.path}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of one HTTP/1.1 connection (keep-alive is supported).
+        :param reader: stream of the request bytes
+        :param writer: stream of the response bytes
+        :return: None
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                request_line = lines[0].split()
+                headers = {name.strip().lower(): value.strip()
+                           for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+
+                if len(request_line) != 3:
+                    status, body = HTTPStatus.BAD_REQUEST, {"error": "malformed request"}
+                elif request_line[0] != "GET":
+                    status, body = HTTPStatus.METHOD_NOT_ALLOWED, {"error": "only GET is supported"}
+                else:
+                    try:
+                        status, body = await self.handle_request(request_line[1])
+                    except Exception as error:
+                        status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)}
+
+                keep_alive = headers.get("connection", "").lower() != "close" and request_line[-1] == "HTTP/1.1"
+                payload = json.dumps(body).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                             + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        """
+        Loads the data and serves requests until the task is cancelled.
+        :param host: address to listen on
+        :param port: port to listen on
+        :return: None
+        """
+        await self.load()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=self.MAX_HEADER_BYTES)
+        print(f"Serving recipes on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recipe queries over HTTP from one shared index.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--data", default=DATA_PATH, help="path to the recipe CSV file")
+    parser.add_argument("--workers", type=int, default=4, help="number of threads that run queries")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(RecipeServer(RecipeEngine(RecipeStore.get(args.data)), args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,49 @@
+import string
+import pandas as pd
+import pytest
+from build_snapshot import build_snapshot
+from RecipeEngine import RecipeEngine
+from RecipeStore import RecipeStore
+
+# ingredient lines whose names are longer than the phrases of the index, or only in one recipe
+RECIPES = [
+    ("Chicken Soup", ["2 boneless skinless chicken breast halves", "1 cup chicken broth", "2 large eggs",
+                      "1 can diced tomatoes", "1 tsp smoked spanish paprika"]),
+    ("Chicken Salad", ["3 boneless skinless chicken breast halves, cubed", "1/2 cup mayonnaise",
+                       "2 tbsp extra-virgin olive oil"]),
+    ("Pasta", ["1 pound spaghetti", "3 tbsp extra-virgin olive oil", "4 garlic cloves, minced",
+               "1 can (28 oz) whole peeled tomatoes"]),
+    ("Meringue", ["4 large egg whites", "1/2 tsp cream of tartar", "1 cup sugar"]),
+    ("Cookies", ["2 cups all-purpose flour", "1 tsp cream of tartar", "2 large eggs", "1 tsp baker's chocolate"]),
+    ("Tacos", ["1 lb ground beef", "1 tsp smoked paprika", "8 corn tortillas"]),
+]
+
+
+@pytest.fixture(params=["csv", "snapshot"])
+def engine(request, tmp_path):
+    """
+    Returns an engine over the recipes above, read from the CSV file or from its snapshot.
+    """
+    path = str(tmp_path / "recipes.csv")
+    ingredients = [str(lines) for _, lines in RECIPES]
+    pd.DataFrame({"Title": [title for title, _ in RECIPES], "Ingredients": ingredients,
+                  "Instructions": ["Cook."] * len(RECIPES), "Image_Name": [""] * len(RECIPES),
+                  "Cleaned_Ingredients": ingredients}).to_csv(path, index=False)
+    if request.param == "snapshot":
+        build_snapshot(path)
+    return RecipeEngine(RecipeStore(path), cache_size=0)
+
+
+def test_every_suggestion_finds_recipes(engine):
+    suggestions = {suggestion for prefix in list(string.ascii_lowercase) + ["bone", "smoked", "chicken breast"]
+                   for suggestion in engine.store.suggester.suggest(prefix)}
+    assert suggestions
+    for suggestion in suggestions:
+        assert len(engine.filter_data([suggestion])) > 0, suggestion
+
+
+def test_long_names_are_split_into_phrases(engine):
+    suggester = engine.store.suggester
+    assert suggester.suggest("bone") == ["boneless"]
+    assert suggester.suggest("smoked") == ["smoked"]
+    assert "skinless chicken breast halves" in suggester.suggest("chicken breast")